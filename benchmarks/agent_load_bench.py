@@ -0,0 +1,148 @@
+"""Concurrent calls per agent process: how many CallContexts one worker sustains.
+
+Runs N simulated calls at once in a single process / event loop, each with its
+own CallContext (queue, speaking lock, assistant, session id) exactly as
+agent.entrypoint builds them. Audio is replaced by a fake session: final
+transcripts are injected on a fixed cadence and speech goes through a fake
+TTS / playout (offline.FakeSession). Storage and LLM are the offline
+stand-ins from intake_bench.
+
+For each N it reports p50/p95 response latency (final transcript -> first
+spoken reply) and CPU cores used; the largest N whose p95 stays within
+--p95-budget-ms is the maximum sustainable calls for one process, and
+N / cores_used estimates calls per core.
+
+    python benchmarks/agent_load_bench.py --levels 1,8,32,128 --llm-ms 300 --turn-gap-s 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+for _var, _value in {
+    "LIVEKIT_URL": "ws://localhost:7880", "LIVEKIT_API_KEY": "bench", "LIVEKIT_API_SECRET": "bench",
+}.items():
+    os.environ.setdefault(_var, _value)  # agent.py refuses to import without them
+
+import httpx  # noqa: E402
+from intake_bench import FLOW_STEPS, SCRIPTS, pct  # noqa: E402
+from offline import FakeSession, FakeTTS, sia, stub_llm_rewriter  # noqa: E402
+
+import agent  # noqa: E402
+from local_store import MemoryClient, seed_flow  # noqa: E402
+
+FLOW_NAME = "injury_intake_strict"  # the flow agent.py runs
+
+
+async def setup(llm_ms: float, seed: int):
+    client = MemoryClient()
+    await seed_flow(client, FLOW_NAME, FLOW_STEPS)
+
+    async def supa():
+        return client
+
+    sia.supa = supa
+    sia.rewriter = stub_llm_rewriter(llm_ms / 1000, 0.0, seed)
+    sia.event_publisher = sia.EventPublisher(transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+    sia.flow_registry = sia.FlowRegistry()
+    sia.answer_writer = sia.AnswerWriter()
+    sia.DEBUG = False
+
+
+async def one_call(i: int, tts_s: float, turn_gap_s: float, latencies: list):
+    session = FakeSession(FakeTTS(first_frame_s=tts_s))
+    injury = agent.StrictIntakeInjuryAgent(session_id=f"load-{i}")
+    call = agent.CallContext(session, injury)
+    call.start_worker()
+    try:
+        await call.speak_all(await injury.initialize_conversation())
+        for text in SCRIPTS[i % len(SCRIPTS)]:
+            await asyncio.sleep(turn_gap_s)  # the caller talking
+            t0 = time.perf_counter()
+            spoken = len(session.said_at)
+            session.handlers["user_input_transcribed"](SimpleNamespace(is_final=True, transcript=text))
+            await call.drain()
+            if len(session.said_at) > spoken:
+                latencies.append((session.said_at[spoken] - t0) * 1000)
+    finally:
+        await call.aclose()
+
+
+async def level(n: int, tts_s: float, turn_gap_s: float):
+    latencies = []
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+
+    # Stagger call starts across one turn gap so turns don't all land on the same tick.
+    async def staggered(i):
+        await asyncio.sleep(turn_gap_s * i / n)
+        await one_call(i, tts_s, turn_gap_s, latencies)
+
+    await asyncio.gather(*(staggered(i) for i in range(n)))
+    wall = time.perf_counter() - wall0
+    cores = (time.process_time() - cpu0) / wall
+    return {
+        "calls": n,
+        "turns": len(latencies),
+        "p50_ms": round(pct(latencies, 50), 1),
+        "p95_ms": round(pct(latencies, 95), 1),
+        "cpu_cores": round(cores, 3),
+        "wall_s": round(wall, 2),
+    }
+
+
+async def run(levels, llm_ms, tts_ms, turn_gap_s, budget_ms, seed):
+    await setup(llm_ms, seed)
+    await sia.flow_registry.get(FLOW_NAME)  # build once, like a warm worker
+    agent.load_vad()
+    results, best = [], None
+    for n in levels:
+        r = await level(n, tts_ms / 1000, turn_gap_s)
+        r["within_budget"] = r["p95_ms"] <= budget_ms
+        results.append(r)
+        if not r["within_budget"]:
+            break
+        best = r
+    await sia.answer_writer.flush()
+    await sia.event_publisher.aclose()
+    return results, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,4,16,64,256", help="concurrent calls to try, ascending")
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--tts-ms", type=float, default=50.0, help="TTS time to first audio frame")
+    parser.add_argument("--turn-gap-s", type=float, default=1.0, help="caller speaking time between turns")
+    parser.add_argument("--p95-budget-ms", type=float, default=0.0,
+                        help="p95 response latency allowed (default: 2x the single-call p95)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    levels = sorted(int(x) for x in args.levels.split(","))
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            budget = args.p95_budget_ms
+            if not budget:
+                probe, _ = asyncio.run(run([1], args.llm_ms, args.tts_ms, args.turn_gap_s, float("inf"), args.seed))
+                budget = 2 * probe[0]["p95_ms"]
+            results, best = asyncio.run(
+                run(levels, args.llm_ms, args.tts_ms, args.turn_gap_s, budget, args.seed)
+            )
+        finally:
+            sys.stdout = stdout
+
+    report = {
+        "config": {**vars(args), "p95_budget_ms": budget},
+        "levels": results,
+        "max_sustainable_calls": best["calls"] if best else 0,
+        "est_calls_per_core": round(best["calls"] / max(best["cpu_cores"], 1e-3)) if best else 0,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Barge-in: work spent on replies the caller talks over, with and without cancellation.
+
+Replays the intake_bench scripts through agent.CallContext (interims, then
+the final after the STT endpointing). Two kinds of caller behaviour:
+
+* --continue-rate: after the final the caller adds "--continue-text"
+  --continue-ms later, while the turn's extraction is still running. With
+  barge-in the turn is superseded and answered once with the whole answer;
+  without it the stale turn runs, its reply is spoken, and the addition is
+  taken as the answer to a question the caller never heard.
+* --interrupt-rate: the caller starts the next answer --interrupt-ms after the
+  reply started playing. With barge-in the rest of the reply and its pending
+  synthesis are dropped; without it the reply plays out under the caller.
+
+Reports, per mode: turns run, LLM calls started / cancelled / completed (stub chains),
+TTS frames synthesized, seconds of reply audio played, answers stored under
+the wrong step, and the agent's barge-in counters.
+
+    python benchmarks/bargein_bench.py --continue-rate 0.3 --interrupt-rate 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+# first: sets the LiveKit env agent.py needs
+from agent_load_bench import FLOW_NAME, setup
+from intake_bench import FLOW_STEPS, SCRIPTS
+from offline import FakeSession, FakeSTT, FakeTTS, llm_calls, sia
+
+import agent
+from intake_metrics import reset, snapshot
+
+
+async def say(transcribed, text: str, word_ms: float, endpointing_ms: float):
+    words = text.split()
+    for n in range(1, len(words) + 1):
+        transcribed(SimpleNamespace(is_final=False, transcript=" ".join(words[:n])))
+        await asyncio.sleep(word_ms / 1000)
+    await asyncio.sleep(endpointing_ms / 1000)
+    transcribed(SimpleNamespace(is_final=True, transcript=text))
+
+
+async def one_call(i: int, barge_in: bool, args, rng: random.Random, out: dict):
+    tts = FakeTTS(first_frame_s=args.tts_ms / 1000)
+    session = FakeSession(tts, FakeSTT(args.endpointing_ms))
+    injury = agent.StrictIntakeInjuryAgent(session_id=f"bi-{int(barge_in)}-{i}")
+    call = agent.CallContext(session, injury)
+    call.barge_in = barge_in
+    call.adaptive_endpointing = False
+    call.speculative = False
+    handle = injury.handle_user_message
+
+    async def counted(text):
+        out["turns"] += 1
+        return await handle(text)
+
+    injury.handle_user_message = counted
+    call.start_worker()
+    transcribed = session.handlers["user_input_transcribed"]
+    script = SCRIPTS[i % len(SCRIPTS)]
+    sid = injury.session_id  # the farewell rotates injury.session_id
+    try:
+        await call.speak_all(await injury.initialize_conversation())
+        for text in script:
+            spoken = len(session.said_at)
+            await say(transcribed, text, args.word_ms, args.endpointing_ms)
+            if rng.random() < args.continue_rate:
+                out["continued"] += 1
+                await asyncio.sleep(args.continue_ms / 1000)
+                await say(transcribed, args.continue_text, args.word_ms, args.endpointing_ms)
+            if rng.random() < args.interrupt_rate:
+                # Start the next answer once the reply has been playing for a moment
+                deadline = time.perf_counter() + 10
+                while len(session.said_at) <= spoken and time.perf_counter() < deadline:
+                    await asyncio.sleep(0.01)
+                out["interrupting"] += 1
+                await asyncio.sleep(args.interrupt_ms / 1000)
+            else:
+                await call.drain()
+        await call.drain()
+        state = await injury.assistant.app.aget_state({"configurable": {"thread_id": sid}})
+        collected = (state.values or {}).get("collected_data", {})
+        for step, answer in zip(FLOW_STEPS, script):
+            value = collected.get(step["input_key"])
+            if value is not None and answer.split()[-1].lower() not in value.lower():
+                out["misplaced_answers"] += 1
+    finally:
+        await call.aclose()
+    out["tts_frames"] += tts.frames
+    out["played_s"] += session.played_s
+
+
+async def run(barge_in: bool, args):
+    await setup(args.llm_ms, args.seed)
+    await sia.flow_registry.get(FLOW_NAME)
+    reset()
+    out = {"turns": 0, "continued": 0, "interrupting": 0, "misplaced_answers": 0, "tts_frames": 0, "played_s": 0.0}
+    await asyncio.gather(*(one_call(i, barge_in, args, random.Random(args.seed + i), out) for i in range(args.calls)))
+    await sia.answer_writer.flush()
+    await sia.event_publisher.aclose()
+    counters = snapshot()
+    out["played_s"] = round(out["played_s"], 1)
+    return {
+        "barge_in": barge_in,
+        **out,
+        "llm_calls": llm_calls(sia.rewriter),
+        "llm_calls_cancelled": llm_calls(sia.rewriter, "cancelled"),
+        "llm_calls_completed": llm_calls(sia.rewriter) - llm_calls(sia.rewriter, "cancelled"),
+        "turns_superseded": counters.get("turns_superseded", 0),
+        "replies_interrupted": counters.get("replies_interrupted", 0),
+        "tts_chunks_dropped": counters.get("tts_chunks_dropped", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=len(SCRIPTS), help="concurrent replayed calls")
+    parser.add_argument("--continue-rate", type=float, default=0.3, help="share of answers the caller adds to")
+    parser.add_argument("--continue-ms", type=float, default=600.0, help="pause before the addition")
+    parser.add_argument("--continue-text", default="that's right")
+    parser.add_argument("--interrupt-rate", type=float, default=0.3, help="share of replies the caller talks over")
+    parser.add_argument("--interrupt-ms", type=float, default=300.0, help="reply audio heard before the caller talks")
+    parser.add_argument("--endpointing-ms", type=int, default=300)
+    parser.add_argument("--llm-ms", type=float, default=600.0)
+    parser.add_argument("--tts-ms", type=float, default=50.0)
+    parser.add_argument("--word-ms", type=float, default=150.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = [asyncio.run(run(False, args)), asyncio.run(run(True, args))]
+        finally:
+            sys.stdout = stdout
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Checkpointer memory per session: MemorySaver vs. BoundedSqliteSaver.
+
+Drives N concurrent intake sessions (start + a few answers each) through the
+real graph with DB/LLM stubbed out and reports RSS growth per session.
+
+    python benchmarks/bench_checkpointer.py --sessions 1000 10000 --turns 4
+
+Pass --saver memory|bounded to measure one saver per process (cleaner RSS).
+"""
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import time
+
+import psutil
+from langgraph.checkpoint.memory import MemorySaver
+from offline import patch_intake, sia
+
+from checkpoint_store import BoundedSqliteSaver
+
+
+async def run(saver, sessions: int, turns: int, concurrency: int = 200):
+    sia.CHECKPOINTER = saver
+    sia.flow_registry = sia.FlowRegistry()
+    patch_intake(turns + 1)
+    assistant = await sia.StrictIntakeAssistant.create("bench")
+    assistant.debug = False
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            sid = f"s{i}"
+            await assistant.start(sid)
+            for t in range(turns):
+                await assistant.handle_user(f"answer number {t} for session {i}", sid)
+
+    proc = psutil.Process()
+    gc.collect()
+    before = proc.memory_info().rss
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    after = proc.memory_info().rss
+    return (after - before) / sessions, elapsed
+
+
+async def main(counts, turns, max_threads, which):
+    tmp = tempfile.mkdtemp(prefix="cpbench_")
+    print(f"{'saver':<22} {'sessions':>8} {'bytes/session':>14} {'resident':>9} {'secs':>7}")
+    for n in counts:
+        savers = [
+            ("MemorySaver", MemorySaver()),
+            ("BoundedSqliteSaver", BoundedSqliteSaver(path=os.path.join(tmp, f"cp_{n}.sqlite3"), max_threads=max_threads)),
+        ]
+        for label, saver in savers:
+            if which != "both" and label != {"memory": "MemorySaver", "bounded": "BoundedSqliteSaver"}[which]:
+                continue
+            per_session, elapsed = await run(saver, n, turns)
+            resident = getattr(saver, "resident", None)
+            if resident is None:
+                resident = len(saver.storage)
+            print(f"{label:<22} {n:>8} {per_session:>14,.0f} {resident:>9} {elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--max-threads", type=int, default=1000)
+    parser.add_argument("--saver", choices=["memory", "bounded", "both"], default="both")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.turns, args.max_threads, args.saver))
@@ -0,0 +1,98 @@
+"""Extraction latency per question type: two-step vs. combined LLM mode.
+
+Uses recorded LLM replies for answers that miss the rule-based path and a stub
+chain that sleeps a modelled latency per call (base + per output character),
+so the comparison is deterministic and offline.
+
+    python benchmarks/bench_extraction.py --base-ms 350 --per-char-ms 1.5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+
+from offline import sia  # noqa: F401  (sets up env and src path)
+
+from empathetic_rewriter import EmpatheticRewriter, sniff_question_type
+
+# question, user answer, recorded extraction, recorded validation, recorded combined JSON
+RECORDED = [
+    ("What is your first name?", "uh it's rusty I guess", "Rusty", "VALID",
+     '{"value": "Rusty", "status": "VALID", "corrected": "", "clarification": ""}'),
+    ("What is your last name?", "the family goes by o'brien", "o'brien", "VALID_CORRECTED: O'Brien",
+     '{"value": "o\'brien", "status": "VALID_CORRECTED", "corrected": "O\'Brien", "clarification": ""}'),
+    ("When did this occur?", "last tuesday in the afternoon", "last Tuesday afternoon", "VALID",
+     '{"value": "last Tuesday afternoon", "status": "VALID", "corrected": "", "clarification": ""}'),
+    ("Where did the incident occur?", "on the highway near exit 24", "highway near Exit 24", "VALID",
+     '{"value": "highway near Exit 24", "status": "VALID", "corrected": "", "clarification": ""}'),
+    ("What injuries did you sustain?", "my back hurts and my neck is stiff", "back pain, stiff neck", "VALID",
+     '{"value": "back pain, stiff neck", "status": "VALID", "corrected": "", "clarification": ""}'),
+    ("Did you receive medical treatment?", "I went to urgent care that night", "Yes, urgent care", "VALID",
+     '{"value": "Yes, urgent care", "status": "VALID", "corrected": "", "clarification": ""}'),
+    ("Were there any witnesses?", "a couple of people saw it", "Two", "VALID",
+     '{"value": "Two", "status": "VALID", "corrected": "", "clarification": ""}'),
+    ("Did you report this incident to anyone?", "I told my insurer", "Yes, to insurance", "VALID",
+     '{"value": "Yes, to insurance", "status": "VALID", "corrected": "", "clarification": ""}'),
+]
+
+
+class RecordedChain:
+    """Replays a recorded reply after a modelled network + generation delay."""
+
+    def __init__(self, replies, base_ms, per_char_ms, counter):
+        self.replies = replies
+        self.base_ms = base_ms
+        self.per_char_ms = per_char_ms
+        self.counter = counter
+
+    async def ainvoke(self, inputs):
+        reply = self.replies[inputs["response"] if "response" in inputs else inputs["extracted"]]
+        self.counter["calls"] += 1
+        await asyncio.sleep((self.base_ms + self.per_char_ms * len(reply)) / 1000)
+        return reply
+
+
+def build(combined, base_ms, per_char_ms, counter):
+    rw = EmpatheticRewriter(cache_path=None, combined=combined)
+    rw.extraction_chain = RecordedChain({a: e for _, a, e, _, _ in RECORDED}, base_ms, per_char_ms, counter)
+    rw.validation_chain = RecordedChain({e: v for _, _, e, v, _ in RECORDED}, base_ms, per_char_ms, counter)
+    rw.combined_chain = RecordedChain({a: c for _, a, _, _, c in RECORDED}, base_ms, per_char_ms, counter)
+    return rw
+
+
+async def measure(rw, question, answer, repeats):
+    samples, result = [], None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # the rewriter logs every call
+            result = await rw.extract_and_validate(question, answer)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+async def main(base_ms, per_char_ms, repeats):
+    counters = {"two-step": {"calls": 0}, "combined": {"calls": 0}}
+    two_step = build(False, base_ms, per_char_ms, counters["two-step"])
+    combined = build(True, base_ms, per_char_ms, counters["combined"])
+    print(f"{'question type':<22} {'two-step ms':>12} {'combined ms':>12} {'saved':>7}  agree")
+    totals = [0.0, 0.0]
+    for question, answer, *_ in RECORDED:
+        qtype = sniff_question_type(question)
+        a_ms, a_res = await measure(two_step, question, answer, repeats)
+        b_ms, b_res = await measure(combined, question, answer, repeats)
+        totals[0] += a_ms
+        totals[1] += b_ms
+        print(f"{qtype:<22} {a_ms:>12.0f} {b_ms:>12.0f} {1 - b_ms / a_ms:>6.0%}  {a_res == b_res}")
+    print(f"{'total':<22} {totals[0]:>12.0f} {totals[1]:>12.0f} {1 - totals[1] / totals[0]:>6.0%}")
+    print(f"LLM calls: two-step={counters['two-step']['calls']} combined={counters['combined']['calls']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-ms", type=float, default=350.0)
+    parser.add_argument("--per-char-ms", type=float, default=1.5)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.base_ms, args.per_char_ms, args.repeats))
@@ -0,0 +1,50 @@
+"""Per-turn cost of StrictIntakeAssistant.handle_user vs. session depth.
+
+Runs synthetic flows of increasing length fully in-process (DB, events and LLM
+are patched out) and reports node executions and wall time for each turn.
+With direct resume the node count per turn stays at 2 (store + next ask)
+no matter how deep the session is.
+
+    python benchmarks/bench_resume.py --steps 4 12 24 48
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from offline import instrument, patch_intake, sia
+
+
+async def run(n_steps: int):
+    patch_intake(n_steps)
+    assistant = await sia.StrictIntakeAssistant.create(f"bench_{n_steps}")
+    assistant.debug = False
+    counter = instrument(assistant)
+    sid = f"bench-{n_steps}"
+
+    await assistant.start(sid)
+    nodes, times = [], []
+    for i in range(n_steps):
+        counter["n"] = 0
+        t0 = time.perf_counter()
+        await assistant.handle_user(f"answer {i}", sid)
+        times.append((time.perf_counter() - t0) * 1000)
+        nodes.append(counter["n"])
+    return nodes, times
+
+
+async def main(step_counts):
+    print(f"{'steps':>6} {'nodes/turn (first..last)':>26} {'max':>4} {'ms/turn p50':>12} {'last turn ms':>13}")
+    for n in step_counts:
+        nodes, times = await run(n)
+        print(
+            f"{n:>6} {f'{nodes[0]}..{nodes[-1]}':>26} {max(nodes):>4} "
+            f"{statistics.median(times):>12.2f} {times[-1]:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, nargs="+", default=[4, 12, 24, 48])
+    args = parser.parse_args()
+    asyncio.run(main(args.steps))
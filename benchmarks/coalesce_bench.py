@@ -0,0 +1,132 @@
+"""Turn coalescing: answers split into two STT finals, with and without the window.
+
+Replays the intake_bench scripts through agent.CallContext. For --split-rate
+of the answers (two words or more) the caller pauses mid-sentence: the first
+half ends in a final of its own, and the second half starts --gap-ms later
+(interims, then its final), as Deepgram delivers it. Without coalescing each
+final is a turn: the fragment is taken as the answer and the rest lands on the
+next question.
+
+Reports, per coalescing window: turns the engine ran vs answers spoken,
+merged turns, LLM calls made (stub chains) and the agent's llm_calls_avoided
+estimate, answers stored under the wrong step, and response latency.
+
+    python benchmarks/coalesce_bench.py --windows 0 400 --split-rate 0.3 --gap-ms 250
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+# first: sets the LiveKit env agent.py needs
+from agent_load_bench import FLOW_NAME, setup
+from intake_bench import FLOW_STEPS, SCRIPTS, pct
+from offline import FakeSession, FakeSTT, FakeTTS, llm_calls, sia
+
+import agent
+from intake_metrics import reset, snapshot
+
+
+async def say(transcribed, words, word_ms: float):
+    for n in range(1, len(words) + 1):
+        transcribed(SimpleNamespace(is_final=False, transcript=" ".join(words[:n])))
+        await asyncio.sleep(word_ms / 1000)
+
+
+async def one_call(i: int, window_ms: float, args, rng: random.Random, out: dict):
+    session = FakeSession(FakeTTS(first_frame_s=args.tts_ms / 1000), FakeSTT(args.endpointing_ms))
+    injury = agent.StrictIntakeInjuryAgent(session_id=f"co-{int(window_ms)}-{i}")
+    call = agent.CallContext(session, injury)
+    call.adaptive_endpointing = False
+    call.speculative = False
+    call.coalesce_ms = window_ms
+    handle = injury.handle_user_message
+
+    async def counted(text):
+        out["turns"] += 1
+        return await handle(text)
+
+    injury.handle_user_message = counted
+    call.start_worker()
+    transcribed = session.handlers["user_input_transcribed"]
+    script = SCRIPTS[i % len(SCRIPTS)]
+    sid = injury.session_id  # the farewell rotates injury.session_id
+    try:
+        await call.speak_all(await injury.initialize_conversation())
+        for text in script:
+            words = text.split()
+            parts = [words]
+            if len(words) >= 2 and rng.random() < args.split_rate:
+                cut = len(words) // 2
+                parts = [words[:cut], words[cut:]]
+                out["split_answers"] += 1
+            spoken = len(session.said_at)
+            for k, part in enumerate(parts):
+                if k:
+                    await asyncio.sleep(args.gap_ms / 1000)
+                await say(transcribed, part, args.word_ms)
+                await asyncio.sleep(session.stt.endpointing_ms / 1000)
+                t0 = time.perf_counter()
+                transcribed(SimpleNamespace(is_final=True, transcript=" ".join(part)))
+            await call.drain()
+            if len(session.said_at) > spoken:
+                out["latencies"].append((session.said_at[spoken] - t0) * 1000)
+        state = await injury.assistant.app.aget_state({"configurable": {"thread_id": sid}})
+        collected = (state.values or {}).get("collected_data", {})
+        for step, answer in zip(FLOW_STEPS, script):
+            if collected.get(step["input_key"]) is not None and answer.split()[-1].lower() not in collected[step["input_key"]].lower():
+                out["misplaced_answers"] += 1
+    finally:
+        await call.aclose()
+
+
+async def run(window_ms: float, args):
+    await setup(args.llm_ms, args.seed)
+    await sia.flow_registry.get(FLOW_NAME)
+    reset()
+    out = {"turns": 0, "split_answers": 0, "misplaced_answers": 0, "latencies": []}
+    await asyncio.gather(*(one_call(i, window_ms, args, random.Random(args.seed + i), out) for i in range(args.calls)))
+    await sia.answer_writer.flush()
+    await sia.event_publisher.aclose()
+    counters = snapshot()
+    lat = out.pop("latencies")
+    return {
+        "window_ms": window_ms,
+        "answers": sum(len(SCRIPTS[i % len(SCRIPTS)]) for i in range(args.calls)),
+        **out,
+        "turns_merged": counters.get("turns_merged", 0),
+        "llm_calls": llm_calls(sia.rewriter),
+        "llm_calls_avoided_est": counters.get("llm_calls_avoided", 0),
+        "p50_ms": round(pct(lat, 50), 1),
+        "p95_ms": round(pct(lat, 95), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, agent.TURN_COALESCE_MS])
+    parser.add_argument("--calls", type=int, default=len(SCRIPTS), help="concurrent replayed calls")
+    parser.add_argument("--split-rate", type=float, default=0.3, help="share of answers spoken as two finals")
+    parser.add_argument("--gap-ms", type=float, default=250.0, help="pause between the two halves")
+    parser.add_argument("--endpointing-ms", type=int, default=300, help="STT endpointing (short: splits happen)")
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--tts-ms", type=float, default=50.0)
+    parser.add_argument("--word-ms", type=float, default=150.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = [asyncio.run(run(w, args)) for w in args.windows]
+        finally:
+            sys.stdout = stdout
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Turn latency per step type with fixed vs step-aware endpointing.
+
+Replays the intake_bench scripts through agent.CallContext as interim
+transcripts (one per --word-ms), then waits the endpointing the agent has
+configured on the (fake) STT before delivering the final, as Deepgram would.
+Answers of --long-words words or more get a thinking pause of --pause-ms in
+the middle; when that pause is at least the endpointing in force the STT
+would have cut the answer in two, which is counted as a cut-off (the replay
+itself keeps the answer whole).
+
+Reports response latency (caller stops talking -> first spoken reply,
+endpointing wait included) per step type and per endpointing profile, for
+fixed endpointing (STT_ENDPOINTING_MS, as before) and adaptive endpointing.
+
+    python benchmarks/endpointing_bench.py --llm-ms 300 --pause-ms 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+# first: sets the LiveKit env agent.py needs
+from agent_load_bench import FLOW_NAME, setup
+from intake_bench import SCRIPTS
+from offline import FakeSession, FakeSTT, FakeTTS, sia
+
+import agent
+from intake_metrics import reset, timings
+
+
+async def one_call(i: int, adaptive: bool, args, cutoffs: list):
+    session = FakeSession(FakeTTS(first_frame_s=args.tts_ms / 1000), FakeSTT(agent.STT_ENDPOINTING_MS))
+    injury = agent.StrictIntakeInjuryAgent(session_id=f"ep-{int(adaptive)}-{i}")
+    call = agent.CallContext(session, injury)
+    call.adaptive_endpointing = adaptive
+    call.coalesce_ms = 0  # one final per answer here; coalescing has its own bench
+    call.start_worker()
+    transcribed = session.handlers["user_input_transcribed"]
+    try:
+        greeting = await injury.initialize_conversation()
+        await call.apply_turn_timing()
+        await call.speak_all(greeting)
+        for text in SCRIPTS[i % len(SCRIPTS)]:
+            words = text.split()
+            pause_at = len(words) // 2 if len(words) >= args.long_words else -1
+            for n in range(1, len(words) + 1):
+                transcribed(SimpleNamespace(is_final=False, transcript=" ".join(words[:n])))
+                await asyncio.sleep(args.word_ms / 1000)
+                if n == pause_at:
+                    if args.pause_ms >= session.stt.endpointing_ms:
+                        cutoffs.append(text)
+                    await asyncio.sleep(args.pause_ms / 1000)
+            await asyncio.sleep(session.stt.endpointing_ms / 1000)
+            transcribed(SimpleNamespace(is_final=True, transcript=f"{text}."))
+            await call.drain()
+    finally:
+        await call.aclose()
+
+
+async def run(adaptive: bool, args):
+    await setup(args.llm_ms, args.seed)
+    await sia.flow_registry.get(FLOW_NAME)
+    reset()
+    cutoffs = []
+    await asyncio.gather(*(one_call(i, adaptive, args, cutoffs) for i in range(args.calls)))
+    await sia.answer_writer.flush()
+    await sia.event_publisher.aclose()
+    t = timings()
+    by_type = {k.split(".", 1)[1]: v for k, v in t.items() if k.startswith("turn_latency_ms.") and ".profile." not in k}
+    by_profile = {k.rsplit(".", 1)[1]: v for k, v in t.items() if k.startswith("turn_latency_ms.profile.")}
+    return {
+        "mode": "adaptive" if adaptive else "fixed",
+        "by_step_type": dict(sorted(by_type.items())),
+        "by_profile": by_profile,
+        "cut_off_answers": len(cutoffs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=len(SCRIPTS), help="concurrent replayed calls")
+    parser.add_argument("--llm-ms", type=float, default=300.0)
+    parser.add_argument("--tts-ms", type=float, default=50.0, help="TTS time to first audio frame")
+    parser.add_argument("--word-ms", type=float, default=200.0, help="time between interim transcripts")
+    parser.add_argument("--long-words", type=int, default=6, help="answers this long get a thinking pause")
+    parser.add_argument("--pause-ms", type=float, default=1000.0, help="thinking pause inside long answers")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = [asyncio.run(run(False, args)), asyncio.run(run(True, args))]
+        finally:
+            sys.stdout = stdout
+    print(json.dumps({"config": {**vars(args), "fixed_endpointing_ms": agent.STT_ENDPOINTING_MS},
+                      "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
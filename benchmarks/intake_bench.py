@@ -0,0 +1,215 @@
+"""Offline throughput benchmark for the intake engine.
+
+Replays scripted transcripts through StrictIntakeAssistant.start / handle_user
+at a configurable concurrency. Storage is a local_store backend standing in
+for Supabase (--storage memory|sqlite), the LLM is the real EmpatheticRewriter
+with deterministic stub chains (injectable latency), and UI events go through
+the real publisher into a mock transport.
+
+Reports turns/sec, p50/p95/p99 turn latency, node executions per turn and RSS
+per session; --out writes the results as JSON and --compare diffs against a
+previous run.
+
+    python benchmarks/intake_bench.py --sessions 500 --concurrency 50 --llm-ms 300 --out before.json
+    python benchmarks/intake_bench.py --sessions 500 --concurrency 50 --llm-ms 300 --compare before.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import psutil
+from offline import instrument, llm_calls, sia, stub_llm_rewriter
+
+from local_store import MemoryClient, SqliteClient, seed_flow
+
+FLOW_NAME = "injury_intake_bench"
+
+FLOW_STEPS = [
+    {"name": "first_name", "input_key": "first_name", "ask_prompt": "What is your first name?"},
+    {"name": "last_name", "input_key": "last_name", "ask_prompt": "Thanks {first_name}. What is your last name?"},
+    {"name": "incident_date", "input_key": "incident_date", "ask_prompt": "When did the incident happen?"},
+    {"name": "incident_location", "input_key": "incident_location", "ask_prompt": "Where did it happen?"},
+    {"name": "incident_description", "input_key": "incident_description", "ask_prompt": "Please describe what happened."},
+    {"name": "injuries", "input_key": "injuries", "ask_prompt": "Were you injured? Tell me about any injuries."},
+    {"name": "medical_treatment", "input_key": "medical_treatment", "ask_prompt": "Did you receive medical treatment?"},
+    {"name": "other_reports", "input_key": "other_reports", "ask_prompt": "Did you report this to anyone?"},
+    {"name": "witnesses", "input_key": "witnesses", "ask_prompt": "Were there any witnesses?"},
+    {
+        "name": "claim_ref",
+        "input_key": "claim_ref",
+        "ask_prompt": "What is your claim reference? It looks like AB1234.",
+        "validate_regex": r"(?i)^[A-Z]{2}\d{4}$",  # STT lower-cases spelled codes
+    },
+]
+
+# One answer per step, then a farewell. Mixes rule hits, LLM fallbacks and regex checks.
+SCRIPTS = [
+    ["My name is Jon", "Snow", "March 3, 2024", "at the mall on fifth avenue",
+     "I slipped on a wet floor near the escalator", "my wrist hurts a lot", "yes",
+     "yes, to police", "no", "ab1234", "bye"],
+    ["Arya", "my last name is Stark", "yesterday afternoon", "the parking garage downtown",
+     "a car reversed into me while I was walking", "none", "no", "no", "yes", "XY9876", "goodbye"],
+    ["it's Sansa", "Stark", "04/12/2024", "outside the grocery store",
+     "a shelf collapsed and hit my shoulder", "bruised shoulder", "I went to the hospital",
+     "I told my insurance", "two people saw it", "cd4321", "thanks, bye"],
+]
+
+
+async def setup(storage: str, llm_ms: float, llm_jitter_ms: float, db_ms: float, seed: int):
+    if storage == "sqlite":
+        client = SqliteClient(os.path.join(tempfile.mkdtemp(prefix="intake_bench_"), "store.sqlite3"), latency_s=db_ms / 1000)
+    else:
+        client = MemoryClient(latency_s=db_ms / 1000)
+    await seed_flow(client, FLOW_NAME, FLOW_STEPS)
+
+    async def supa():
+        return client
+
+    sia.supa = supa
+    sia.rewriter = stub_llm_rewriter(llm_ms / 1000, llm_jitter_ms / 1000, seed)
+    sia.event_publisher = sia.EventPublisher(transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+    sia.flow_registry = sia.FlowRegistry()
+    sia.answer_writer = sia.AnswerWriter()
+    sia.DEBUG = False
+    return client
+
+
+def pct(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+async def run(sessions: int, concurrency: int, storage: str, llm_ms: float, llm_jitter_ms: float, db_ms: float, seed: int):
+    client = await setup(storage, llm_ms, llm_jitter_ms, db_ms, seed)
+    assistant = await sia.StrictIntakeAssistant.create(FLOW_NAME)
+    assistant.debug = False
+    counter = instrument(assistant)
+    counter["n"] = 0
+    llm_before = llm_calls(sia.rewriter)
+
+    latencies = []
+    graph_turns = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal graph_turns
+        script = SCRIPTS[i % len(SCRIPTS)]
+        sid = f"bench-{i}"
+        async with sem:
+            t0 = time.perf_counter()
+            await assistant.start(sid)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            graph_turns += 1
+            for text in script:
+                t0 = time.perf_counter()
+                await assistant.handle_user(text, sid)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            graph_turns += len(script) - 1  # the farewell turn does not run the graph
+
+    proc = psutil.Process()
+    gc.collect()
+    rss_before = proc.memory_info().rss
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - t0
+    await sia.answer_writer.flush()
+    await sia.event_publisher.aclose()
+    gc.collect()
+    rss_after = proc.memory_info().rss
+
+    answers = len((await client.table("intake_answers").select("id").execute()).data)
+    return {
+        "turns": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(pct(latencies, 50), 2),
+            "p95": round(pct(latencies, 95), 2),
+            "p99": round(pct(latencies, 99), 2),
+            "mean": round(statistics.fmean(latencies), 2),
+        },
+        "nodes_per_turn": round(counter["n"] / max(1, graph_turns), 2),
+        "llm_calls_per_turn": round((llm_calls(sia.rewriter) - llm_before) / max(1, graph_turns), 3),
+        "db_requests": client.calls,
+        "answers_saved": answers,
+        "rss_bytes_per_session": int((rss_after - rss_before) / sessions),
+        "events_sent": sia.event_publisher.sent,
+        "events_dropped": sia.event_publisher.dropped,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nvs. {baseline_path} ({base.get('commit')}):")
+    pairs = [
+        ("turns_per_s", base["results"]["turns_per_s"], current["results"]["turns_per_s"]),
+        ("nodes_per_turn", base["results"]["nodes_per_turn"], current["results"]["nodes_per_turn"]),
+        ("rss_bytes_per_session", base["results"]["rss_bytes_per_session"], current["results"]["rss_bytes_per_session"]),
+    ] + [
+        (f"latency {k}", base["results"]["latency_ms"][k], current["results"]["latency_ms"][k])
+        for k in ("p50", "p95", "p99")
+    ]
+    for name, old, new in pairs:
+        change = (new - old) / old if old else 0.0
+        print(f"  {name:<22} {old:>12} -> {new:<12} {change:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--llm-ms", type=float, default=0.0, help="latency per stub LLM call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=0.0, help="uniform extra latency per call (seeded)")
+    parser.add_argument("--db-ms", type=float, default=0.0, help="latency per stub DB request")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to diff against")
+    args = parser.parse_args()
+
+    # The engine logs every turn; keep it out of the measurement.
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = asyncio.run(
+                run(args.sessions, args.concurrency, args.storage, args.llm_ms, args.llm_jitter_ms, args.db_ms, args.seed)
+            )
+        finally:
+            sys.stdout = stdout
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""In-process stand-ins shared by the benchmarks (no Supabase, OpenAI or UI)."""
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("INTAKE_DEBUG", "0")
+os.environ.setdefault("CHECKPOINT_DB_PATH", "")  # memory-only unless a benchmark opts in
+
+import strict_intake_assistant as sia
+from strict_intake_assistant import Step
+
+
+class StubRewriter:
+    async def rewrite(self, text):
+        return text
+
+    async def warm(self, texts):
+        return None
+
+    async def greeting(self, agent, firm):
+        return "Hello."
+
+    async def extract_and_validate(self, question, user_response, pattern=None, qtype=None):
+        return True, user_response, ""
+
+
+async def _noop(*args, **kwargs):
+    return "run-bench"
+
+
+def patch_intake(n_steps: int):
+    """Serve a synthetic n-step flow and stub out DB, events and LLM."""
+    names = [f"q{i}" for i in range(n_steps)]
+
+    async def load(flow_name):
+        steps = {
+            name: Step(name, f"Question {i}?", f"key_{i}", names[i + 1] if i + 1 < n_steps else None)
+            for i, name in enumerate(names)
+        }
+        return steps, "flow-bench", names[0]
+
+    sia.load_flow_and_steps = load
+    sia.get_or_create_run_id = _noop
+    sia.save_answers = _noop
+    sia.emit_event = _noop
+    sia.rewriter = StubRewriter()
+    sia.DEBUG = False
+
+
+def instrument(assistant):
+    """Count node executions of an assistant's compiled graph."""
+    counter = {"n": 0}
+    for node in assistant.app.nodes.values():
+        original = node.bound.afunc
+
+        async def counted(state, *args, _orig=original, **kwargs):
+            counter["n"] += 1
+            return await _orig(state, *args, **kwargs)
+
+        node.bound.afunc = counted
+    return counter
+
+
+# ---------- Deterministic LLM stub ----------
+class StubChain:
+    """Stands in for a prompt | llm | parser chain: fixed reply after a modelled latency."""
+
+    def __init__(self, reply, latency_s: float = 0.0, jitter_s: float = 0.0, seed: int = 0):
+        self.reply = reply
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.cancelled = 0  # calls abandoned before the reply came back
+
+    async def ainvoke(self, inputs):
+        self.calls += 1
+        delay = self.latency_s + (self.rng.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return self.reply(inputs)
+
+
+def stub_llm_rewriter(latency_s: float = 0.0, jitter_s: float = 0.0, seed: int = 0):
+    """A real EmpatheticRewriter (rules, caches, regex) whose LLM chains are StubChains."""
+    from empathetic_rewriter import EmpatheticRewriter
+
+    rw = EmpatheticRewriter(cache_path=None)
+    chain = lambda reply, i: StubChain(reply, latency_s, jitter_s, seed + i)  # noqa: E731
+    rw.rewrite_chain = chain(lambda x: x["text"], 0)
+    rw.greet_chain = chain(lambda x: f"Thank you for calling {x['firm']}. My name is {x['agent']}.", 1)
+    rw.extraction_chain = chain(lambda x: x["response"], 2)
+    rw.validation_chain = chain(lambda x: "VALID", 3)
+    rw.combined_chain = chain(lambda x: json.dumps({"value": x["response"], "status": "VALID"}), 4)
+    return rw
+
+
+def llm_calls(rw, field: str = "calls") -> int:
+    chains = (rw.rewrite_chain, rw.greet_chain, rw.extraction_chain, rw.validation_chain, rw.combined_chain)
+    return sum(getattr(c, field) for c in chains)
+
+
+# ---------- Fake voice session ----------
+class FakeTTS:
+    """tts.synthesize(): first frame after first_frame_s, then one frame per frame_s of synthesis."""
+
+    sample_rate = 24000
+    num_channels = 1
+
+    def __init__(self, first_frame_s: float = 0.15, frame_s: float = 0.005, frame_audio_s: float = 0.1, chars_per_frame: int = 12):
+        self.first_frame_s = first_frame_s
+        self.frame_s = frame_s
+        self.frame_audio_s = frame_audio_s
+        self.chars_per_frame = chars_per_frame
+        self.frames = 0  # synthesized, heard or not
+
+    def synthesize(self, text):
+        return _FakeStream(self, text)
+
+
+class _FakeStream:
+    def __init__(self, tts, text):
+        self.tts = tts
+        self.n = max(1, len(text) // tts.chars_per_frame)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        from livekit import rtc
+
+        tts = self.tts
+        await asyncio.sleep(tts.first_frame_s)
+        for i in range(self.n):
+            if i:
+                await asyncio.sleep(tts.frame_s)
+            samples = int(tts.sample_rate * tts.frame_audio_s)
+            tts.frames += 1
+            yield SimpleNamespace(frame=rtc.AudioFrame.create(tts.sample_rate, tts.num_channels, samples))
+
+
+class FakeSTT:
+    """Holds the endpointing the agent asked for; replay benchmarks wait that long before a final."""
+
+    def __init__(self, endpointing_ms: int = 1800):
+        self.endpointing_ms = endpointing_ms
+        self.updates = 0
+
+    def update_options(self, *, endpointing_ms=None, **kwargs):
+        if endpointing_ms is not None:
+            self.endpointing_ms = endpointing_ms
+        self.updates += 1
+
+
+class FakeSpeechHandle:
+    def __init__(self, coro):
+        self.interrupted = False
+        self._task = asyncio.ensure_future(coro)
+
+    def done(self):
+        return self._task.done()
+
+    def interrupt(self):
+        self.interrupted = True
+        self._task.cancel()
+
+    def __await__(self):
+        try:
+            yield from asyncio.shield(self._task).__await__()
+        except asyncio.CancelledError:
+            if not self.interrupted:
+                raise
+        return self
+
+
+class FakeSession:
+    """The bits of AgentSession a CallContext uses: event handlers, stt/tts, update_options() and say().
+
+    say() plays frames in real time (frame.duration each); without audio it
+    synthesizes with its own tts first, like AgentSession does.
+    """
+
+    def __init__(self, tts=None, stt=None):
+        self.tts = tts or FakeTTS()
+        self.stt = stt or FakeSTT()
+        self.options = {}
+        self.handlers = {}
+        self.said_at = []
+        self.played_s = 0.0
+        self.playing_until = 0.0
+
+    def on(self, name, fn):
+        self.handlers[name] = fn
+        return fn
+
+    def update_options(self, **kwargs):
+        self.options.update(kwargs)
+
+    def emit(self, name, ev):
+        if name in self.handlers:
+            self.handlers[name](ev)
+
+    def say(self, text, audio=None):
+        return FakeSpeechHandle(self._play(text, audio))
+
+    async def _play(self, text, audio):
+        if audio is None:
+            async def own():
+                async with self.tts.synthesize(text) as stream:
+                    async for ev in stream:
+                        yield ev.frame
+            audio = own()
+        first = True
+        async for frame in audio:
+            if first:
+                self.said_at.append(time.perf_counter())
+                first = False
+            await asyncio.sleep(frame.duration)
+            self.played_s += frame.duration
@@ -0,0 +1,117 @@
+"""Turn latency with and without speculative extraction on interim transcripts.
+
+Replays the intake_bench scripts through agent.CallContext the way Deepgram
+delivers them: a growing interim transcript every --word-ms, silence for
+--endpointing-ms, then the final (with a trailing full stop, or with an extra
+word for --revise-rate of turns, so the speculation has to be thrown away).
+Engine, storage and LLM are the offline stand-ins (agent_load_bench.setup);
+TTS is the fake session.
+
+Reports response latency (final transcript -> first spoken reply) per mode,
+the latency saved by speculating, and how often a speculated extraction was
+reused.
+
+    python benchmarks/speculation_bench.py --llm-ms 600 --endpointing-ms 1800
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+# first: sets the LiveKit env agent.py needs
+from agent_load_bench import FLOW_NAME, setup
+from intake_bench import SCRIPTS, pct
+from offline import FakeSession, FakeTTS, sia
+
+import agent
+from intake_metrics import reset, snapshot
+
+
+async def one_call(i: int, speculative: bool, args, rng: random.Random, latencies: list):
+    session = FakeSession(FakeTTS(first_frame_s=args.tts_ms / 1000))
+    injury = agent.StrictIntakeInjuryAgent(session_id=f"spec-{int(speculative)}-{i}")
+    call = agent.CallContext(session, injury)
+    call.speculative = speculative
+    call.coalesce_ms = 0  # one final per answer here; coalescing has its own bench
+    call.start_worker()
+    transcribed = session.handlers["user_input_transcribed"]
+    try:
+        await call.speak_all(await injury.initialize_conversation())
+        for text in SCRIPTS[i % len(SCRIPTS)]:
+            words = text.split()
+            for n in range(1, len(words) + 1):
+                transcribed(SimpleNamespace(is_final=False, transcript=" ".join(words[:n])))
+                await asyncio.sleep(args.word_ms / 1000)
+            await asyncio.sleep(args.endpointing_ms / 1000)
+            final = f"{text} please" if rng.random() < args.revise_rate else f"{text}."
+            t0 = time.perf_counter()
+            spoken = len(session.said_at)
+            transcribed(SimpleNamespace(is_final=True, transcript=final))
+            await call.drain()
+            if len(session.said_at) > spoken:
+                latencies.append((session.said_at[spoken] - t0) * 1000)
+    finally:
+        await call.aclose()
+
+
+async def run(speculative: bool, args):
+    await setup(args.llm_ms, args.seed)
+    await sia.flow_registry.get(FLOW_NAME)
+    reset()
+    latencies = []
+    rng = random.Random(args.seed)
+    await asyncio.gather(*(one_call(i, speculative, args, rng, latencies) for i in range(args.calls)))
+    await sia.answer_writer.flush()
+    await sia.event_publisher.aclose()
+    counters = snapshot()
+    return {
+        "speculative": speculative,
+        "turns": len(latencies),
+        "p50_ms": round(pct(latencies, 50), 1),
+        "p95_ms": round(pct(latencies, 95), 1),
+        "mean_ms": round(sum(latencies) / max(len(latencies), 1), 1),
+        "speculations": counters.get("speculative_extractions", 0),
+        "hits": counters.get("speculation_hits", 0),
+        "misses": counters.get("speculation_misses", 0),
+        "llm_validations": counters.get("llm_validations", 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=len(SCRIPTS), help="concurrent replayed calls")
+    parser.add_argument("--llm-ms", type=float, default=600.0)
+    parser.add_argument("--tts-ms", type=float, default=50.0, help="TTS time to first audio frame")
+    parser.add_argument("--word-ms", type=float, default=200.0, help="time between interim transcripts")
+    parser.add_argument("--endpointing-ms", type=float, default=1800.0, help="silence before the final")
+    parser.add_argument("--stable-ms", type=float, default=agent.SPECULATE_STABLE_MS)
+    parser.add_argument("--revise-rate", type=float, default=0.1, help="share of finals that differ from the last interim")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    agent.SPECULATE_STABLE_MS = args.stable_ms
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            off = asyncio.run(run(False, args))
+            on = asyncio.run(run(True, args))
+        finally:
+            sys.stdout = stdout
+
+    print(json.dumps({
+        "config": vars(args),
+        "results": [off, on],
+        "saved_ms": {
+            "p50": round(off["p50_ms"] - on["p50_ms"], 1),
+            "p95": round(off["p95_ms"] - on["p95_ms"], 1),
+            "mean": round(off["mean_ms"] - on["mean_ms"], 1),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
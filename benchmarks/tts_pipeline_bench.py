@@ -0,0 +1,82 @@
+"""Time to first audio and gaps between sentences in CallContext.speak_all.
+
+Speaks multi-sentence replies through a fake TTS (fixed time to first frame,
+frames produced faster than real time) and a fake session that plays frames
+in real time. Compares sequential synthesis (--prefetch 0: each sentence is
+synthesized only after the previous one finished playing, as before) with
+pipelined synthesis. --cached adds a run per setting with the replies'
+audio already in the TTS audio cache (a temporary directory), as for the
+fixed lines and flow prompts a worker preloads.
+
+    python benchmarks/tts_pipeline_bench.py --tts-first-frame-ms 200 --prefetch 0 2 --cached
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+for _var, _value in {
+    "LIVEKIT_URL": "ws://localhost:7880", "LIVEKIT_API_KEY": "bench", "LIVEKIT_API_SECRET": "bench",
+}.items():
+    os.environ.setdefault(_var, _value)  # agent.py refuses to import without them
+
+import httpx  # noqa: E402
+from offline import FakeSession, FakeTTS, sia  # noqa: E402
+
+import agent  # noqa: E402
+from intake_metrics import reset, timings  # noqa: E402
+from tts_cache import TTSAudioCache  # noqa: E402
+
+REPLIES = [
+    "Thanks, I have that. I'm sorry that happened to you. When did the incident happen?",
+    "Got it. Thank you for your patience. Were there any witnesses? Take your time.",
+    "I understand. That sounds painful. Did you receive medical treatment? Please include any hospital visits.",
+]
+
+
+async def run(prefetch: int, first_frame_ms: float, rounds: int, cache_dir: str = ""):
+    sia.event_publisher = sia.EventPublisher(transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+    session = FakeSession(FakeTTS(first_frame_s=first_frame_ms / 1000))
+    cache = None
+    if cache_dir:
+        cache = TTSAudioCache(path=cache_dir)
+        cache.register(agent.cacheable_chunks(REPLIES))
+    call = agent.CallContext(session, agent.StrictIntakeInjuryAgent(session_id="tts-bench"), cache)
+    call.prefetch = prefetch
+    if cache:
+        for reply in REPLIES:  # fill the cache, then measure warm playback only
+            await call.speak_all(reply)
+    reset()
+    for i in range(rounds):
+        await call.speak_all(REPLIES[i % len(REPLIES)])
+    await sia.event_publisher.aclose()
+    t = timings()
+    return {"prefetch": prefetch, "cached": bool(cache), "first_audio_ms": t["tts_first_audio_ms"], "gap_ms": t["tts_gap_ms"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prefetch", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--tts-first-frame-ms", type=float, default=200.0)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--cached", action="store_true", help="also run with the replies' audio cached")
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            results = [asyncio.run(run(p, args.tts_first_frame_ms, args.rounds)) for p in args.prefetch]
+            if args.cached:
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    results += [
+                        asyncio.run(run(p, args.tts_first_frame_ms, args.rounds, cache_dir)) for p in args.prefetch
+                    ]
+        finally:
+            sys.stdout = stdout
+    print(json.dumps({"config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Voice agent launch latency: cold spawn per session vs. a pre-warmed worker.
+
+Cold is what /api/intake/start does for every session by default (start a
+process that imports the agent stack and loads Silero VAD, then begins the
+session). Warm is the VoicePool path (the worker is already up; the session
+is handed over stdin). Reused is a warm worker taking its next session after
+releasing one.
+
+What is timed is launch -> the worker acknowledges the session ("assigned"),
+with VOICE_WORKER_DRY_RUN=1 so no LiveKit console is opened. Launch-to-first-
+prompt latency is NOT measured here: it needs a room, the STT/TTS providers
+and a flow store. The server records it live at GET /api/voice/pool
+(launch_to_first_prompt_ms).
+
+    python benchmarks/voice_launch_bench.py --runs 5
+    python benchmarks/voice_launch_bench.py --runs 5 --cold-prefix "uv run"
+"""
+import argparse
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER = os.path.join(ROOT, "src", "voice_worker.py")
+# agent.py refuses to start without these; the dry run never connects anywhere.
+PLACEHOLDER_ENV = {
+    "LIVEKIT_URL": "ws://localhost:7880", "LIVEKIT_API_KEY": "bench", "LIVEKIT_API_SECRET": "bench",
+    "DEEPGRAM_API_KEY": "bench", "CARTESIA_API_KEY": "bench", "OPENAI_API_KEY": "bench",
+}
+
+
+def spawn(prefix):
+    r, w = os.pipe()
+    env = {**PLACEHOLDER_ENV, **os.environ, "VOICE_WORKER_STATUS_FD": str(w), "VOICE_WORKER_DRY_RUN": "1"}
+    proc = subprocess.Popen([*prefix, WORKER], stdin=subprocess.PIPE, env=env, cwd=ROOT,
+                            pass_fds=(w,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(w)
+    return proc, os.fdopen(r, "rb")
+
+
+def wait_for(status, event):
+    for line in status:
+        if json.loads(line).get("event") == event:
+            return
+    raise RuntimeError(f"worker exited before '{event}' (check the environment)")
+
+
+def assign(proc, session_id):
+    proc.stdin.write((json.dumps({"cmd": "assign", "session_id": session_id}) + "\n").encode())
+    proc.stdin.flush()
+
+
+def finish(proc):
+    proc.stdin.close()  # EOF: the worker exits
+    proc.wait()
+
+
+def cold(prefix, i):
+    t0 = time.perf_counter()
+    proc, status = spawn(prefix)
+    assign(proc, f"cold-{i}")  # queued in the pipe until the worker is up
+    wait_for(status, "assigned")
+    elapsed = time.perf_counter() - t0
+    finish(proc)
+    return elapsed * 1000
+
+
+def warm(i):
+    proc, status = spawn([sys.executable])
+    wait_for(status, "ready")  # the pool does this ahead of time
+    t0 = time.perf_counter()
+    assign(proc, f"warm-{i}")
+    wait_for(status, "assigned")
+    elapsed = time.perf_counter() - t0
+    wait_for(status, "released")
+    t1 = time.perf_counter()
+    assign(proc, f"reused-{i}")  # same process, next session
+    wait_for(status, "assigned")
+    reused = time.perf_counter() - t1
+    finish(proc)
+    return elapsed * 1000, reused * 1000
+
+
+def summary(samples):
+    return {"runs": len(samples), "p50_ms": round(statistics.median(samples), 1),
+            "mean_ms": round(statistics.fmean(samples), 1), "max_ms": round(max(samples), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--cold-prefix", default="", help='launcher for the cold path, e.g. "uv run"')
+    args = parser.parse_args()
+    prefix = [*shlex.split(args.cold_prefix), "python"] if args.cold_prefix else [sys.executable]
+
+    cold_ms = [cold(prefix, i) for i in range(args.runs)]
+    warm_ms, reused_ms = zip(*(warm(i) for i in range(args.runs)))
+    report = {
+        "measured": "launch_to_assigned_ms (launch_to_first_prompt_ms: not measured, see GET /api/voice/pool)",
+        "cold_spawn_per_session": summary(cold_ms),
+        "warm_pool": summary(warm_ms),
+        "warm_pool_reused_worker": summary(reused_ms),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
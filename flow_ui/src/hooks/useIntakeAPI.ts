@@ -1,5 +1,5 @@
-import { useState, useEffect, useCallback } from 'react';
-import { IntakeStep, SessionInfo } from '../types/IntakeTypes';
+import { useState, useEffect, useCallback, useRef } from 'react';
+import { IntakeState, IntakeStep, SessionEvent, SessionInfo } from '../types/IntakeTypes';
 
 // Configuration for your Python backend
 const API_BASE_URL = 'http://localhost:8000';
@@ -17,12 +17,33 @@ interface UseIntakeAPIReturn {
   deleteStep: (params: { name: string; flow_name?: string; }) => Promise<boolean>;
 }
 
+// Merge a (delta-encoded) session event into the local state
+const applySessionEvent = (state: IntakeState, ev: SessionEvent): IntakeState => {
+  const collected = ev.event === 'snapshot' ? { ...(ev.collected_data || {}) } : { ...(state.collected_data || {}) };
+  if (ev.data_changed) Object.assign(collected, ev.data_changed);
+  (ev.data_removed || []).forEach(key => { delete collected[key]; });
+  let completed = ev.completed_steps ?? state.completed_steps ?? [];
+  if (ev.steps_added) completed = [...completed, ...ev.steps_added];
+
+  const next: IntakeState = { ...state, collected_data: collected, completed_steps: completed };
+  if ((ev.event === 'node_entered' || ev.event === 'snapshot') && ev.node_id) {
+    next.current_step = ev.node_id;
+    next.session_status = ev.node_id === 'completed' ? 'completed' : state.session_status;
+  }
+  if (ev.event === 'session_ended') {
+    next.current_step = 'completed';
+    next.session_status = 'completed';
+  }
+  return next;
+};
+
 export const useIntakeAPI = (): UseIntakeAPIReturn => {
   const [sessionInfo, setSessionInfo] = useState<SessionInfo | null>(null);
   const [steps, setSteps] = useState<IntakeStep[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [ws, setWs] = useState<WebSocket | null>(null);
+  const lastSeq = useRef(0);
 
   // Load flow steps from your backend
   const loadSteps = useCallback(async () => {
@@ -181,66 +202,31 @@ export const useIntakeAPI = (): UseIntakeAPIReturn => {
 
         console.log('DEBUG Setting up WebSocket for session:', sessionInfo.session_id);
         const socket = new WebSocket(WS_URL);
+        lastSeq.current = 0;
 
         socket.onopen = () => {
           console.log('DEBUG WebSocket connected, sending session ID');
-          socket.send(JSON.stringify({ session_id: sessionInfo.session_id }));
+          // The server replays what we missed since since_seq, or sends a snapshot
+          socket.send(JSON.stringify({ session_id: sessionInfo.session_id, since_seq: lastSeq.current }));
         };
 
         socket.onmessage = (evt) => {
-          const ev = JSON.parse(evt.data);
+          const ev: SessionEvent = JSON.parse(evt.data);
           console.log('DEBUG WebSocket message received:', ev);
 
-          if (ev.event === 'node_entered') {
-            console.log('DEBUG Updating current step to:', ev.node_id);
-        setSessionInfo(prev =>
-          prev
-            ? {
-                ...prev,
-                state: {
-                  ...prev.state,
-                  current_step: ev.node_id,
-                  collected_data: ev.collected_data || prev.state.collected_data || {},
-                  completed_steps: ev.completed_steps || prev.state.completed_steps || [],
-                  session_status: ev.node_id === 'completed' ? 'completed' : prev.state.session_status
-                }
+          if (typeof ev.seq === 'number') {
+            if (ev.event !== 'snapshot') {
+              if (ev.seq <= lastSeq.current) return; // already applied (replay overlap)
+              if (ev.seq !== lastSeq.current + 1) {
+                // Missed events: deltas can't be applied across a gap, ask for a replay
+                socket.send(JSON.stringify({ since_seq: lastSeq.current }));
+                return;
               }
-            : prev
-        );
-      }
-      if (ev.event === 'user_heard') {
-        console.log('DEBUG User input heard:', ev.text);
-        // Update collected data if provided
-        if (ev.collected_data || ev.completed_steps) {
-          setSessionInfo(prev => {
-            if (!prev) return prev;
-            return {
-              ...prev,
-              state: {
-                ...prev.state,
-                collected_data: ev.collected_data || prev.state.collected_data || {},
-                completed_steps: ev.completed_steps || prev.state.completed_steps || []
-              }
-            };
-          });
-        }
-      }
-
-      if (ev.event === 'session_ended') {
-        console.log('DEBUG Session completed successfully!');
-        setSessionInfo(prev => {
-          if (!prev) return prev;
-          return {
-            ...prev,
-            state: {
-              ...prev.state,
-              current_step: 'completed',
-              session_status: 'completed'
             }
-          };
-        });
-      }
-    };
+            lastSeq.current = ev.seq;
+          }
+          setSessionInfo(prev => (prev ? { ...prev, state: applySessionEvent(prev.state, ev) } : prev));
+        };
 
         socket.onerror = (error) => {
           console.error('ERROR WebSocket error:', error);
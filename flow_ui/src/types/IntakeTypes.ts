@@ -26,6 +26,19 @@ export interface SessionInfo {
   connected: boolean;
 }
 
+// WebSocket event from server.py: numbered per session, state sent as deltas
+export interface SessionEvent {
+  event: string;
+  seq?: number;
+  node_id?: string;
+  text?: string;
+  data_changed?: Record<string, string>;
+  data_removed?: string[];
+  steps_added?: string[];
+  collected_data?: Record<string, string>; // snapshot only
+  completed_steps?: string[]; // snapshot, or when the list changed other than by appending
+}
+
 export interface FlowEvent {
   type: 'step_started' | 'step_completed' | 'user_input' | 'ai_response' | 'flow_completed';
   step_name?: string;
@@ -1,65 +1,136 @@
 # server.py
 import os
 import json
-import subprocess
 import asyncio
-from typing import Dict, Set
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from src.strict_intake_assistant import (
+    CHECKPOINTER,
     StrictIntakeAssistant,
-    load_flow_steps_raw,
+    flow_listing,
     insert_step_after_db,
     update_step_db,
+    move_step_db,
     delete_step,
+    apply_flow_batch,
+    answer_writer,
+    metrics_snapshot,
 )
+from src.event_fanout import Fanout, Subscriber
+from src.session_store import SESSION_SWEEP_S, SessionStore
+from src.voice_pool import PoolFullError, VoicePool
 
-app = FastAPI()
+DEFAULT_FLOW = "injury_intake_strict"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(sweep_sessions())
+    await voice_pool.start()
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        await voice_pool.close()
+        try:
+            await answer_writer.flush()
+        except Exception as e:
+            print(f"[DB][WARN] answer flush on shutdown failed: {e!r}")
+        await asyncio.to_thread(CHECKPOINTER.close)  # writes out queued checkpoints
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"]
 )
 
-# live session cache
-assistants: Dict[str, StrictIntakeAssistant] = {}
-states: Dict[str, dict] = {}
+# ws subscribers (bounded per-subscriber queues, see event_fanout)
+fanout = Fanout()
 
-# ws subscribers
-subs: Dict[str, Set[WebSocket]] = {}
+# voice agents: spawn per session, or a warm worker pool with VOICE_POOL_SIZE > 0 (see voice_pool)
+voice_pool = VoicePool(on_event=lambda session_id, event: broadcast(session_id, event))
 
-# voice agent process tracking
-voice_processes: Dict[str, subprocess.Popen] = {}
 
-async def broadcast(session_id: str, event: dict):
-    print(f"DEBUG Broadcasting to session {session_id}: {event}")
-    print(f"DEBUG Active subscribers for {session_id}: {len(subs.get(session_id, set()))}")
-    for ws in list(subs.get(session_id, set())):
-        try:
-            msg = json.dumps(event)
-            await ws.send_text(msg)
-            print(f"DEBUG Sent to WebSocket: {msg}")
-        except Exception as e:
-            print(f"ERROR WebSocket send failed: {e}")
-            subs[session_id].discard(ws)
+def voice_attached(session_id: str) -> bool:
+    return voice_pool.has(session_id)
+
+
+def on_session_evicted(session_id: str, reason: str):
+    print(f"[SESSIONS] evicted {session_id} ({reason})")
+
+
+# live session cache: bounded, state itself is in the engine checkpointer
+sessions = SessionStore(pinned=voice_attached, on_evict=on_session_evicted)
+
+
+async def sweep_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_S)
+        sessions.sweep()
+
+
+async def current_state(assistant: StrictIntakeAssistant, session_id: str) -> dict:
+    snapshot = await assistant.app.aget_state({"configurable": {"thread_id": session_id}})
+    return snapshot.values if snapshot else {}
+
+
+async def resume_session(session_id: str, flow_name: Optional[str] = None) -> StrictIntakeAssistant:
+    """Resident assistant for a session; evicted sessions come back from their checkpoint."""
+    s = sessions.get(session_id)
+    if s:
+        return s.assistant
+    flow = sessions.flow_of(session_id) or flow_name or DEFAULT_FLOW
+    assistant = await StrictIntakeAssistant.create(flow)
+    st = await current_state(assistant, session_id)
+    if st:
+        sessions.restores += 1
+    else:
+        await assistant.start(session_id)
+        st = await current_state(assistant, session_id)
+    sessions.put(session_id, assistant, flow, st)
+    return assistant
+
+def broadcast(session_id: str, event: dict):
+    """Queue an event for the session's WebSocket subscribers; never waits on socket I/O."""
+    voice_pool.note_event(session_id, event)
+    fanout.publish(session_id, event)
+
+def _edited(name: str, rows) -> dict:
+    """Edit response: cache the refreshed rows under the new flow version and return them."""
+    version, steps = flow_listing.prime(name, rows)
+    return {"ok": True, "steps": steps, "version": flow_listing.token(version)}
+
 
 @app.get("/api/flows/{name}/steps")
-async def get_steps(name: str):
-    # Return ordered rows including order_index so UI can render correctly
-    rows = await load_flow_steps_raw(name)
-    out = []
-    for r in rows:
-        out.append({
-            "name": r.get("name"),
-            "ask_prompt": r.get("ask_prompt"),
-            "input_key": r.get("input_key"),
-            "next_name": r.get("next_name"),
-            "system_prompt": r.get("system_prompt"),
-            "validate_regex": r.get("validate_regex"),
-            "order_index": r.get("order_index"),
-        })
-    return out
+async def get_steps(name: str, request: Request, since_version: Optional[str] = None):
+    """Ordered steps (with order_index so the UI can render correctly), served from the
+    version-keyed listing cache.
+
+    Sends an ETag (304 on a matching If-None-Match). With ``since_version`` (a
+    version token from an earlier response) it returns only what changed:
+    {"version", "delta": true, "changed": [...], "removed": [...]}; if that
+    version is too old it falls back to the full list.
+    """
+    version, steps = await flow_listing.get(name)
+    token = flow_listing.token(version)
+    headers = {"ETag": f'W/"{token}"', "X-Flow-Version": token, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    if since_version is not None:
+        since = flow_listing.parse_token(since_version)
+        delta = flow_listing.changes_since(name, since, version) if since is not None else None
+        if delta is not None:
+            changed, removed = delta
+            return JSONResponse(
+                {"version": token, "delta": True, "changed": changed, "removed": removed}, headers=headers
+            )
+    return JSONResponse(steps, headers=headers)
 
 
 @app.post("/api/flows/{name}/steps/insert_after")
@@ -85,19 +156,7 @@ async def insert_step_after(name: str, payload: dict = Body(...)):
             validate_regex=validate_regex,
             system_prompt=system_prompt,
         )
-        # Normalize response similar to GET /steps
-        out = []
-        for r in rows:
-            out.append({
-                "name": r.get("name"),
-                "ask_prompt": r.get("ask_prompt"),
-                "input_key": r.get("input_key"),
-                "next_name": r.get("next_name"),
-                "system_prompt": r.get("system_prompt"),
-                "validate_regex": r.get("validate_regex"),
-                "order_index": r.get("order_index"),
-            })
-        return {"ok": True, "steps": out}
+        return _edited(name, rows)
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -107,18 +166,34 @@ async def patch_step(name: str, step: str, payload: dict = Body(...)):
     """Update fields for a step and return refreshed ordered steps."""
     try:
         rows = await update_step_db(name, step, payload or {})
-        out = []
-        for r in rows:
-            out.append({
-                "name": r.get("name"),
-                "ask_prompt": r.get("ask_prompt"),
-                "input_key": r.get("input_key"),
-                "next_name": r.get("next_name"),
-                "system_prompt": r.get("system_prompt"),
-                "validate_regex": r.get("validate_regex"),
-                "order_index": r.get("order_index"),
-            })
-        return {"ok": True, "steps": out}
+        return _edited(name, rows)
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.post("/api/flows/{name}/steps/{step}/move")
+async def move_step(name: str, step: str, payload: dict = Body(...)):
+    """Move a step after another one ({"after": null} moves it to the front)."""
+    try:
+        rows = await move_step_db(name, step, payload.get("after"))
+        return _edited(name, rows)
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+
+@app.post("/api/flows/{name}/batch")
+async def batch_edit(name: str, payload: dict = Body(...)):
+    """Apply a list of step edits ({"ops": [...]}) in one request.
+
+    Ops: insert_after / update / delete / move, with the same fields as the
+    single-step endpoints. Nothing is written if any op is invalid.
+    """
+    ops = payload.get("ops")
+    if not isinstance(ops, list) or not ops:
+        return {"ok": False, "error": "ops must be a non-empty list"}
+    try:
+        rows = await apply_flow_batch(name, ops)
+        return _edited(name, rows)
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -129,20 +204,8 @@ async def delete_step_endpoint(name: str, step: str):
     try:
         success = await delete_step(name, step)
         if success:
-            # Return updated steps list
-            rows = await load_flow_steps_raw(name)
-            out = []
-            for r in rows:
-                out.append({
-                    "name": r.get("name"),
-                    "ask_prompt": r.get("ask_prompt"),
-                    "input_key": r.get("input_key"),
-                    "next_name": r.get("next_name"),
-                    "system_prompt": r.get("system_prompt"),
-                    "validate_regex": r.get("validate_regex"),
-                    "order_index": r.get("order_index"),
-                })
-            return {"ok": True, "steps": out}
+            version, steps = await flow_listing.get(name)
+            return {"ok": True, "steps": steps, "version": flow_listing.token(version)}
         else:
             return {"ok": False, "error": "Failed to delete step"}
     except Exception as e:
@@ -150,54 +213,46 @@ async def delete_step_endpoint(name: str, step: str):
 
 @app.post("/api/intake/start")
 async def start(payload: dict = Body(...)):
-    flow = payload.get("flow_name", "injury_intake_strict")
+    flow = payload.get("flow_name", DEFAULT_FLOW)
     session_id = payload.get("session_id") or f"ui_{os.urandom(4).hex()}"
     launch_voice = payload.get("launch_voice", False)
     
     # Create text-based assistant for UI interaction
     assistant = await StrictIntakeAssistant.create(flow)
-    assistants[session_id] = assistant
     first = await assistant.start(session_id)
     # expose state
-    st = (await assistant.app.aget_state({"configurable":{"thread_id":session_id}})).values
-    states[session_id] = st
-    await broadcast(session_id, {
+    st = await current_state(assistant, session_id)
+    sessions.put(session_id, assistant, flow, st)
+    broadcast(session_id, {
         "event":"node_entered",
         "node_id": st.get("current_step"),
         "collected_data": st.get("collected_data", {}),
         "completed_steps": st.get("completed_steps", [])
     })
     
-    # Launch voice agent if requested
+    # Launch voice agent if requested (a warm pool worker takes the same session_id)
+    voice = None
     if launch_voice:
         try:
-            # Launch the voice agent process with the same session_id
-            env = os.environ.copy()
-            env["FORCED_SESSION_ID"] = session_id  # Pass session ID to voice agent
-            voice_process = subprocess.Popen([
-                "uv", "run", "python", "src/agent.py", "console"
-            ], cwd=os.getcwd(), env=env)
-            voice_processes[session_id] = voice_process
-            await broadcast(session_id, {"event": "voice_agent_started", "process_id": voice_process.pid})
+            voice = await voice_pool.launch(session_id)
+        except PoolFullError as e:
+            voice = {"status": "rejected", "error": str(e)}
+            broadcast(session_id, {"event": "voice_agent_error", "error": str(e)})
         except Exception as e:
-            await broadcast(session_id, {"event": "voice_agent_error", "error": str(e)})
-    
-    return {"session_id": session_id, "reply": first, "state": st, "voice_launched": launch_voice}
+            broadcast(session_id, {"event": "voice_agent_error", "error": str(e)})
+
+    return {"session_id": session_id, "reply": first, "state": st, "voice_launched": launch_voice, "voice": voice}
 
 @app.post("/api/intake/message")
 async def message(payload: dict = Body(...)):
     session_id = payload["session_id"]
     text = payload["message"]
-    assistant = assistants.get(session_id)
-    if not assistant:
-        assistant = await StrictIntakeAssistant.create(payload.get("flow_name","injury_intake_strict"))
-        assistants[session_id] = assistant
-        await assistant.start(session_id)
-    await broadcast(session_id, {"event":"user_heard","text": text})
+    assistant = await resume_session(session_id, payload.get("flow_name"))
+    broadcast(session_id, {"event":"user_heard","text": text})
     reply = await assistant.handle_user(text, session_id)
-    st = (await assistant.app.aget_state({"configurable":{"thread_id":session_id}})).values
-    states[session_id] = st
-    await broadcast(session_id, {
+    st = await current_state(assistant, session_id)
+    sessions.update_state(session_id, st)
+    broadcast(session_id, {
         "event":"node_entered",
         "node_id": st.get("current_step"),
         "collected_data": st.get("collected_data", {}),
@@ -205,51 +260,79 @@ async def message(payload: dict = Body(...)):
     })
     return {"reply": reply, "state": st}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Engine counters, e.g. llm_validations vs. llm_validations_avoided."""
+    return metrics_snapshot()
+
+@app.get("/api/sessions/stats")
+async def get_session_stats():
+    """Resident session count, approximate bytes, evictions by reason and restores."""
+    return {**sessions.stats(), "voice_agents": voice_pool.stats()["busy"]}
+
+@app.get("/api/voice/pool")
+async def get_voice_pool():
+    """Warm/busy/queued workers and launch-to-first-prompt latency."""
+    return voice_pool.stats()
+
 @app.get("/api/intake/state/{session_id}")
 async def get_state(session_id: str):
-    return states.get(session_id, {})
+    st = sessions.state(session_id)
+    if st is None and sessions.flow_of(session_id):
+        # Evicted: read the checkpoint without making the session resident again.
+        assistant = await StrictIntakeAssistant.create(sessions.flow_of(session_id))
+        st = await current_state(assistant, session_id)
+    return st or {}
+
+@app.post("/events/batch")
+async def post_events_batch(payload: dict = Body(...)):
+    """Batched delivery from EventPublisher: {"events": [{"session_id", "event"}, ...]}."""
+    events = payload.get("events") or []
+    for item in events:
+        session_id = item.get("session_id")
+        event = item.get("event")
+        if session_id and isinstance(event, dict):
+            broadcast(session_id, event)
+    return {"ok": True, "count": len(events)}
 
 @app.post("/events/{session_id}")
 async def post_event(session_id: str, payload: dict = Body(...)):
-    await broadcast(session_id, payload)
+    broadcast(session_id, payload)
     return {"ok": True}
 
 @app.post("/api/voice/stop/{session_id}")
 async def stop_voice_agent(session_id: str):
-    if session_id in voice_processes:
-        try:
-            process = voice_processes[session_id]
-            process.terminate()
-            await asyncio.sleep(1)  # Give it time to terminate gracefully
-            if process.poll() is None:  # Still running
-                process.kill()
-            del voice_processes[session_id]
-            await broadcast(session_id, {"event": "voice_agent_stopped"})
+    try:
+        if await voice_pool.stop(session_id):
             return {"ok": True, "message": "Voice agent stopped"}
-        except Exception as e:
-            return {"ok": False, "error": str(e)}
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
     return {"ok": False, "message": "No voice agent running for this session"}
 
 @app.websocket("/ws")
 async def ws(ws: WebSocket):
     await ws.accept()
-    print("DEBUG WebSocket connection accepted")
     session_id = None
+    sub = None
     try:
         init = await ws.receive_json()
         session_id = init.get("session_id")
-        print(f"DEBUG WebSocket subscribed to session: {session_id}")
-        subs.setdefault(session_id, set()).add(ws)
-        print(f"DEBUG Total subscribers for {session_id}: {len(subs[session_id])}")
+        sub = Subscriber(ws.send_text, close=lambda: ws.close(code=1013))
+        since_seq = init.get("since_seq")
+        fanout.subscribe(session_id, sub, since_seq=since_seq if isinstance(since_seq, int) else None)
         while True:
-            await ws.receive_text()  # keepalive if you want
+            # Keepalives, or {"since_seq": n} when the client saw a gap in seq.
+            try:
+                msg = json.loads(await ws.receive_text())
+            except ValueError:
+                continue
+            if isinstance(msg, dict) and isinstance(msg.get("since_seq"), int):
+                fanout.catch_up(session_id, sub, msg["since_seq"])
     except WebSocketDisconnect:
-        print(f"DEBUG WebSocket disconnected for session: {session_id}")
         pass
     finally:
-        if session_id:
-            subs.get(session_id, set()).discard(ws)
-            print(f"DEBUG Removed WebSocket subscriber for session: {session_id}")
+        if sub:
+            fanout.unsubscribe(session_id, sub)
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
\ No newline at end of file
@@ -3,8 +3,11 @@ import os
 import re
 import json
 import asyncio
+import threading
+import time
 import uuid
-from datetime import datetime
+from collections import deque
+from typing import Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
@@ -19,9 +22,20 @@ from livekit.agents import (
     metrics,
 )
 from livekit.plugins import cartesia, deepgram, noise_cancellation
-from strict_intake_assistant import StrictIntakeAssistant, emit_event
+from strict_intake_assistant import (
+    CHECKPOINTER,
+    DEFAULT_TURN_TIMING,
+    FAREWELL_REPLY,
+    StrictIntakeAssistant,
+    answer_writer,
+    emit_event,
+    flow_registry,
+    publish_event,
+    speakable_lines,
+)
+from intake_metrics import incr, observe
+from tts_cache import TTSAudioCache, tts_settings
 from livekit.plugins import silero
-import httpx
 
 logger = logging.getLogger("agent")
 
@@ -57,18 +71,30 @@ if missing_vars:
     exit(1)
 
 
+FLOW_NAME = "injury_intake_strict"
+TTS_VOICE = "6f84f4b8-58a2-430c-8c79-688dad597532"
+
+# Fixed agent lines; their audio is cached like the engine's STATIC_REPLIES
+UNAVAILABLE_REPLY = "Thank you for calling Srushti Jagtap. I'm having technical difficulties. Please try again."
+HELLO_REPLY = "Hello! How can I help you today?"
+REPEAT_REPLY = "I didn't catch that. Could you please repeat?"
+NO_RESPONSE_REPLY = "I apologize, I didn't generate a proper response. Could you please repeat that?"
+TECHNICAL_ISSUE_REPLY = "I apologize, but I encountered a technical issue. Could you please repeat your response so I can assist you properly?"
+FALLBACK_LINES = (UNAVAILABLE_REPLY, HELLO_REPLY, REPEAT_REPLY, NO_RESPONSE_REPLY, TECHNICAL_ISSUE_REPLY)
+
+
 class StrictIntakeInjuryAgent(Agent):
     """Strict Intake Assistant with Supabase-driven flow"""
     
-    def __init__(self, model_name: str = "qwen2.5:3b") -> None:
+    def __init__(self, model_name: str = "qwen2.5:3b", session_id: Optional[str] = None) -> None:
         super().__init__(
             instructions="You are Michelle, a professional intake specialist for Srushti Jagtap law firm.",
         )
         
         # Initialize placeholders - actual initialization happens in initialize_conversation
         self.assistant = None
-        # Use forced session ID if provided, otherwise generate new one
-        forced_session = os.getenv("FORCED_SESSION_ID")
+        # Use the job's / forced session ID if provided, otherwise generate new one
+        forced_session = session_id or os.getenv("FORCED_SESSION_ID")
         if forced_session:
             self.session_id = forced_session
             print(f"🔗 Using forced session ID: {self.session_id}")
@@ -88,29 +114,29 @@ class StrictIntakeInjuryAgent(Agent):
             try:
                 # Create the assistant first if not already created
                 if self.assistant is None:
-                    self.assistant = await StrictIntakeAssistant.create(flow_name="injury_intake_strict")
+                    self.assistant = await StrictIntakeAssistant.create(flow_name=FLOW_NAME)
                 
                 response = await self.assistant.start(self.session_id)
                 if not response:
-                    return "Thank you for calling Srushti Jagtap. I'm having technical difficulties. Please try again."
+                    return UNAVAILABLE_REPLY
                 return response
             except Exception as e:
                 print(f" Initialization error: {e}")
-                return "Thank you for calling Srushti Jagtap. I'm having technical difficulties. Please try again."
-        return "Hello! How can I help you today?"
+                return UNAVAILABLE_REPLY
+        return HELLO_REPLY
     
     async def handle_user_message(self, user_msg: str) -> str:
         """Handle user messages using strict intake workflow"""
         if not user_msg or not user_msg.strip():
-            return "I didn't catch that. Could you please repeat?"
+            return REPEAT_REPLY
         
         try:
             response = await self.assistant.handle_user(user_msg.strip(), self.session_id)
             if not response:
-                return "I apologize, I didn't generate a proper response. Could you please repeat that?"
+                return NO_RESPONSE_REPLY
             
             # Check if this was a farewell that ended the session
-            if "Thanks, your intake is saved" in response and "Goodbye!" in response:
+            if response == FAREWELL_REPLY:
                 # Emit session ended event for old session
                 old = self.session_id
                 self.new_session()
@@ -119,132 +145,572 @@ class StrictIntakeInjuryAgent(Agent):
                 await emit_event(self.session_id, {
                     "event": "session_started",
                     "session_id": self.session_id,
-                    "flow_name": "injury_intake_strict"
+                    "flow_name": FLOW_NAME
                 })
             
             return response
         except Exception as e:
             print(f" Message handling error: {e}")
-            return "I apologize, but I encountered a technical issue. Could you please repeat your response so I can assist you properly?"
+            return TECHNICAL_ISSUE_REPLY
     
+    async def prepare_turn(self, user_msg: str) -> bool:
+        """Run the answer's extraction ahead of handle_user_message; safe to cancel, nothing is stored yet."""
+        if self.assistant is None or not user_msg or not user_msg.strip():
+            return False
+        try:
+            return await self.assistant.prepare(user_msg.strip(), self.session_id)
+        except Exception as e:
+            print(f" Prepare error: {e}")
+            return False
+
+    async def turn_timing(self) -> dict:
+        """Endpointing for the step now waiting for an answer."""
+        if self.assistant is None:
+            return DEFAULT_TURN_TIMING
+        try:
+            return await self.assistant.turn_timing(self.session_id)
+        except Exception as e:
+            print(f" Turn timing error: {e}")
+            return DEFAULT_TURN_TIMING
+
+    async def llm_calls_avoided(self, fragments) -> int:
+        """How many of these merged-away fragments would have needed an LLM extraction as turns of their own."""
+        if self.assistant is None:
+            return 0
+        try:
+            return sum([await self.assistant.needs_llm(f, self.session_id) for f in fragments])
+        except Exception as e:
+            print(f" LLM estimate error: {e}")
+            return 0
+
+    async def speculate(self, partial_text: str) -> bool:
+        """Let the engine start extracting from a stable interim transcript."""
+        if self.assistant is None:
+            return False
+        try:
+            return await self.assistant.speculate(partial_text, self.session_id)
+        except Exception as e:
+            print(f" Speculation error: {e}")
+            return False
+
     def get_initial_greeting(self) -> str:
         """Get the initial greeting message from LangGraph assistant"""
         return "Initializing conversation..."  # This will be replaced by initialize_conversation
 
 
+# -------------------------------------------------------------------
+# Shared per process: heavy resources loaded once in prewarm
+# -------------------------------------------------------------------
+_vad = None
+_vad_lock = threading.Lock()
+
+
+def load_vad():
+    """Silero VAD, loaded once per process and shared by every call it hosts."""
+    global _vad
+    with _vad_lock:
+        if _vad is None:
+            _vad = silero.VAD.load()
+        return _vad
+
+
 def prewarm(proc: JobProcess):
-    pass
+    warm_process()
+    proc.userdata["vad"] = load_vad()
 
 
-# -------------------------------------------------------------------
-# Minimal, sequential voice loop (lock + queue + pause/resume)
-# -------------------------------------------------------------------
+def build_tts():
+    return cartesia.TTS(voice=TTS_VOICE)
+
+
+# Endpointing before the first prompt, and for every turn when ADAPTIVE_ENDPOINTING is off
+STT_ENDPOINTING_MS = int(os.getenv("STT_ENDPOINTING_MS", "1800"))
+# Switch endpointing per step (short for slot filling, long for narratives) as the call moves on
+ADAPTIVE_ENDPOINTING = os.getenv("ADAPTIVE_ENDPOINTING", "1") not in ("", "0", "false", "False")
 
-# Single shared session with SHORT endpointing (snappy turn-taking)
-session = AgentSession(
-    stt=deepgram.STT(
-        model="nova-3",
-        language="multi",
-        endpointing_ms=1800,     
-        interim_results=True,    
-    ),
-    tts=cartesia.TTS(voice="6f84f4b8-58a2-430c-8c79-688dad597532"),
-    turn_detection="vad",
-    vad=silero.VAD.load(),
-)
 
-# Lock to serialize TTS and pause/resume mic while the bot is speaking
-speaking_lock = asyncio.Lock()
+def build_session(vad) -> AgentSession:
+    return AgentSession(
+        stt=deepgram.STT(
+            model="nova-3",
+            language="multi",
+            endpointing_ms=STT_ENDPOINTING_MS,
+            interim_results=True,
+        ),
+        tts=build_tts(),
+        turn_detection="vad",
+        vad=vad,
+    )
 
-# Global reference for event emission
-global_injury_assistant = None
 
-async def speak(text: str):
-    if not text or not text.strip():
-        return
-    async with speaking_lock:
+# -------------------------------------------------------------------
+# Pipelined speech: synthesize upcoming chunks while the current one plays
+# -------------------------------------------------------------------
+# Chunks synthesized ahead of the one playing (0 = synthesize each only when its turn comes)
+TTS_PREFETCH = int(os.getenv("TTS_PREFETCH", "2"))
+
+
+class PrefetchedSpeech:
+    """TTS for one chunk: cached audio if there is any, else synthesized in the background into a frame queue."""
+
+    def __init__(self, tts, text: str, cache: Optional[TTSAudioCache] = None):
+        self.text = text
+        self.frames: asyncio.Queue = asyncio.Queue()
+        self.ready = asyncio.Event()  # first frame arrived, or synthesis ended
+        self.has_audio = False
+        self.cached = False
+        self.task = None
+        settings = tts_settings(tts) if cache else ""
+        frames = cache.get(text, settings) if cache else None
+        if frames:
+            self.cached = self.has_audio = True
+            for frame in frames:
+                self.frames.put_nowait(frame)
+            self.frames.put_nowait(None)
+            self.ready.set()
+        else:
+            keep = cache if cache and cache.wants(text) else None
+            self.task = asyncio.create_task(self._synthesize(tts, keep, settings))
+
+    async def _synthesize(self, tts, cache: Optional[TTSAudioCache] = None, settings: str = ""):
+        collected = [] if cache else None
         try:
-            # await session.pause_listening()
-            # # Pause mic while TTS plays (use whichever is available)
-            # if hasattr(session, "pause_listening"):
-            #     session.pause_listening()
-            # elif hasattr(session, "pause_input_audio"):
-            #     session.pause_input_audio()
-
-            print(f"[TTS] → {text[:80]}")
-            if global_injury_assistant:
-                await emit_event(global_injury_assistant.session_id, {"event":"prompt_spoken","text": text})
-            await session.say(text)
-            print("[TTS] ✓ done")
+            async with tts.synthesize(self.text) as stream:
+                async for ev in stream:
+                    self.has_audio = True
+                    self.frames.put_nowait(ev.frame)
+                    self.ready.set()
+                    if collected is not None:
+                        collected.append(ev.frame)
+            if collected:
+                cache.put(self.text, settings, collected)  # only complete audio is cached
+        except Exception as e:
+            print(f"[TTS] prefetch failed for {self.text[:40]!r}: {e}")
         finally:
-            # small tail to avoid clipping user
-            # await asyncio.sleep(0.3)
-            # if hasattr(session, "resume_listening"):
-            #     session.resume_listening()
-            # elif hasattr(session, "resume_input_audio"):
-            #     session.resume_input_audio()
-            pass
+            self.frames.put_nowait(None)
+            self.ready.set()
+
+    async def audio(self):
+        while True:
+            frame = await self.frames.get()
+            if frame is None:
+                return
+            yield frame
+
+    def cancel(self):
+        if self.task:
+            self.task.cancel()
 
 
-async def speak_all(text_or_list):
-    """Speak every line/sentence in order; keeps mic paused while talking."""
+def split_speech(text_or_list) -> list:
+    """Lines/sentences to speak, in order."""
     if not text_or_list:
-        return
-    items = []
+        return []
     if isinstance(text_or_list, (list, tuple)):
-        items = [str(x).strip() for x in text_or_list if str(x).strip()]
-    else:
-        s = str(text_or_list).strip()
-        # split on newlines or sentence ends; keep it simple & readable
-        items = [p.strip() for p in re.split(r"(?:\n+|(?<=[.!?])\s+)", s) if p.strip()]
-    for chunk in items:
-        await speak(chunk)
-
-# Queue to strictly sequence: FINAL transcript → LLM → speak
-message_queue = asyncio.Queue()
-
-async def worker(injury_assistant: StrictIntakeInjuryAgent):
-    while True:
-        user_text = await message_queue.get()
+        return [str(x).strip() for x in text_or_list if str(x).strip()]
+    s = str(text_or_list).strip()
+    # split on newlines or sentence ends; keep it simple & readable
+    return [p.strip() for p in re.split(r"(?:\n+|(?<=[.!?])\s+)", s) if p.strip()]
+
+
+# -------------------------------------------------------------------
+# Cached speech audio: fixed lines and flow prompts, shared by every call
+# -------------------------------------------------------------------
+TTS_PRELOAD_CONCURRENCY = int(os.getenv("TTS_PRELOAD_CONCURRENCY", "4"))
+_tts_cache = None
+_tts_refresh = None
+
+
+def tts_cache() -> TTSAudioCache:
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TTSAudioCache()
+    return _tts_cache
+
+
+def cacheable_chunks(lines) -> list:
+    """The chunks speak_all will actually synthesize for these lines."""
+    return list(dict.fromkeys(chunk for line in lines for chunk in split_speech(line)))
+
+
+def warm_tts_cache(flow_name: str = FLOW_NAME) -> int:
+    """Worker startup: load the flow's known lines from disk into memory (no network)."""
+    cache = tts_cache()
+    chunks = cache.manifest(flow_name) or cacheable_chunks(FALLBACK_LINES)
+    cache.register(chunks)
+    found = cache.load(chunks, tts_settings(build_tts()))
+    print(f"[TTS-CACHE] preloaded {found}/{len(chunks)} lines for '{flow_name}'")
+    return found
+
+
+_warmed_lines: Optional[int] = None
+
+
+def warm_process() -> int:
+    """Load the VAD and the flow's cached prompt audio once per process.
+
+    Both prewarm (every console run) and voice_worker.py (before it reports
+    ready) call this; a pooled worker hosting many sessions warms up once.
+    """
+    global _warmed_lines
+    load_vad()
+    if _warmed_lines is None:
+        _warmed_lines = warm_tts_cache()
+    return _warmed_lines
+
+
+async def refresh_tts_cache(tts, flow_name: str = FLOW_NAME):
+    """Synthesize and store whatever the flow can say that isn't cached yet, then record the manifest."""
+    cache = tts_cache()
+    chunks = cacheable_chunks([*FALLBACK_LINES, *await speakable_lines(flow_name)])
+    cache.register(chunks)
+    settings = tts_settings(tts)
+    missing = [c for c in chunks if not cache.contains(c, settings)]
+    gate = asyncio.Semaphore(TTS_PRELOAD_CONCURRENCY)
+
+    async def synthesize(text):
+        async with gate:
+            speech = PrefetchedSpeech(tts, text, cache)
+            if speech.task:
+                await speech.task
+
+    await asyncio.gather(*(synthesize(c) for c in missing))
+    cache.save_manifest(flow_name, chunks)
+    print(f"[TTS-CACHE] '{flow_name}': {len(chunks) - len(missing)} cached, {len(missing)} synthesized")
+
+
+def refresh_tts_cache_once(tts, flow_name: str = FLOW_NAME):
+    """Start the refresh in the background the first time a call runs in this process."""
+    global _tts_refresh
+    if _tts_refresh is None:
+        _tts_refresh = asyncio.create_task(refresh_tts_cache(tts, flow_name))
+    return _tts_refresh
+
+
+def forget_flow(flow_name: str = FLOW_NAME):
+    """Make the next call in this process load the flow (and its prompt audio) afresh.
+
+    Flow edits only invalidate the server's own cache; voice_worker.py calls
+    this before every session so a pooled worker never runs a stale graph.
+    """
+    global _tts_refresh
+    flow_registry.invalidate(flow_name)
+    _tts_refresh = None
+
+
+# -------------------------------------------------------------------
+# Speculative extraction on interim transcripts
+# -------------------------------------------------------------------
+SPECULATIVE_EXTRACTION = os.getenv("SPECULATIVE_EXTRACTION", "1") not in ("", "0", "false", "False")
+# An interim transcript counts as stable once no newer interim arrived for this long
+SPECULATE_STABLE_MS = float(os.getenv("SPECULATE_STABLE_MS", "300"))
+
+
+# -------------------------------------------------------------------
+# Turn coalescing: finals that follow each other closely are one answer
+# -------------------------------------------------------------------
+# A final is held this long; another final within it is merged into the same turn (0 = off)
+TURN_COALESCE_MS = float(os.getenv("TURN_COALESCE_MS", "400"))
+
+
+# -------------------------------------------------------------------
+# Barge-in: the caller talking drops work for replies nobody will hear
+# -------------------------------------------------------------------
+BARGE_IN = os.getenv("BARGE_IN", "1") not in ("", "0", "false", "False")
+# Words of interim transcript that cut a reply being spoken (1-word backchannels like "okay" don't)
+BARGE_IN_MIN_WORDS = int(os.getenv("BARGE_IN_MIN_WORDS", "2"))
+
+
+# -------------------------------------------------------------------
+# Per call: minimal, sequential voice loop (lock + queue + pause/resume)
+# -------------------------------------------------------------------
+class CallContext:
+    """Everything one call owns, so a worker process can host many calls at once."""
+
+    def __init__(self, session: AgentSession, injury_assistant: StrictIntakeInjuryAgent, tts_cache: Optional[TTSAudioCache] = None):
+        self.session = session
+        self.injury_assistant = injury_assistant
+        self.tts_cache = tts_cache
+        # Lock to serialize TTS and pause/resume mic while the bot is speaking
+        self.speaking_lock = asyncio.Lock()
+        # Queue to strictly sequence: FINAL transcript(s) of a turn → LLM → speak
+        self.message_queue: asyncio.Queue = asyncio.Queue()
+        self.closed = asyncio.Event()
+        self.prefetch = TTS_PREFETCH
+        self.speculative = SPECULATIVE_EXTRACTION
+        self.adaptive_endpointing = ADAPTIVE_ENDPOINTING
+        self.turn_timing: Optional[dict] = None  # what the STT / session currently use
+        self._last_heard_at = None  # last interim transcript: roughly when the caller stopped talking
+        self.coalesce_ms = TURN_COALESCE_MS
+        self._finals: list = []  # finals held for the coalescing window
+        self._heard_at = None
+        self._flush_task = None
+        self.barge_in = BARGE_IN
+        self._turn_task = None  # the turn being answered, and its finals and phase
+        self._turn_finals: list = []
+        self._turn_phase = None  # "extracting" (cancellable) -> "committing" -> "speaking"
+        self._worker_task = None
+        self._speculate_task = None
+        session.on("user_input_transcribed", self.on_user_input_transcribed)
+        session.on("agent_false_interruption", self._on_agent_false_interruption)
+        session.on("close", lambda ev: self.closed.set())
+
+    async def speak(self, text: str):
+        if text and text.strip():
+            await self.speak_all([text])
+
+    async def speak_all(self, text_or_list):
+        """Speak every line/sentence in order; keeps mic paused while talking.
+
+        Synthesis runs up to ``prefetch`` chunks ahead of playback, so the next
+        sentence is ready when the current one ends. Playback stays in order;
+        an interruption (or cancelling this call, see _barge_in) drops the rest
+        and cancels their pending synthesis. Records time to first audio,
+        inter-sentence gaps and dropped chunks; returns when the first chunk
+        started playing (perf_counter).
+        """
+        items = split_speech(text_or_list)
+        if not items:
+            return None
+        first_at = None
+        async with self.speaking_lock:
+            started = time.perf_counter()
+            upcoming = iter(items)
+            pending = deque()
+            chunk = handle = None
+            played = 0
+
+            def fill(depth):
+                while len(pending) < depth:
+                    text = next(upcoming, None)
+                    if text is None:
+                        return
+                    pending.append(PrefetchedSpeech(self.session.tts, text, self.tts_cache))
+
+            try:
+                fill(1 + self.prefetch)
+                prev_end = None
+                while pending:
+                    chunk = pending.popleft()
+                    fill(self.prefetch)
+                    await chunk.ready.wait()
+                    now = time.perf_counter()
+                    if prev_end is None:
+                        first_at = now
+                        observe("tts_first_audio_ms", (now - started) * 1000)
+                    else:
+                        observe("tts_gap_ms", (now - prev_end) * 1000)
+
+                    print(f"[TTS] → {chunk.text[:80]}")
+                    await emit_event(self.injury_assistant.session_id, {"event":"prompt_spoken","text": chunk.text})
+                    if chunk.has_audio:
+                        handle = self.session.say(chunk.text, audio=chunk.audio())
+                    else:
+                        handle = self.session.say(chunk.text)  # prefetch failed: let the session synthesize
+                    await handle
+                    if handle.interrupted:
+                        print("[TTS] interrupted, dropping the rest")
+                        return first_at
+                    handle = None
+                    played += 1
+                    prev_end = time.perf_counter()
+                    if not pending:
+                        fill(1)  # prefetch == 0: synthesize the next one only now
+                print("[TTS] ✓ done")
+                return first_at
+            finally:
+                if handle is not None and not handle.done():
+                    handle.interrupt()
+                for c in ([chunk] if chunk else []) + list(pending):
+                    c.cancel()
+                if played < len(items):
+                    incr("tts_chunks_dropped", len(items) - played)
+
+    async def apply_turn_timing(self):
+        """Point STT endpointing and turn detection at the step now waiting for an answer."""
+        timing = await self.injury_assistant.turn_timing()
+        if not self.adaptive_endpointing:
+            # Fixed endpointing; keep the step type so latency is still reported per type
+            self.turn_timing = {**timing, "profile": "fixed", "endpointing_ms": STT_ENDPOINTING_MS}
+            return
+        if self.turn_timing and timing["endpointing_ms"] == self.turn_timing["endpointing_ms"]:
+            self.turn_timing = timing
+            return
         try:
-            reply = await injury_assistant.handle_user_message(user_text)
-            await speak_all(reply)
+            self.session.stt.update_options(endpointing_ms=timing["endpointing_ms"])
+            self.session.update_options(
+                min_endpointing_delay=timing["min_endpointing_delay"],
+                max_endpointing_delay=timing["max_endpointing_delay"],
+            )
         except Exception as e:
-            print(f" worker error: {e}")
-        finally:
-            message_queue.task_done()
-
-# Only enqueue FINAL transcripts (ignore partials)
-@session.on("user_input_transcribed")
-def on_user_input_transcribed(ev):
-    if not getattr(ev, "is_final", True):
-        print(f"… partial: {getattr(ev, 'transcript', '')}")
-        return
-    transcript = (getattr(ev, "transcript", "") or "").strip()
-    if transcript:
-        print(f" final: {transcript}")
-        # tell UI what the user said
-        if global_injury_assistant:
-            asyncio.create_task(emit_event(global_injury_assistant.session_id, {"event":"user_heard","text": transcript}))
-        asyncio.create_task(message_queue.put(transcript))
-
-# Optional: handle false interruptions--
-@session.on("agent_false_interruption")
-def _on_agent_false_interruption(ev: AgentFalseInterruptionEvent):
-    logger.info("false positive interruption, resuming")
-
-# Metrics hook (kept as-is, wired in entrypoint)
-# -------------------------------------------------------------------
+            print(f" endpointing update failed: {e}")
+            return
+        print(f"[TURN] {timing['qtype']} → {timing['profile']} endpointing {timing['endpointing_ms']} ms")
+        self.turn_timing = timing
+
+    async def run_turn(self, finals: list, heard_at: float):
+        """Answer one turn: extract (cancellable), commit to the flow, speak the reply."""
+        answered = self.turn_timing or DEFAULT_TURN_TIMING
+        user_text = " ".join(finals)
+        self._turn_phase = "extracting"
+        await self.injury_assistant.prepare_turn(user_text)
+        self._turn_phase = "committing"
+        if len(finals) > 1:
+            # Counted before the turn runs: the engine's current step is the one the fragments answered
+            incr("turns_merged")
+            incr("finals_merged", len(finals) - 1)
+            incr("llm_calls_avoided", await self.injury_assistant.llm_calls_avoided(finals[:-1]))
+            print(f"[TURN] merged {len(finals)} finals: {user_text!r}")
+        reply = await self.injury_assistant.handle_user_message(user_text)
+        await self.apply_turn_timing()  # before speaking: the caller answers right after
+        self._turn_phase = "speaking"
+        first_at = await self.speak_all(reply)
+        if first_at is not None:
+            # End of the caller's speech -> our reply, endpointing wait included
+            observe(f"turn_latency_ms.{answered['qtype']}", (first_at - heard_at) * 1000)
+            observe(f"turn_latency_ms.profile.{answered['profile']}", (first_at - heard_at) * 1000)
+
+    async def worker(self):
+        while True:
+            finals, heard_at = await self.message_queue.get()
+            turn = self._turn_task = asyncio.create_task(self.run_turn(finals, heard_at))
+            self._turn_finals = finals
+            try:
+                # wait() rather than await: the turn being cancelled by _barge_in is not an error here
+                await asyncio.wait([turn])
+                if not turn.cancelled() and turn.exception() is not None:
+                    print(f" worker error: {turn.exception()}")
+            finally:
+                if self._turn_task is turn:
+                    self._turn_task = None
+                self._turn_phase = None
+                self.message_queue.task_done()
+
+    def _barge_in(self, heard: str):
+        """The caller is talking over the turn in flight: drop work whose result they won't hear.
+
+        Before the answer is committed the turn is superseded: its extraction is
+        cancelled and its finals go back in front of the held ones, to be answered
+        together with what the caller is saying now. While the reply is playing it
+        is cut off: queued chunks and their synthesis are cancelled. A turn that is
+        committing runs on; its reply is the next question.
+        """
+        turn = self._turn_task
+        if not self.barge_in or turn is None or turn.done():
+            return
+        if self._turn_phase == "extracting":
+            self._finals[:0] = self._turn_finals
+            incr("turns_superseded")
+            print(f"[TURN] superseded: {' '.join(self._turn_finals)!r}")
+        elif self._turn_phase == "speaking" and len(heard.split()) >= BARGE_IN_MIN_WORDS:
+            incr("replies_interrupted")
+            print("[TURN] caller barged in, cutting the reply")
+        else:
+            return
+        self._turn_task = None
+        turn.cancel()
+
+    def start_worker(self):
+        self._worker_task = asyncio.create_task(self.worker())
+
+    def _cancel_speculation(self):
+        if self._speculate_task and not self._speculate_task.done():
+            self._speculate_task.cancel()
+        self._speculate_task = None
+
+    async def _speculate_when_stable(self, text: str):
+        await asyncio.sleep(SPECULATE_STABLE_MS / 1000)
+        await self.injury_assistant.speculate(text)
+
+    def _hold_finals(self, delay_ms: float):
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = asyncio.create_task(self._flush_after(delay_ms))
+
+    async def _flush_after(self, delay_ms: float):
+        await asyncio.sleep(delay_ms / 1000)
+        self._flush_finals()
+
+    def _flush_finals(self):
+        """Queue the held finals as one turn."""
+        finals, self._finals = self._finals, []
+        if finals:
+            self.message_queue.put_nowait((finals, self._heard_at))
+
+    async def drain(self):
+        """Wait until every transcript heard so far has been answered."""
+        while True:
+            await self.message_queue.join()
+            if not self._finals and not (self._flush_task and not self._flush_task.done()):
+                return
+            await asyncio.sleep(0.01)  # held (or superseded and put back) finals not queued yet
+
+    # Only enqueue FINAL transcripts; stable partials start a speculative extraction
+    def on_user_input_transcribed(self, ev):
+        if not getattr(ev, "is_final", True):
+            partial = (getattr(ev, "transcript", "") or "").strip()
+            print(f"… partial: {partial}")
+            self._last_heard_at = time.perf_counter()
+            if partial:
+                self._barge_in(partial)
+            if partial and self._finals:
+                # Still talking after a final: keep holding until this segment's final arrives
+                timing = self.turn_timing or DEFAULT_TURN_TIMING
+                self._hold_finals(self.coalesce_ms + timing["endpointing_ms"])
+            if self.speculative and partial:
+                self._cancel_speculation()
+                text = " ".join([*self._finals, partial])  # what the merged turn will say
+                self._speculate_task = asyncio.create_task(self._speculate_when_stable(text))
+            return
+        self._cancel_speculation()
+        transcript = (getattr(ev, "transcript", "") or "").strip()
+        if transcript:
+            print(f" final: {transcript}")
+            # tell UI what the user said
+            publish_event(self.injury_assistant.session_id, {"event":"user_heard","text": transcript})
+            self._barge_in(transcript)
+            self._finals.append(transcript)
+            self._heard_at = self._last_heard_at or time.perf_counter()
+            if self.coalesce_ms > 0:
+                self._hold_finals(self.coalesce_ms)
+            else:
+                self._flush_finals()
+        self._last_heard_at = None
+
+    # Optional: handle false interruptions--
+    def _on_agent_false_interruption(self, ev: AgentFalseInterruptionEvent):
+        logger.info("false positive interruption, resuming")
+
+    async def aclose(self):
+        self._cancel_speculation()
+        if self._flush_task:
+            self._flush_task.cancel()
+        if self._turn_task:
+            self._turn_task.cancel()
+        if self._worker_task:
+            self._worker_task.cancel()
+        try:
+            await answer_writer.flush()  # the call's last answers, before the job process goes away
+        except Exception as e:
+            print(f" Answer flush on close failed: {e!r}")
+
+
+def job_session_id(ctx: JobContext) -> Optional[str]:
+    """Session id from the job metadata ({"session_id": ...}), so calls sharing a process don't share FORCED_SESSION_ID."""
+    try:
+        return (json.loads(ctx.job.metadata or "{}") or {}).get("session_id")
+    except (ValueError, AttributeError):
+        return None
 
 
 async def entrypoint(ctx: JobContext):
-    global global_injury_assistant
-    
     # Use a unique identity for the agent
     agent_identity = "srushti-agent-1"
-    
-    injury_assistant = StrictIntakeInjuryAgent(model_name="qwen2.5:3b")
-    global_injury_assistant = injury_assistant  # Set global reference for event emission
+
+    vad = ctx.proc.userdata.get("vad") or load_vad()
+    session = build_session(vad)
+    injury_assistant = StrictIntakeInjuryAgent(model_name="qwen2.5:3b", session_id=job_session_id(ctx))
+    call = CallContext(session, injury_assistant, tts_cache())
     from langchain_ollama import ChatOllama
     session_llm = ChatOllama(model="qwen2.5:3b", temperature=0.3, timeout=60)  
     usage_collector = metrics.UsageCollector()
@@ -257,8 +723,10 @@ async def entrypoint(ctx: JobContext):
     async def log_usage():
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
+        logger.info(f"TTS cache: {tts_cache().stats()}")
     
     ctx.add_shutdown_callback(log_usage)
+    ctx.add_shutdown_callback(call.aclose)
     
     try:
         # Connect to the room
@@ -277,7 +745,8 @@ async def entrypoint(ctx: JobContext):
         )
 
         # Start the worker that consumes user finals in order
-        asyncio.create_task(worker(injury_assistant))
+        call.start_worker()
+        refresh_tts_cache_once(session.tts)
 
         # Initialize conversation and speak first prompt BEFORE listening for user
         initial_greeting = await injury_assistant.initialize_conversation()
@@ -287,7 +756,7 @@ async def entrypoint(ctx: JobContext):
         await emit_event(injury_assistant.session_id, {
             "event": "session_started",
             "session_id": injury_assistant.session_id,
-            "flow_name": "injury_intake_strict"
+            "flow_name": FLOW_NAME
         })
         
         # Also emit current node if available
@@ -299,16 +768,20 @@ async def entrypoint(ctx: JobContext):
             if cur is not None:
                 await emit_event(injury_assistant.session_id, {"event": "node_entered", "node_id": cur})
         
-        await speak_all(initial_greeting)
+        await call.apply_turn_timing()
+        await call.speak_all(initial_greeting)
         print("Strict Intake + Supabase injury assistant with database-driven flow ready!")
         
-        # Keep the connection alive
-        while True:
-            await asyncio.sleep(1)
+        # Keep the job alive until this call's session closes
+        await call.closed.wait()
             
     except Exception as e:
         print(f"Error in session: {e}")
         raise
+    finally:
+        await call.aclose()
+        # The job process can exit right after this; get the session's checkpoints onto disk first.
+        await asyncio.to_thread(CHECKPOINTER.flush)
 
 
 if __name__ == "__main__":
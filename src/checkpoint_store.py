@@ -0,0 +1,435 @@
+# checkpoint_store.py
+"""Bounded LangGraph checkpointer: latest checkpoint per thread, LRU/TTL in memory,
+written behind to a local SQLite file so sessions survive a restart."""
+from __future__ import annotations
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator, Sequence
+from typing import Any
+
+from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+load_dotenv(".env.local")
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", ".intake_checkpoints.sqlite3")
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+CHECKPOINT_TTL_S = float(os.getenv("CHECKPOINT_TTL_S", "1800"))
+# Rows not updated for this long are deleted from the file (checked every CHECKPOINT_PURGE_INTERVAL_S)
+CHECKPOINT_DISK_TTL_S = float(os.getenv("CHECKPOINT_DISK_TTL_S", "86400"))
+CHECKPOINT_PURGE_INTERVAL_S = float(os.getenv("CHECKPOINT_PURGE_INTERVAL_S", "600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    record BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns)
+)
+"""
+
+
+class _Record:
+    """Latest checkpoint of one (thread_id, checkpoint_ns), kept serialized.
+
+    Fields are replaced, never mutated, once the record is handed to the
+    writer thread, so it can be pickled there without holding the saver lock.
+    """
+
+    __slots__ = ("blobs", "checkpoint", "checkpoint_id", "metadata", "parent_id", "touched", "writes")
+
+    def __init__(self, checkpoint_id, checkpoint, metadata, parent_id, blobs, writes):
+        self.checkpoint_id: str = checkpoint_id
+        self.checkpoint: tuple[str, bytes] = checkpoint
+        self.metadata: tuple[str, bytes] = metadata
+        self.parent_id: str | None = parent_id
+        # channel -> (version, serialized value); only the versions the latest checkpoint uses
+        self.blobs: dict[str, tuple[Any, tuple[str, bytes]]] = blobs
+        # (task_id, idx) -> (task_id, channel, serialized value, task_path)
+        self.writes: dict[tuple[str, int], tuple[str, str, tuple[str, bytes], str]] = writes
+        self.touched = time.monotonic()
+
+    def dumps(self) -> bytes:
+        return pickle.dumps(
+            (self.checkpoint_id, self.checkpoint, self.metadata, self.parent_id, self.blobs, self.writes),
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+    @classmethod
+    def loads(cls, raw: bytes) -> _Record:
+        return cls(*pickle.loads(raw))
+
+
+class BoundedSqliteSaver(BaseCheckpointSaver[int]):
+    """Checkpointer that keeps only the latest checkpoint per thread.
+
+    Resident threads live in an LRU capped at ``max_threads`` and idle threads
+    are dropped after ``ttl_s``. Every put is queued for a background writer
+    thread that pickles and commits it to SQLite (latest record per thread,
+    one transaction per batch), so the voice turn never waits on the disk. An
+    evicted (or pre-restart) thread is reloaded transparently on its next turn;
+    rows idle for ``disk_ttl_s`` are deleted. The file is opened on first use.
+    History (``list`` / time travel) is limited to that latest checkpoint.
+    """
+
+    def __init__(
+        self,
+        path: str | None = CHECKPOINT_DB_PATH,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        ttl_s: float = CHECKPOINT_TTL_S,
+        disk_ttl_s: float = CHECKPOINT_DISK_TTL_S,
+        purge_interval_s: float = CHECKPOINT_PURGE_INTERVAL_S,
+        **kwargs: Any,
+    ):
+        super().__init__(**kwargs)
+        self.path = path or None
+        self.max_threads = max_threads
+        self.ttl_s = ttl_s
+        self.disk_ttl_s = disk_ttl_s
+        self.purge_interval_s = purge_interval_s
+        self.evictions = 0
+        self.purged = 0
+        self._mem: OrderedDict[tuple[str, str], _Record] = OrderedDict()
+        self._lock = threading.RLock()
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()  # the connection is shared by the loop (reads) and the writer
+        # Write-behind queue: latest record per key, and the batch being committed
+        self._cv = threading.Condition()
+        self._dirty: dict[tuple[str, str], _Record] = {}
+        self._writing: dict[tuple[str, str], _Record] = {}
+        self._writer: threading.Thread | None = None
+        self._closing = False
+        self._purged_at = 0.0
+
+    # ---------- SQLite ----------
+    def _conn(self) -> sqlite3.Connection | None:
+        """The connection, opened (and expired rows purged) on first use. Call with _db_lock held."""
+        if self._db is None and self.path:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(_SCHEMA)
+            self._purge_expired()
+        return self._db
+
+    def _purge_expired(self):
+        cur = self._db.execute("DELETE FROM checkpoints WHERE updated_at < ?", (time.time() - self.disk_ttl_s,))
+        self.purged += max(cur.rowcount, 0)
+        self._purged_at = time.monotonic()
+
+    def purge(self):
+        """Delete rows idle for longer than disk_ttl_s (the writer does this every purge_interval_s)."""
+        with self._db_lock:
+            if self._conn() is not None:
+                self._purge_expired()
+
+    def _write_loop(self):
+        while True:
+            with self._cv:
+                while not self._dirty and not self._closing:
+                    if not self._cv.wait(timeout=self.purge_interval_s):
+                        break
+                self._writing, self._dirty = self._dirty, {}
+                batch, closing = self._writing, self._closing
+            if batch:
+                now = time.time()
+                try:
+                    rows = [(k[0], k[1], rec.dumps(), now) for k, rec in batch.items()]
+                    with self._db_lock:
+                        db = self._conn()
+                        db.execute("BEGIN")
+                        try:
+                            db.executemany(
+                                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, record, updated_at) VALUES (?, ?, ?, ?)",
+                                rows,
+                            )
+                            db.execute("COMMIT")
+                        except BaseException:
+                            db.execute("ROLLBACK")
+                            raise
+                except Exception as e:
+                    print(f"[CHECKPOINT] write of {len(batch)} thread(s) failed: {e!r}")
+            if time.monotonic() - self._purged_at >= self.purge_interval_s:
+                try:
+                    self.purge()
+                except Exception as e:
+                    print(f"[CHECKPOINT] purge failed: {e!r}")
+            with self._cv:
+                self._writing = {}
+                self._cv.notify_all()
+                if closing and not self._dirty:
+                    return
+
+    def flush(self):
+        """Block until every queued checkpoint is in the file."""
+        with self._cv:
+            while self._dirty or self._writing:
+                self._cv.wait()
+
+    # ---------- Residency ----------
+    @property
+    def resident(self) -> int:
+        """Threads currently held in memory (not a __len__: LangGraph truth-tests savers)."""
+        return len(self._mem)
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._mem:
+            _key, rec = next(iter(self._mem.items()))
+            if len(self._mem) > self.max_threads or now - rec.touched > self.ttl_s:
+                self._mem.popitem(last=False)
+                self.evictions += 1
+            else:
+                break
+
+    def _peek(self, key: tuple[str, str]) -> _Record | None:
+        rec = self._mem.get(key)
+        if rec is None and self.path:
+            with self._cv:
+                rec = self._dirty.get(key) or self._writing.get(key)  # evicted before it was written
+            if rec is None:
+                with self._db_lock:
+                    db = self._conn()
+                    row = db.execute(
+                        "SELECT record FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", key
+                    ).fetchone() if db is not None else None
+                if row:
+                    rec = _Record.loads(row[0])
+        return rec
+
+    def _load(self, key: tuple[str, str]) -> _Record | None:
+        """Fetch a record and mark it most recently used (reloading it if evicted)."""
+        rec = self._peek(key)
+        if rec is not None:
+            rec.touched = time.monotonic()
+            self._mem[key] = rec
+            self._mem.move_to_end(key)
+            self._evict()
+        return rec
+
+    def _persist(self, key: tuple[str, str], rec: _Record):
+        """Queue the record for the writer thread; only the latest per key is written."""
+        if not self.path or self._closing:
+            return
+        with self._cv:
+            self._dirty[key] = rec
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="checkpoint-writer", daemon=True)
+                self._writer.start()
+            self._cv.notify()
+
+    def _tuple(self, key: tuple[str, str], rec: _Record) -> CheckpointTuple:
+        thread_id, checkpoint_ns = key
+        checkpoint: Checkpoint = self.serde.loads_typed(rec.checkpoint)
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = rec.blobs.get(channel)
+            if blob and blob[0] == version and blob[1][0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob[1])
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": rec.checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed(rec.metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": rec.parent_id,
+                    }
+                }
+                if rec.parent_id
+                else None
+            ),
+            pending_writes=[(tid, c, self.serde.loads_typed(v)) for tid, c, v, _ in rec.writes.values()],
+        )
+
+    # ---------- BaseCheckpointSaver ----------
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        key = (config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        with self._lock:
+            rec = self._load(key)
+            if rec is None:
+                return None
+            checkpoint_id = get_checkpoint_id(config)
+            if checkpoint_id and checkpoint_id != rec.checkpoint_id:
+                return None  # older checkpoints are not kept
+            return self._tuple(key, rec)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,  # noqa: A002 (BaseCheckpointSaver signature)
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            if config:
+                keys = [(config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))]
+            else:
+                keys = list(self._mem)
+                if self.path:
+                    self.flush()
+                    with self._db_lock:
+                        db = self._conn()
+                        stored = db.execute("SELECT thread_id, checkpoint_ns FROM checkpoints").fetchall() if db else []
+                    keys += [k for k in stored if k not in self._mem]
+            out = []
+            for key in keys:
+                # Listing everything must not churn the LRU.
+                rec = self._load(key) if config else self._peek(key)
+                if rec is None:
+                    continue
+                if before and (before_id := get_checkpoint_id(before)) and rec.checkpoint_id >= before_id:
+                    continue
+                tup = self._tuple(key, rec)
+                if filter and not all(tup.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                out.append(tup)
+                if limit is not None and len(out) >= limit:
+                    break
+        yield from out
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        key = (thread_id, checkpoint_ns)
+        c = checkpoint.copy()
+        values: dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        with self._lock:
+            prev = self._load(key)
+            # Carry over unchanged channels, then drop anything the new checkpoint no longer references.
+            blobs = dict(prev.blobs) if prev else {}
+            for k, v in new_versions.items():
+                blobs[k] = (v, self.serde.dumps_typed(values[k]) if k in values else ("empty", b""))
+            blobs = {k: b for k, b in blobs.items() if k in checkpoint["channel_versions"]}
+            rec = _Record(
+                checkpoint["id"],
+                self.serde.dumps_typed(c),
+                self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+                config["configurable"].get("checkpoint_id"),
+                blobs,
+                {},
+            )
+            self._mem[key] = rec
+            self._mem.move_to_end(key)
+            self._persist(key, rec)
+            self._evict()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        key = (config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", ""))
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            rec = self._load(key)
+            if rec is None or rec.checkpoint_id != checkpoint_id:
+                return  # writes for a checkpoint we no longer keep
+            pending = dict(rec.writes)  # copy-on-write: the writer thread may be pickling rec
+            for idx, (c, v) in enumerate(writes):
+                inner_key = (task_id, WRITES_IDX_MAP.get(c, idx))
+                if inner_key[1] >= 0 and inner_key in pending:
+                    continue
+                pending[inner_key] = (task_id, c, self.serde.dumps_typed(v), task_path)
+            rec.writes = pending
+            self._persist(key, rec)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._mem if k[0] == thread_id]:
+                del self._mem[key]
+            if self.path:
+                with self._cv:
+                    for key in [k for k in self._dirty if k[0] == thread_id]:
+                        del self._dirty[key]
+                self.flush()  # a batch already being written must not bring the thread back
+                with self._db_lock:
+                    db = self._conn()
+                    if db is not None:
+                        db.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,  # noqa: A002 (BaseCheckpointSaver signature)
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    def close(self):
+        """Write out what is queued, stop the writer and close the file."""
+        with self._cv:
+            self._closing = True
+            self._cv.notify_all()
+        if self._writer is not None:
+            self._writer.join()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -80,16 +80,23 @@ from __future__ import annotations
 import re
 import string
 import os
+import json
 import time
-from datetime import datetime
-from typing import Tuple, Optional
+import asyncio
+import hashlib
+from collections.abc import Callable, Iterable
+from re import Pattern
+from typing import Optional
 from dotenv import load_dotenv
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_openai import ChatOpenAI
 
+from intake_metrics import incr
+
 # Load environment variables
+load_dotenv(".env.local")
 load_dotenv()
 
 # ---- LLM factory -------------------------------------------------------------
@@ -130,7 +137,7 @@ TONE REQUIREMENTS:
 - Make it conversational, not interrogative
 - Show patience and understanding
 
-Keep placeholders like {name} exactly as they are.
+Keep placeholders like {{name}} exactly as they are, including the curly braces.
 Return only the rewritten empathetic question.
 
 Examples:
@@ -146,6 +153,9 @@ Rewritten: I understand this must be painful to revisit. If you're comfortable s
     ("user", "Original: {text}\nRewritten:")
 ])
 
+# Bump whenever REWRITE_TMPL / GREETING_TMPL change so cached rewrites are regenerated.
+REWRITE_PROMPT_VERSION = "2"
+
 EXTRACTION_TMPL = ChatPromptTemplate.from_messages([
     ("system", """
 You extract ONLY the specific data requested for the given question type.
@@ -233,6 +243,29 @@ For other_reports, accept any mention of reporting to authorities without requir
     ("user", "Question Type: {question_type}\nExtracted: {extracted}\nValidation:")
 ])
 
+COMBINED_TMPL = ChatPromptTemplate.from_messages([
+    ("system", """
+Extract ONLY the specific data requested for the given question type, then validate it.
+
+Extraction: return just the value the caller gave for this question type
+(e.g. first_name from "My first name is Srushti Jagtap" -> "Srushti";
+other_reports from "Yes, I called the police" -> "Yes, to police"; never location info for other_reports).
+
+Validation rules of thumb:
+- first_name, last_name: should look like names (letters, hyphen, apostrophe, max 3 tokens). Capitalize first letter.
+- incident_date: recognizable date or partial date (avoid future if context implies past).
+- incident_location: a place description (not a person's name).
+- incident_description: any reasonable description of what happened (should be at least a few words).
+- medical_treatment: "Yes/No" optionally with short details.
+- injuries: medical/body-part terms.
+- other_reports: "Yes" with optional authority (police, state office, helpline) or "No".
+
+Respond with ONE JSON object and nothing else:
+{{"value": "<extracted value>", "status": "VALID" | "VALID_CORRECTED" | "INVALID", "corrected": "<corrected value or empty>", "clarification": "<gentle clarification request if INVALID, else empty>"}}
+"""),
+    ("user", "Question Type: {question_type}\nUser Response: {response}\nJSON:")
+])
+
 GREETING_TMPL = ChatPromptTemplate.from_messages([
     ("system", """
 Create a warm, empathetic greeting for a legal intake agent. 
@@ -252,13 +285,13 @@ def _clean_token(tok: str) -> str:
         return t
     return t[0].upper() + t[1:]
 
-def _only_token(text: str, pat: str) -> Optional[str]:
+def _only_token(text: str, pat: str) -> str | None:
     m = re.match(rf"^\s*(?P<x>{pat})\s*$", text)
     if m:
         return _clean_token(m.group("x"))
     return None
 
-def extract_first_name_rule(text: str) -> Optional[str]:
+def extract_first_name_rule(text: str) -> str | None:
     t = text.strip()
 
     # "my first name is Rusty", "first name Rusty"
@@ -279,7 +312,7 @@ def extract_first_name_rule(text: str) -> Optional[str]:
 
     return None
 
-def extract_last_name_rule(text: str) -> Optional[str]:
+def extract_last_name_rule(text: str) -> str | None:
     t = text.strip()
 
     # "last name is Patel" / "surname Patel"
@@ -301,7 +334,7 @@ def extract_last_name_rule(text: str) -> Optional[str]:
 
     return None
 
-def extract_yes_no_rule(text: str) -> Optional[str]:
+def extract_yes_no_rule(text: str) -> str | None:
     t = text.strip().lower()
     if t in {"yes", "y", "yeah", "yep", "yup", "sure", "affirmative"}:
         return "Yes"
@@ -314,7 +347,7 @@ def extract_yes_no_rule(text: str) -> Optional[str]:
         return "No" + text[len("no"):].rstrip()
     return None
 
-def extract_reports_rule(text: str) -> Optional[str]:
+def extract_reports_rule(text: str) -> str | None:
     t = text.strip().lower()
     
     # Simple yes/no responses
@@ -349,7 +382,7 @@ def extract_reports_rule(text: str) -> Optional[str]:
     
     return None
 
-def extract_witnesses_rule(text: str) -> Optional[str]:
+def extract_witnesses_rule(text: str) -> str | None:
         t = text.strip().lower()
         
         # No witnesses
@@ -371,7 +404,7 @@ def extract_witnesses_rule(text: str) -> Optional[str]:
         
         return None
 
-def extract_witness_names_rule(text: str) -> Optional[str]:
+def extract_witness_names_rule(text: str) -> str | None:
     t = text.strip()
     
     if t.lower() in {"no", "none", "don't know", "unknown", "i don't know"}:
@@ -385,7 +418,7 @@ def extract_witness_names_rule(text: str) -> Optional[str]:
 
 DATE_PAT = r"(?:\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:t\.?|tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\b\s+\d{1,2}(?:,\s*\d{4})?)|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b|\b\d{4}-\d{2}-\d{2}\b"
 
-def extract_date_rule(text: str) -> Optional[str]:
+def extract_date_rule(text: str) -> str | None:
     # Pull a clear date-like substring if present
     m = re.search(DATE_PAT, text, re.I)
     if m:
@@ -400,9 +433,241 @@ def normalize_name(s: str) -> str:
         return s
     return " ".join(_clean_token(p) for p in parts[:2])  # keep at most two tokens
 
+# ---- Extractor registry -----------------------------------------------------
+# A step's question type is resolved once when the graph is built (explicit
+# question_type column > input_key > legacy sniffing of the prompt template);
+# per-turn dispatch is then a single dict lookup.
+Extractor = Callable[[str], Optional[str]]
+
+
+def _name_rule(rule: Extractor) -> Extractor:
+    def extract(text: str) -> str | None:
+        v = rule(text)
+        return normalize_name(v) if v else None
+    return extract
+
+
+def extract_description_rule(text: str) -> str | None:
+    cleaned = text.strip()
+    return cleaned if len(cleaned) > 5 else None
+
+
+# question type -> fast rule extractor (None = LLM only)
+EXTRACTORS: dict[str, Extractor | None] = {
+    "first_name": _name_rule(extract_first_name_rule),
+    "last_name": _name_rule(extract_last_name_rule),
+    "medical_treatment": extract_yes_no_rule,
+    "incident_date": extract_date_rule,
+    "incident_description": extract_description_rule,
+    "other_reports": extract_reports_rule,
+    "witnesses": extract_witnesses_rule,
+    "witness_names": extract_witness_names_rule,
+    "incident_location": None,
+    "injuries": None,
+    "general": None,
+}
+
+# input_key -> question type, for keys that are not themselves a type name
+INPUT_KEY_TYPES: dict[str, str] = {
+    "given_name": "first_name",
+    "surname": "last_name",
+    "family_name": "last_name",
+    "date": "incident_date",
+    "location": "incident_location",
+    "incident_details": "incident_description",
+    "reports": "other_reports",
+    "medical": "medical_treatment",
+}
+
+
+def register_extractor(question_type: str, extractor: Extractor | None = None, input_keys: Iterable[str] = ()):
+    """Register a fast extractor for a question type, optionally claiming input_keys.
+
+    Takes effect for graphs built afterwards (types are resolved at build time).
+    """
+    EXTRACTORS[question_type] = extractor
+    for key in input_keys:
+        INPUT_KEY_TYPES[key] = question_type
+
+
+def sniff_question_type(question: str) -> str:
+    """Legacy keyword heuristic; only used when a step has no registered type."""
+    q = question.lower()
+    if "first name" in q or "given name" in q:
+        return "first_name"
+    if "last name" in q or "surname" in q or "family name" in q:
+        return "last_name"
+    if "when" in q or "date" in q or "time" in q:
+        return "incident_date"
+
+    # Check for reports BEFORE location to avoid "anywhere" confusion
+    if ("report" in q or "filed" in q or "contacted" in q):
+        # Make sure it's not asking about location of reports
+        if not ("where did you report" in q or "location of report" in q):
+            return "other_reports"
+
+    # Location detection - be more specific
+    if ("where" in q or "location" in q or "place" in q) and not ("anywhere" in q):
+        return "incident_location"
+
+    if "injur" in q or "hurt" in q or "harm" in q:
+        return "injuries"
+    if "medical" in q or "treatment" in q or "doctor" in q or "hospital" in q:
+        return "medical_treatment"
+
+    # Add incident description detection
+    if ("what happened" in q or "describe" in q or "tell me about" in q or
+        "incident" in q or "accident" in q or "event" in q or "share what" in q):
+        return "incident_description"
+
+    # Add witness detection
+    if "witness" in q:
+        if "name" in q or "who" in q:
+            return "witness_names"
+        return "witnesses"
+
+    return "general"
+
+
+def resolve_question_type(input_key: str | None, question_type: str | None = None, ask_prompt: str = "") -> str:
+    if question_type and question_type.strip():
+        return question_type.strip()
+    key = (input_key or "").strip().lower()
+    if key in EXTRACTORS:
+        return key
+    if key in INPUT_KEY_TYPES:
+        return INPUT_KEY_TYPES[key]
+    return sniff_question_type(ask_prompt or "")
+
+
+REGEX_CLARIFICATION = "I'm sorry, I didn't quite catch that in the format I need. Could you please say it again?"
+
+# ---- Combined extraction + validation parsing -------------------------------
+JSON_OBJECT_RE = re.compile(r"\{.*\}", re.S)
+
+
+def parse_combined_result(raw: str, fallback_value: str = "") -> tuple[bool, str, str] | None:
+    """Parse the single-call JSON reply into (is_valid, value, clarification).
+
+    Tolerates code fences, surrounding prose and key/status casing. Returns
+    None when the reply is unusable so the caller can fall back to two calls.
+    """
+    m = JSON_OBJECT_RE.search(raw or "")
+    if not m:
+        return None
+    try:
+        data = json.loads(m.group(0))
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    data = {str(k).strip().lower(): v for k, v in data.items()}
+    status = str(data.get("status") or "").strip().upper().replace(" ", "_")
+    value = str(data.get("value") or "").strip()
+    if status.startswith("INVALID"):
+        clarification = str(data.get("clarification") or "").strip()
+        if not clarification:
+            return None
+        return False, "", clarification
+    if status == "VALID_CORRECTED":
+        corrected = str(data.get("corrected") or "").strip() or value
+        return (True, corrected, "") if corrected else None
+    if status == "VALID":
+        return True, value or fallback_value, ""
+    return None
+
+
+# ---- Disk-backed rewrite cache -----------------------------------------------
+REWRITE_CACHE_PATH = os.getenv("REWRITE_CACHE_PATH", ".cache/rewrites.json")
+REWRITE_CACHE_SAVE_DELAY_S = float(os.getenv("REWRITE_CACHE_SAVE_DELAY_S", "2.0"))
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+
+class RewriteCache:
+    """JSON file of rewrites keyed by (prompt hash, model, prompt-template version).
+
+    The server and the voice pool workers share the file: saves merge with
+    what is on disk and go through a per-process tmp file, so writers never
+    clobber each other's tmp or drop each other's entries. ``save_soon``
+    batches the rewrites of a burst into one write.
+    """
+
+    def __init__(self, path: str | None = REWRITE_CACHE_PATH, save_delay: float = REWRITE_CACHE_SAVE_DELAY_S):
+        self.path = path
+        self.save_delay = save_delay
+        self.data: dict[str, str] = self._load()
+        self._dirty = False
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_loop: asyncio.AbstractEventLoop | None = None
+
+    def _load(self) -> dict[str, str]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable rewrite cache {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def key(text: str, model: str, version: str = REWRITE_PROMPT_VERSION) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{digest}:{model}:v{version}"
+
+    def get(self, key: str) -> str | None:
+        return self.data.get(key)
+
+    def put(self, key: str, value: str):
+        self.data[key] = value
+        self._dirty = True
+
+    def save_soon(self):
+        """Save after ``save_delay`` seconds; puts made meanwhile share the write."""
+        if not self.path:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        if self._timer is not None:
+            if self._timer_loop is loop:
+                return
+            self.save()  # scheduled on a loop that has since closed (one loop per pooled session)
+        self._timer_loop = loop
+        self._timer = loop.call_later(self.save_delay, self.save)
+
+    def save(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self.path or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.data = {**self._load(), **self.data}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=0)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Rewrite cache save failed for {self.path}: {e}")
+
+
+def placeholders(text: str) -> set:
+    return set(PLACEHOLDER_RE.findall(text or ""))
+
+
 # ---- EmpatheticRewriter ------------------------------------------------------
 class EmpatheticRewriter:
-    def __init__(self, model: str = "gpt-3.5-turbo"):
+    def __init__(
+        self,
+        model: str = "gpt-3.5-turbo",
+        cache_path: str | None = REWRITE_CACHE_PATH,
+        combined: bool = os.getenv("INTAKE_COMBINED_EXTRACTION", "1") not in ("", "0", "false", "False"),
+    ):
         print("Initializing EmpatheticRewriter with rule-based extraction + OpenAI...")
         try:
             self.llm = openai_chat(model=model)
@@ -414,18 +679,29 @@ class EmpatheticRewriter:
         self.rewrite_chain = REWRITE_TMPL | self.llm | StrOutputParser()
         self.extraction_chain = EXTRACTION_TMPL | self.llm | StrOutputParser()
         self.validation_chain = VALIDATION_TMPL | self.llm | StrOutputParser()
+        self.combined_chain = COMBINED_TMPL | self.llm | StrOutputParser()
+        self.combined = combined
         self.greet_chain = GREETING_TMPL | self.llm | StrOutputParser()
         self.cache: dict[str, str] = {}
+        self.model = model
+        self.disk_cache = RewriteCache(cache_path)
         
         print("All chains initialized successfully")
 
     # ---------- Public: rewrite ----------
-    async def rewrite(self, text: str) -> str:
+    async def rewrite(self, text: str, persist: bool = True) -> str:
+        """Rewrite a question template. Placeholders like {first_name} are kept so the
+        result can be cached once per template and rendered per caller."""
         if not text:
             return ""
         if text in self.cache:
             print(f"Cache hit for: {text[:50]}...")
             return self.cache[text]
+        key = RewriteCache.key(text, self.model)
+        cached = self.disk_cache.get(key)
+        if cached:
+            self.cache[text] = cached
+            return cached
             
         print(f"Making OpenAI API call for rewrite: {text[:50]}...")
         start_time = time.time()
@@ -438,6 +714,13 @@ class EmpatheticRewriter:
             print(f"Rewritten: {out}")
             
             out = (out or "").strip() or text
+            if placeholders(out) != placeholders(text):
+                print(f"Rewrite changed placeholders, keeping original: {text[:50]}...")
+                out = text
+            else:
+                self.disk_cache.put(key, out)
+                if persist:
+                    self.disk_cache.save_soon()
         except Exception as e:
             end_time = time.time()
             print(f"OpenAI rewrite failed after {end_time - start_time:.2f}s: {e}")
@@ -446,15 +729,40 @@ class EmpatheticRewriter:
         self.cache[text] = out
         return out
 
+    async def warm(self, texts: Iterable[str], concurrency: int = 4):
+        """Precompute rewrites for a flow's templates and persist them once."""
+        todo = [t for t in dict.fromkeys(texts) if t and t not in self.cache]
+        if not todo:
+            return
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(t: str):
+            async with sem:
+                await self.rewrite(t, persist=False)
+
+        await asyncio.gather(*(one(t) for t in todo))
+        self.disk_cache.save()
+
     # ---------- Public: extract & validate ----------
-    async def extract_and_validate(self, question: str, user_response: str) -> Tuple[bool, str, str]:
+    async def extract_and_validate(
+        self,
+        question: str,
+        user_response: str,
+        pattern: Pattern | None = None,
+        qtype: str | None = None,
+    ) -> tuple[bool, str, str]:
         """
         Returns: (is_valid, extracted_info, error_message_if_invalid)
+
+        ``qtype`` is the step's question type, resolved once at graph build;
+        without it the question text is sniffed (legacy callers).
+        If the step has a compiled validate_regex (``pattern``) the answer is
+        accepted or rejected locally and no LLM validation runs.
         """
         if not question or not user_response:
             return True, user_response or "", ""
 
-        qtype = self._get_question_type(question)
+        qtype = qtype or sniff_question_type(question)
         raw = user_response.strip()
         if not raw:
             return True, "", ""
@@ -463,13 +771,26 @@ class EmpatheticRewriter:
 
         # 1) FAST RULE-BASED EXTRACTION FIRST (deterministic)
         rule_value = self._rule_extract(qtype, raw)
+        if pattern is not None:
+            if not rule_value:
+                incr("llm_validations_avoided")
+            return self._regex_validate(pattern, rule_value, raw)
         if rule_value:
             print(f"Rule-based extraction successful: '{rule_value}'")
             return True, rule_value, ""
 
+        incr("llm_validations")
+
+        # 2) One LLM round trip for extraction + validation
+        if self.combined:
+            result = await self._combined_extract(qtype, raw)
+            if result is not None:
+                return result
+            print("Combined reply unusable, falling back to two-step extraction...")
+
         print("Falling back to LLM extraction...")
 
-        # 2) LLM extraction as fallback
+        # 3) LLM extraction as fallback
         extracted = ""
         start_time = time.time()
         try:
@@ -484,7 +805,7 @@ class EmpatheticRewriter:
             print(f"LLM extraction failed: {e}")
             extracted = raw
 
-        # 3) LLM validation
+        # 4) LLM validation
         try:
             validation = await self.validation_chain.ainvoke({
                 "question_type": qtype,
@@ -498,127 +819,60 @@ class EmpatheticRewriter:
 
         return self._parse_validation_result(validation, extracted)
 
+    async def _combined_extract(self, qtype: str, raw: str) -> tuple[bool, str, str] | None:
+        start_time = time.time()
+        try:
+            reply = await self.combined_chain.ainvoke({"question_type": qtype, "response": raw})
+        except Exception as e:
+            print(f"Combined extraction failed: {e}")
+            return None
+        result = parse_combined_result(reply, fallback_value=raw)
+        print(f"Combined extraction {result} in {time.time() - start_time:.2f}s")
+        return result
+
     # ---------- Public: greeting ----------
     async def greeting(self, agent: str, firm: str) -> str:
         key = f"greet::{agent}::{firm}"
         if key in self.cache:
             return self.cache[key]
+        disk_key = RewriteCache.key(key, self.model)
+        cached = self.disk_cache.get(disk_key)
+        if cached:
+            self.cache[key] = cached
+            return cached
         try:
             out = await self.greet_chain.ainvoke({"agent": agent, "firm": firm})
             out = (out or "").strip()
+            self.disk_cache.put(disk_key, out)
+            self.disk_cache.save_soon()
         except Exception:
             out = f"Thank you for calling {firm}. My name is {agent}, and I'm here to support you through this difficult time."
         self.cache[key] = out
         return out
 
     # ---------- Internals ----------
-    def _get_question_type(self, question: str) -> str:
-        q = question.lower()
-        if "first name" in q or "given name" in q:
-            return "first_name"
-        if "last name" in q or "surname" in q or "family name" in q:
-            return "last_name"
-        if "when" in q or "date" in q or "time" in q:
-            return "incident_date"
-        
-        # Check for reports BEFORE location to avoid "anywhere" confusion
-        if ("report" in q or "filed" in q or "contacted" in q):
-            # Make sure it's not asking about location of reports
-            if not ("where did you report" in q or "location of report" in q):
-                return "other_reports"
-        
-        # Location detection - be more specific
-        if ("where" in q or "location" in q or "place" in q) and not ("anywhere" in q):
-            return "incident_location"
-        
-        if "injur" in q or "hurt" in q or "harm" in q:
-            return "injuries"
-        if "medical" in q or "treatment" in q or "doctor" in q or "hospital" in q:
-            return "medical_treatment"
-        
-        # Add incident description detection
-        if ("what happened" in q or "describe" in q or "tell me about" in q or 
-            "incident" in q or "accident" in q or "event" in q or "share what" in q):
-            return "incident_description"
-        
-        # Add witness detection
-        if "witness" in q:
-            if "name" in q or "who" in q:
-                return "witness_names"
-            return "witnesses"
-        
-        return "general"
-    
-
-    def extract_reports_rule(text: str) -> Optional[str]:
-        t = text.strip().lower()
-        
-        # Simple yes/no responses
-        if t in {"yes", "y", "yeah", "yep", "yup", "sure"}:
-            return "Yes"
-        if t in {"no", "n", "nope", "nah", "none"}:
-            return "No"
-        
-        # Yes with specific authority mentioned
-        if "police" in t:
-            return "Yes, to police"
-        if "authority" in t or "authorities" in t:
-            return "Yes, to authority"
-        if "state office" in t:
-            return "Yes, to state office"
-        if "helpline" in t:
-            return "Yes, to helpline"
-        if "insurance" in t:
-            return "Yes, to insurance"
-        
-        # Variations of yes responses - but ignore location info
-        if t.startswith("yes"):
-            remainder = text[3:].strip().strip(",")
-            # Skip if it looks like location (highway, street, etc.)
-            if any(word in remainder.lower() for word in ["highway", "street", "road", "avenue", "thirty", "twenty", "mile"]):
-                return "Yes"
-            if remainder:
-                return f"Yes, {remainder}"
-            return "Yes"
-        
-        # Variations of no responses
-        if t.startswith("no"):
-            return "No"
-        
-        return None
-    def _rule_extract(self, qtype: str, text: str) -> Optional[str]:
+    def _rule_extract(self, qtype: str, text: str) -> str | None:
         """Fast rule-based extraction - tries to extract without LLM first."""
-        if qtype == "first_name":
-            v = extract_first_name_rule(text)
-            return normalize_name(v) if v else None
-        if qtype == "last_name":
-            v = extract_last_name_rule(text)
-            return normalize_name(v) if v else None
-        if qtype == "medical_treatment":
-            v = extract_yes_no_rule(text)
-            return v
-        if qtype == "incident_date":
-            v = extract_date_rule(text)
-            return v
-        # Add incident description rule-based extraction
-        if qtype == "incident_description":
-            cleaned = text.strip()
-            if cleaned and len(cleaned) > 5:
-                return cleaned
-        # Add reports rule-based extraction (improved to avoid location)
-        if qtype == "other_reports":
-            v = extract_reports_rule(text)
-            return v
-        # Add witness extraction
-        if qtype == "witnesses":
-            v = extract_witnesses_rule(text)
-            return v
-        if qtype == "witness_names":
-            v = extract_witness_names_rule(text)
-            return v
-        return None
-
-    def _parse_validation_result(self, validation_result: str, extracted: str = "") -> Tuple[bool, str, str]:
+        extractor = EXTRACTORS.get(qtype)
+        return extractor(text) if extractor else None
+
+    def _regex_validate(self, pattern: Pattern, rule_value: str | None, raw: str) -> tuple[bool, str, str]:
+        """Deterministic validation against the step's validate_regex (no network).
+
+        Uses ``pattern.search`` and stores only the matched span, so an unanchored
+        regex pulls the value out of a longer answer ("my zip is 12345")."""
+        for candidate in (rule_value, raw):
+            m = pattern.search(candidate) if candidate else None
+            if m and m.group(0).strip():
+                value = m.group(0).strip()
+                incr("regex_accepts")
+                print(f"validate_regex accepted: '{value}'")
+                return True, value, ""
+        incr("regex_rejects")
+        print(f"validate_regex rejected: '{raw}'")
+        return False, "", REGEX_CLARIFICATION
+
+    def _parse_validation_result(self, validation_result: str, extracted: str = "") -> tuple[bool, str, str]:
         if validation_result.startswith("VALID_CORRECTED:"):
             corrected = validation_result.replace("VALID_CORRECTED:", "", 1).strip()
             return True, corrected, ""
@@ -0,0 +1,221 @@
+# event_fanout.py
+"""Per-session WebSocket fan-out for server.py.
+
+Each subscriber gets a bounded queue drained by its own task, so publishing
+never waits on socket I/O and one slow browser cannot stall the others. An
+event is serialized once per publish, not once per subscriber.
+
+Events are numbered per session (``seq``) and carry only what changed in
+collected_data / completed_steps. A ring of recent encoded events lets a
+subscriber catch up from ``since_seq``; one that is too far behind gets a
+``snapshot`` event with the full state instead."""
+import asyncio
+import contextlib
+import json
+import os
+from collections import OrderedDict, deque
+from collections.abc import Awaitable
+from typing import Any, Callable, Optional
+
+from intake_metrics import incr
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "5"))
+# What to do when a subscriber's queue is full: "drop" its backlog (it gets a snapshot instead), or "disconnect" it
+WS_SLOW_POLICY = os.getenv("WS_SLOW_POLICY", "drop")
+WS_REPLAY_SIZE = int(os.getenv("WS_REPLAY_SIZE", "128"))
+WS_REPLAY_SESSIONS = int(os.getenv("WS_REPLAY_SESSIONS", "1000"))
+
+# Socket closes started from sync code; the loop only keeps weak references to tasks
+_closing: set[asyncio.Task] = set()
+
+
+class SessionLog:
+    """Sequence counter, last known state and recent encoded events of one session."""
+
+    def __init__(self, size: int = WS_REPLAY_SIZE):
+        self.seq = 0
+        self.node_id: Optional[str] = None
+        self.collected: dict[str, Any] = {}
+        self.completed: list[str] = []
+        self.ring: deque = deque(maxlen=size)  # (seq, encoded event)
+
+    def encode(self, event: dict) -> str:
+        """Number an event, replace its full state with the delta, and remember it."""
+        self.seq += 1
+        out = {k: v for k, v in event.items() if k not in ("collected_data", "completed_steps")}
+        out["seq"] = self.seq
+        if "collected_data" in event:
+            data = event["collected_data"] or {}
+            changed = {k: v for k, v in data.items() if k not in self.collected or self.collected[k] != v}
+            removed = [k for k in self.collected if k not in data]
+            if changed:
+                out["data_changed"] = changed
+            if removed:
+                out["data_removed"] = removed
+            self.collected = dict(data)
+        if "completed_steps" in event:
+            steps = list(event["completed_steps"] or [])
+            if steps[: len(self.completed)] == self.completed:
+                if len(steps) > len(self.completed):
+                    out["steps_added"] = steps[len(self.completed):]
+            else:
+                out["completed_steps"] = steps  # not an append: send the whole list
+            self.completed = steps
+        if event.get("event") == "node_entered" and event.get("node_id"):
+            self.node_id = event["node_id"]
+        msg = json.dumps(out, default=str)
+        self.ring.append((self.seq, msg))
+        return msg
+
+    def snapshot(self) -> str:
+        return json.dumps({
+            "event": "snapshot",
+            "seq": self.seq,
+            "node_id": self.node_id,
+            "collected_data": self.collected,
+            "completed_steps": self.completed,
+        }, default=str)
+
+    def since(self, seq: int) -> Optional[list[str]]:
+        """Encoded events after ``seq``, or None if the ring no longer reaches back that far."""
+        if seq == self.seq:
+            return []
+        if seq > self.seq or not self.ring or self.ring[0][0] > seq + 1:
+            return None
+        return [msg for s, msg in self.ring if s > seq]
+
+
+class Subscriber:
+    """One connection: a bounded outbox plus the task that drains it."""
+
+    def __init__(
+        self,
+        send_text: Callable[[str], Awaitable[Any]],
+        close: Optional[Callable[[], Awaitable[Any]]] = None,
+        queue_size: int = WS_QUEUE_SIZE,
+        send_timeout_s: float = WS_SEND_TIMEOUT_S,
+        policy: str = WS_SLOW_POLICY,
+    ):
+        self._send_text = send_text
+        self._close = close
+        self.send_timeout_s = send_timeout_s
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self.on_closed: Optional[Callable[[Subscriber], None]] = None
+        # Returns a full-state event; set by Fanout so an overflow can resync instead of leaving a gap
+        self.resync: Optional[Callable[[], str]] = None
+        self._task = asyncio.create_task(self._drain())
+
+    def offer(self, msg: str) -> bool:
+        """Queue a serialized event without waiting; applies the slow-consumer policy when full."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(msg)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "disconnect":
+            incr("ws_slow_disconnects")
+            self.close()
+            return False
+        if self.resync is not None:
+            # Deltas after a gap are useless: replace the backlog with one snapshot.
+            n = self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.resync())
+        else:
+            n = 1
+            self.queue.get_nowait()
+            self.queue.put_nowait(msg)
+        self.dropped += n
+        incr("ws_events_dropped", n)
+        return True
+
+    async def _drain(self):
+        try:
+            while True:
+                msg = await self.queue.get()
+                await asyncio.wait_for(self._send_text(msg), self.send_timeout_s)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                incr("ws_slow_disconnects")
+            print(f"[WS] subscriber dropped: {e!r}")
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if asyncio.current_task() is not self._task:
+            self._task.cancel()
+        if self._close:
+            task = asyncio.create_task(self._quiet_close())
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        if self.on_closed:
+            self.on_closed(self)
+
+    async def _quiet_close(self):
+        with contextlib.suppress(Exception):
+            await self._close()
+
+
+class Fanout:
+    """session_id -> subscribers, plus a SessionLog per recently active session."""
+
+    def __init__(self, max_logs: int = WS_REPLAY_SESSIONS, replay_size: int = WS_REPLAY_SIZE):
+        self.subs: dict[str, set[Subscriber]] = {}
+        self.max_logs = max_logs
+        self.replay_size = replay_size
+        self.logs: OrderedDict[str, SessionLog] = OrderedDict()
+
+    def log(self, session_id: str) -> SessionLog:
+        log = self.logs.get(session_id)
+        if log is None:
+            log = self.logs[session_id] = SessionLog(self.replay_size)
+            while len(self.logs) > self.max_logs:
+                self.logs.popitem(last=False)
+        self.logs.move_to_end(session_id)
+        return log
+
+    def subscribe(self, session_id: str, sub: Subscriber, since_seq: Optional[int] = None) -> Subscriber:
+        """Add a subscriber and bring it up to date (replay after since_seq, else a snapshot)."""
+        self.subs.setdefault(session_id, set()).add(sub)
+        sub.on_closed = lambda s: self.unsubscribe(session_id, s)
+        sub.resync = lambda: self.log(session_id).snapshot()
+        self.catch_up(session_id, sub, since_seq)
+        return sub
+
+    def catch_up(self, session_id: str, sub: Subscriber, since_seq: Optional[int] = None):
+        log = self.log(session_id)
+        missed = log.since(since_seq) if since_seq is not None else None
+        if missed is not None and len(missed) < sub.queue.maxsize:
+            for msg in missed:
+                sub.offer(msg)
+        elif log.seq:
+            sub.offer(log.snapshot())
+
+    def unsubscribe(self, session_id: str, sub: Subscriber):
+        group = self.subs.get(session_id)
+        if group is not None:
+            group.discard(sub)
+            if not group:
+                del self.subs[session_id]
+        sub.on_closed = None
+        sub.close()
+
+    def count(self, session_id: str) -> int:
+        return len(self.subs.get(session_id, ()))
+
+    def publish(self, session_id: str, event: dict) -> int:
+        """Queue an event for every subscriber of a session; returns how many accepted it."""
+        group = self.subs.get(session_id) or ()
+        msg = self.log(session_id).encode(event)
+        return sum(sub.offer(msg) for sub in list(group))
@@ -0,0 +1,39 @@
+# intake_metrics.py
+"""Process-wide counters for the intake engine (served by server.py /api/metrics)."""
+from collections import Counter, deque
+
+TIMING_SAMPLES = 512
+
+_counters: Counter = Counter()
+_timings: dict[str, deque] = {}
+
+
+def incr(name: str, n: int = 1):
+    _counters[name] += n
+
+
+def observe(name: str, ms: float):
+    """Record a latency sample (bounded; the newest TIMING_SAMPLES are kept)."""
+    _timings.setdefault(name, deque(maxlen=TIMING_SAMPLES)).append(ms)
+
+
+def _pct(ordered, q: float) -> float:
+    return round(ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))], 1)
+
+
+def timings() -> dict[str, dict[str, float]]:
+    out = {}
+    for name, samples in _timings.items():
+        ordered = sorted(samples)
+        if ordered:
+            out[name] = {"count": len(ordered), "p50": _pct(ordered, 50), "p95": _pct(ordered, 95)}
+    return out
+
+
+def snapshot() -> dict[str, int]:
+    return dict(_counters)
+
+
+def reset():
+    _counters.clear()
+    _timings.clear()
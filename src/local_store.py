@@ -0,0 +1,376 @@
+# local_store.py
+"""Offline stand-ins for the Supabase client.
+
+Memory and SQLite backends of the flows / intake_steps / intake_runs /
+intake_answers tables behind the subset of the supabase-py query builder the
+intake engine uses (table/select/insert/upsert/update/delete, eq/gt/in_,
+order/limit/single, awaitable execute). Selected with INTAKE_STORAGE.
+"""
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import uuid
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv(".env.local")
+INTAKE_SQLITE_PATH = os.getenv("INTAKE_SQLITE_PATH", ".intake_store.sqlite3")
+INTAKE_SEED_FILE = os.getenv("INTAKE_SEED_FILE", "")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS flows (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS intake_steps (
+    id TEXT PRIMARY KEY,
+    flow_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    ask_prompt TEXT,
+    input_key TEXT,
+    next_name TEXT,
+    system_prompt TEXT,
+    validate_regex TEXT,
+    question_type TEXT,
+    endpointing_ms INTEGER,
+    order_index INTEGER,
+    created_at TEXT,
+    UNIQUE (flow_id, name)
+);
+CREATE INDEX IF NOT EXISTS intake_steps_flow_order ON intake_steps (flow_id, order_index);
+CREATE TABLE IF NOT EXISTS intake_runs (
+    id TEXT PRIMARY KEY,
+    flow_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    created_at TEXT,
+    completed_at TEXT,
+    UNIQUE (flow_id, session_id)
+);
+CREATE TABLE IF NOT EXISTS intake_answers (
+    id TEXT PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    step_name TEXT,
+    input_key TEXT,
+    value TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS intake_answers_run ON intake_answers (run_id);
+"""
+# Columns added after a table first shipped: (table, column, type), applied to older files on open
+_ADDED_COLUMNS = [
+    ("intake_steps", "endpointing_ms", "INTEGER"),
+]
+
+
+class LocalStoreError(Exception):
+    """Raised where PostgREST would return an error (e.g. .single() without exactly one row)."""
+
+
+def _new_row(row: dict[str, Any]) -> dict[str, Any]:
+    row = dict(row)
+    row.setdefault("id", str(uuid.uuid4()))
+    row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+    return row
+
+
+class Query:
+    """One request being built; ``execute`` hands it to the owning client."""
+
+    def __init__(self, client: "_LocalClient", table: str):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.payload: Any = None
+        self.on_conflict = ""
+        self.filters: list[tuple[str, str, Any]] = []
+        self.order_by: Optional[tuple[str, bool]] = None
+        self.limit_n: Optional[int] = None
+        self.want_single = False
+
+    def select(self, columns: str = "*"):
+        self.columns = columns
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", default_to_null: bool = True):
+        # Both stores always behave like default_to_null=False: a missing key keeps its default / stored value.
+        self.op, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, data: dict[str, Any]):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column: str, value: Any):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def gt(self, column: str, value: Any):
+        self.filters.append(("gt", column, value))
+        return self
+
+    def in_(self, column: str, values: Iterable[Any]):
+        self.filters.append(("in", column, list(values)))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, n: int):
+        self.limit_n = n
+        return self
+
+    def single(self):
+        self.want_single = True
+        return self
+
+    @property
+    def rows(self) -> list[dict[str, Any]]:
+        return self.payload if isinstance(self.payload, list) else [self.payload]
+
+    @property
+    def conflict_keys(self) -> list[str]:
+        return [k.strip() for k in (self.on_conflict or "id").split(",") if k.strip()]
+
+    async def execute(self):
+        if self.client.latency_s:
+            await asyncio.sleep(self.client.latency_s)
+        self.client.calls += 1
+        data = self.client._run(self)
+        if self.want_single:
+            if len(data) != 1:
+                raise LocalStoreError(f"{self.table}: expected 1 row, got {len(data)}")
+            data = data[0]
+        return SimpleNamespace(data=data, count=None)
+
+
+class _LocalClient:
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def table(self, name: str) -> Query:
+        return Query(self, name)
+
+    def _run(self, q: Query) -> list[dict[str, Any]]:
+        raise NotImplementedError
+
+
+class MemoryClient(_LocalClient):
+    """Tables as lists of dicts; nothing survives the process."""
+
+    def __init__(self, latency_s: float = 0.0):
+        super().__init__(latency_s)
+        self.tables: dict[str, list[dict[str, Any]]] = {}
+
+    @staticmethod
+    def _match(row: dict[str, Any], filters) -> bool:
+        for op, col, value in filters:
+            v = row.get(col)
+            if op == "eq" and v != value:
+                return False
+            if op == "gt" and (v is None or not v > value):
+                return False
+            if op == "in" and v not in value:
+                return False
+        return True
+
+    def _run(self, q: Query) -> list[dict[str, Any]]:
+        table = self.tables.setdefault(q.table, [])
+        if q.op == "insert":
+            out = [_new_row(r) for r in q.rows]
+            table.extend(out)
+            return copy.deepcopy(out)
+        if q.op == "upsert":
+            out = []
+            for r in q.rows:
+                hit = next((e for e in table if all(e.get(k) == r.get(k) for k in q.conflict_keys)), None)
+                if hit is None:
+                    hit = _new_row(r)
+                    table.append(hit)
+                else:
+                    hit.update(r)
+                out.append(hit)
+            return copy.deepcopy(out)
+
+        rows = [r for r in table if self._match(r, q.filters)]
+        if q.op == "update":
+            for r in rows:
+                r.update(q.payload)
+            return copy.deepcopy(rows)
+        if q.op == "delete":
+            ids = {id(r) for r in rows}
+            self.tables[q.table] = [r for r in table if id(r) not in ids]
+            return copy.deepcopy(rows)
+
+        if q.order_by:
+            col, desc = q.order_by
+            rows = sorted(rows, key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+        if q.limit_n is not None:
+            rows = rows[: q.limit_n]
+        if q.columns.strip() == "*":
+            return [dict(r) for r in rows]
+        cols = [c.strip() for c in q.columns.split(",")]
+        return [{c: r.get(c) for c in cols} for r in rows]
+
+
+class SqliteClient(_LocalClient):
+    """Same tables in a local SQLite file (or ":memory:")."""
+
+    def __init__(self, path: str = INTAKE_SQLITE_PATH, latency_s: float = 0.0):
+        super().__init__(latency_s)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        for table, column, kind in _ADDED_COLUMNS:
+            if column not in [r["name"] for r in self._db.execute(f"PRAGMA table_info({table})")]:
+                self._db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+        self._columns: dict[str, list[str]] = {}
+
+    def _cols(self, table: str, names: Iterable[str]) -> list[str]:
+        known = self._columns.get(table)
+        if known is None:
+            known = [r["name"] for r in self._db.execute(f"PRAGMA table_info({table})")]
+            if not known:
+                raise LocalStoreError(f"unknown table {table}")
+            self._columns[table] = known
+        names = list(names)
+        bad = [n for n in names if n not in known]
+        if bad:
+            raise LocalStoreError(f"unknown column(s) {bad} on {table}")
+        return names
+
+    def _where(self, q: Query) -> tuple[str, list[Any]]:
+        parts, args = [], []
+        for op, col, value in q.filters:
+            self._cols(q.table, [col])
+            if op == "in":
+                if not value:
+                    parts.append("0")
+                    continue
+                parts.append(f"{col} IN ({', '.join('?' * len(value))})")
+                args.extend(value)
+            else:
+                parts.append(f"{col} {'=' if op == 'eq' else '>'} ?")
+                args.append(value)
+        return (" WHERE " + " AND ".join(parts)) if parts else "", args
+
+    def _run(self, q: Query) -> list[dict[str, Any]]:
+        try:
+            out = self._run_sql(q)
+            if q.op != "select":
+                self._db.commit()
+            return out
+        except sqlite3.Error as e:
+            self._db.rollback()
+            raise LocalStoreError(f"{q.op} {q.table}: {e}") from e
+
+    def _run_sql(self, q: Query) -> list[dict[str, Any]]:
+        db = self._db
+        if q.op in ("insert", "upsert"):
+            out = []
+            for r in q.rows:
+                # Upserts get fresh defaults too; on conflict they are not in the SET list.
+                r = _new_row(r)
+                cols = self._cols(q.table, r)
+                sql = f"INSERT INTO {q.table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+                if q.op == "upsert":
+                    keys = self._cols(q.table, q.conflict_keys)
+                    sets = [c for c in cols if c not in keys and c not in ("id", "created_at")]
+                    sql += f" ON CONFLICT ({', '.join(keys)}) DO "
+                    sql += ("UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in sets)) if sets else "NOTHING"
+                row = db.execute(sql + " RETURNING *", [r[c] for c in cols]).fetchone()
+                if row is None:  # DO NOTHING on conflict: return the existing row
+                    where = " AND ".join(f"{k} = ?" for k in q.conflict_keys)
+                    row = db.execute(f"SELECT * FROM {q.table} WHERE {where}", [r.get(k) for k in q.conflict_keys]).fetchone()
+                out.append(dict(row))
+            return out
+
+        where, args = self._where(q)
+        if q.op == "update":
+            cols = self._cols(q.table, q.payload)
+            sql = f"UPDATE {q.table} SET {', '.join(f'{c} = ?' for c in cols)}{where} RETURNING *"
+            return [dict(r) for r in db.execute(sql, [q.payload[c] for c in cols] + args)]
+        if q.op == "delete":
+            return [dict(r) for r in db.execute(f"DELETE FROM {q.table}{where} RETURNING *", args)]
+
+        cols = "*" if q.columns.strip() == "*" else ", ".join(self._cols(q.table, (c.strip() for c in q.columns.split(","))))
+        sql = f"SELECT {cols} FROM {q.table}{where}"
+        if q.order_by:
+            col, desc = q.order_by
+            self._cols(q.table, [col])
+            sql += f" ORDER BY {col} {'DESC' if desc else 'ASC'}"
+        if q.limit_n is not None:
+            sql += f" LIMIT {int(q.limit_n)}"
+        return [dict(r) for r in db.execute(sql, args)]
+
+    def close(self):
+        self._db.close()
+
+
+# ---------- Seeding ----------
+async def seed_flow(
+    client, flow_name: str, steps: list[dict[str, Any]], replace: bool = False, order_gap: int = 1024
+) -> str:
+    """Create ``flow_name`` with ordered ``steps`` (intake_steps rows without flow_id).
+
+    order_index is spaced ``order_gap`` apart (the engine inserts at midpoints)
+    and next_name defaults to the following step. An existing flow is left alone
+    unless ``replace`` is set. Works against any client with the builder API.
+    """
+    existing = (await client.table("flows").select("id").eq("name", flow_name).execute()).data or []
+    if existing and not replace:
+        return existing[0]["id"]
+    if existing:
+        flow_id = existing[0]["id"]
+        await client.table("intake_steps").delete().eq("flow_id", flow_id).execute()
+    else:
+        flow_id = (await client.table("flows").insert({"name": flow_name}).execute()).data[0]["id"]
+
+    rows = []
+    for i, step in enumerate(steps):
+        row = {"flow_id": flow_id, "order_index": (i + 1) * order_gap, **step}
+        row.setdefault("next_name", steps[i + 1]["name"] if i + 1 < len(steps) else None)
+        rows.append(row)
+    if rows:
+        await client.table("intake_steps").insert(rows).execute()
+    return flow_id
+
+
+async def seed_from_file(client, path: str):
+    """Seed flows from a JSON file shaped ``{"flow_name": [step rows...]}``."""
+    with open(path, encoding="utf-8") as f:
+        flows = json.load(f)
+    for flow_name, steps in flows.items():
+        await seed_flow(client, flow_name, steps)
+
+
+async def create_local_client(kind: str, path: str = INTAKE_SQLITE_PATH, seed_file: str = INTAKE_SEED_FILE):
+    """Build the backend named by INTAKE_STORAGE ("memory" or "sqlite")."""
+    if kind == "memory":
+        client = MemoryClient()
+    elif kind == "sqlite":
+        client = SqliteClient(path)
+    else:
+        raise ValueError(f"Unknown INTAKE_STORAGE backend: {kind!r} (expected supabase, memory or sqlite)")
+    if seed_file:
+        await seed_from_file(client, seed_file)
+    return client
@@ -0,0 +1,164 @@
+# session_store.py
+"""Resident UI sessions for server.py: idle TTL, max count and an approximate
+memory budget. Conversation state lives in the engine's checkpointer, so an
+evicted session only loses its in-process handle and is restored on its next
+message from the checkpoint (the tombstone remembers which flow it ran)."""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+SESSION_IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", "900"))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "500"))
+SESSION_MEMORY_BUDGET_MB = float(os.getenv("SESSION_MEMORY_BUDGET_MB", "128"))
+SESSION_TOMBSTONES = int(os.getenv("SESSION_TOMBSTONES", "10000"))
+SESSION_SWEEP_S = float(os.getenv("SESSION_SWEEP_S", "30"))
+SESSION_BASE_BYTES = 4096  # assistant handle + bookkeeping; the compiled graph is shared per flow
+
+
+def approx_size(state: Optional[dict]) -> int:
+    """Rough resident size of a session: serialized state plus fixed overhead."""
+    if not state:
+        return SESSION_BASE_BYTES
+    try:
+        body = json.dumps(state, default=lambda o: getattr(o, "content", None) or str(o))
+    except Exception:
+        body = str(state)
+    return SESSION_BASE_BYTES + len(body)
+
+
+class Session:
+    __slots__ = ("assistant", "flow_name", "last_used", "size", "state")
+
+    def __init__(self, assistant: Any, flow_name: str, state: Optional[dict]):
+        self.assistant = assistant
+        self.flow_name = flow_name
+        self.state = state or {}
+        self.size = approx_size(state)
+        self.last_used = time.monotonic()
+
+
+class SessionStore:
+    """LRU of resident sessions bounded by idle time, count and approximate bytes.
+
+    ``pinned(session_id)`` keeps a session resident regardless of the limits
+    (e.g. while a voice agent is attached). ``on_evict(session_id, reason)`` is
+    called after a session is dropped. Evicted ids keep a tombstone
+    (session -> flow name, bounded LRU) so they can be restored later.
+    """
+
+    def __init__(
+        self,
+        idle_ttl_s: float = SESSION_IDLE_TTL_S,
+        max_sessions: int = SESSION_MAX,
+        memory_budget_bytes: int = int(SESSION_MEMORY_BUDGET_MB * 1024 * 1024),
+        max_tombstones: int = SESSION_TOMBSTONES,
+        pinned: Optional[Callable[[str], bool]] = None,
+        on_evict: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.idle_ttl_s = idle_ttl_s
+        self.max_sessions = max_sessions
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_tombstones = max_tombstones
+        self.pinned = pinned or (lambda session_id: False)
+        self.on_evict = on_evict
+        self.bytes = 0
+        self.restores = 0
+        self.evictions: dict[str, int] = {"ttl": 0, "count": 0, "memory": 0}
+        self._sessions: OrderedDict[str, Session] = OrderedDict()
+        self._tombstones: OrderedDict[str, str] = OrderedDict()
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    @property
+    def resident(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """Resident session (marked most recently used), or None."""
+        s = self._sessions.get(session_id)
+        if s is not None:
+            s.last_used = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return s
+
+    def state(self, session_id: str) -> Optional[dict]:
+        s = self._sessions.get(session_id)
+        return s.state if s is not None else None
+
+    def flow_of(self, session_id: str) -> Optional[str]:
+        """Flow name of a resident or evicted session."""
+        s = self._sessions.get(session_id)
+        return s.flow_name if s is not None else self._tombstones.get(session_id)
+
+    def put(self, session_id: str, assistant: Any, flow_name: str, state: Optional[dict] = None) -> Session:
+        self._drop(session_id)
+        self._tombstones.pop(session_id, None)
+        s = Session(assistant, flow_name, state)
+        self._sessions[session_id] = s
+        self.bytes += s.size
+        self._enforce_caps()
+        return s
+
+    def update_state(self, session_id: str, state: dict):
+        s = self.get(session_id)
+        if s is None:
+            return
+        self.bytes -= s.size
+        s.state = state
+        s.size = approx_size(state)
+        self.bytes += s.size
+        self._enforce_caps()
+
+    def _drop(self, session_id: str) -> Optional[Session]:
+        s = self._sessions.pop(session_id, None)
+        if s is not None:
+            self.bytes -= s.size
+        return s
+
+    def evict(self, session_id: str, reason: str) -> bool:
+        s = self._drop(session_id)
+        if s is None:
+            return False
+        self._tombstones[session_id] = s.flow_name
+        self._tombstones.move_to_end(session_id)
+        while len(self._tombstones) > self.max_tombstones:
+            self._tombstones.popitem(last=False)
+        self.evictions[reason] = self.evictions.get(reason, 0) + 1
+        if self.on_evict:
+            self.on_evict(session_id, reason)
+        return True
+
+    def _enforce_caps(self):
+        # Oldest first; pinned sessions are skipped, so the limits are soft while everything is pinned.
+        for session_id in list(self._sessions):
+            if len(self._sessions) > self.max_sessions:
+                reason = "count"
+            elif self.bytes > self.memory_budget_bytes:
+                reason = "memory"
+            else:
+                break
+            if not self.pinned(session_id):
+                self.evict(session_id, reason)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evict sessions idle longer than idle_ttl_s; returns how many were dropped."""
+        now = time.monotonic() if now is None else now
+        idle = [sid for sid, s in self._sessions.items() if now - s.last_used > self.idle_ttl_s]
+        return sum(self.evict(sid, "ttl") for sid in idle if not self.pinned(sid))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "resident": len(self._sessions),
+            "approx_bytes": self.bytes,
+            "evictions": dict(self.evictions),
+            "restores": self.restores,
+            "tombstones": len(self._tombstones),
+            "limits": {
+                "idle_ttl_s": self.idle_ttl_s,
+                "max_sessions": self.max_sessions,
+                "memory_budget_bytes": self.memory_budget_bytes,
+            },
+        }
@@ -1,29 +1,120 @@
-from typing import Dict, List, TypedDict, Annotated, Optional, Tuple, Any
+from typing import TypedDict, Annotated, Optional, Any
+from re import Pattern
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import MemorySaver
 from supabase import AsyncClient, create_async_client
 import os
+import asyncio
+import contextlib
 import uuid
 import re
+import time
+from collections import OrderedDict, deque
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 import httpx
 
+from empathetic_rewriter import EXTRACTORS, EmpatheticRewriter, resolve_question_type
+from checkpoint_store import BoundedSqliteSaver
+from intake_metrics import incr, snapshot as metrics_snapshot  # noqa: F401 (re-exported for server.py)
+from local_store import create_local_client
+
 load_dotenv(".env.local")
-from empathetic_rewriter import EmpatheticRewriter
 rewriter = EmpatheticRewriter()
 
 # Event emitter configuration
 FLOW_EVENTS_URL = os.getenv("FLOW_EVENTS_URL", "http://localhost:8000/events")
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "50"))
+
+
+class EventPublisher:
+    """Shared, non-blocking publisher for UI events.
+
+    Events go into a bounded in-memory queue (oldest dropped when full) and a
+    single background task posts them in batches to ``{url}/batch`` over one
+    pooled httpx client. Publishing never waits on the network.
+    """
+
+    def __init__(
+        self,
+        url: str = FLOW_EVENTS_URL,
+        maxlen: int = EVENT_QUEUE_SIZE,
+        batch_size: int = EVENT_BATCH_SIZE,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.sent = 0
+        self._queue: deque = deque(maxlen=maxlen)
+        self._transport = transport
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def publish(self, session_id: str, event: dict):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1  # deque drops the oldest on append
+        self._queue.append({"session_id": session_id, "event": event})
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop yet; delivered once one starts publishing
+        if self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._client = None
+            self._task = None
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                await self._send(batch)
+
+    async def _send(self, batch: list[dict]):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=2.0,
+                transport=self._transport,
+                limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+            )
+        try:
+            await self._client.post(f"{self.url}/batch", json={"events": batch})
+            self.sent += len(batch)
+        except Exception as e:
+            # UI telemetry is best effort; never let it back up the voice loop.
+            dbg(f"[EVENTS][WARN] dropped batch of {len(batch)}: {e!r}")
+
+    async def aclose(self):
+        """Deliver what is queued and close the pooled client."""
+        while self._queue:
+            await self._send([self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))])
+        if self._task:
+            self._task.cancel()
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+
+event_publisher = EventPublisher()
+
+
+def publish_event(session_id: str, event: dict):
+    event_publisher.publish(session_id, event)
+
 
 async def emit_event(session_id: str, event: dict):
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as c:
-            await c.post(f"{FLOW_EVENTS_URL}/{session_id}", json=event)
-    except Exception:
-        pass  
+    """Queue a UI event. Kept awaitable for existing callers; returns immediately."""
+    publish_event(session_id, event)
 
 # ---------- Debug helper ----------
 DEBUG = os.getenv("INTAKE_DEBUG", "1") not in ("", "0", "false", "False")
@@ -41,18 +132,33 @@ def is_farewell(txt: str) -> bool:
     return bool(txt and FAREWELL_RE.search(txt))
 
 
+# ---------- Fixed replies ----------
+# Same text on every call, so the voice agent can cache their audio (see speakable_lines)
+FAREWELL_REPLY = "Thanks, your intake is saved. We'll follow up shortly. Goodbye!"
+INTAKE_COMPLETE_REPLY = "Your intake is complete. Say 'bye' when you're ready to end, or tell me if you want to add anything."
+QUICK_ACKS = {
+    "no_injury": "That's a relief to hear. Let's continue with the next steps.",
+    "serious_injury": "That sounds very serious. Please get medical help.",
+    "no_treatment": "Thanks for letting me know. Let's continue.",
+    "witness_names": "Could you share the names of the witnesses if you know them?",
+}
+STATIC_REPLIES = (FAREWELL_REPLY, INTAKE_COMPLETE_REPLY, *QUICK_ACKS.values())
+
 # ---------- State ----------
 class IntakeState(TypedDict):
-    messages: Annotated[List[BaseMessage], add_messages]
-    collected_data: Dict[str, str]
+    messages: Annotated[list[BaseMessage], add_messages]
+    collected_data: dict[str, str]
     current_step: str
-    completed_steps: List[str]
+    completed_steps: list[str]
     human_cursor: int
     session_id: str
 
 
 # ---------- Helpers ----------
-def render(template: str, data: Dict[str, str]) -> str:
+PLACEHOLDER_RE = re.compile(r"\{[A-Za-z_][A-Za-z0-9_]*\}")
+
+
+def render(template: str, data: dict[str, str]) -> str:
     out = template
     for k, v in (data or {}).items():
         out = out.replace(f"{{{k}}}", v)
@@ -80,7 +186,91 @@ def last_ai_block(msgs) -> str:
     return out[0] if out else ""
 
 
+# ---------- Turn timing ----------
+# How long the caller may pause before their answer is committed. Slot-filling
+# answers (names, yes/no, codes) are short and should be taken quickly;
+# narratives need room for thinking pauses. A step's endpointing_ms column
+# overrides its profile.
+TURN_PROFILES_MS = {
+    "short": int(os.getenv("ENDPOINTING_SHORT_MS", "600")),
+    "default": int(os.getenv("ENDPOINTING_DEFAULT_MS", "1200")),
+    "long": int(os.getenv("ENDPOINTING_LONG_MS", "2500")),
+}
+QTYPE_TURN_PROFILES = {
+    "first_name": "short",
+    "last_name": "short",
+    "medical_treatment": "short",
+    "other_reports": "short",
+    "witnesses": "short",
+    "incident_date": "default",
+    "incident_location": "default",
+    "witness_names": "default",
+    "general": "default",
+    "injuries": "long",
+    "incident_description": "long",
+}
+ENDPOINTING_MIN_MS, ENDPOINTING_MAX_MS = 100, 10000
+
+
+def turn_timing_for(profile: str, endpointing_ms: int, qtype: str = "general") -> dict[str, Any]:
+    """STT endpointing plus the session's turn-detection delays for one step."""
+    delay = endpointing_ms / 1000
+    return {
+        "profile": profile,
+        "qtype": qtype,
+        "endpointing_ms": endpointing_ms,
+        "min_endpointing_delay": delay,
+        "max_endpointing_delay": max(3 * delay, 2.0),
+    }
+
+
+def resolve_turn_timing(qtype: Optional[str], endpointing_ms: Optional[int] = None, has_format: bool = False) -> dict[str, Any]:
+    qtype = qtype or "general"
+    if endpointing_ms:
+        return turn_timing_for("custom", int(endpointing_ms), qtype)
+    # Steps with a validate_regex expect a code or number: short, like slot filling
+    profile = "short" if has_format else QTYPE_TURN_PROFILES.get(qtype, "default")
+    return turn_timing_for(profile, TURN_PROFILES_MS[profile], qtype)
+
+
+DEFAULT_TURN_TIMING = turn_timing_for("default", TURN_PROFILES_MS["default"])
+
+
+def check_endpointing_ms(value: Any) -> Optional[int]:
+    if value in (None, ""):
+        return None
+    try:
+        ms = int(value)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"endpointing_ms must be an integer, got {value!r}") from e
+    if not ENDPOINTING_MIN_MS <= ms <= ENDPOINTING_MAX_MS:
+        raise ValueError(f"endpointing_ms must be between {ENDPOINTING_MIN_MS} and {ENDPOINTING_MAX_MS}")
+    return ms
+
+
 # ---------- Steps ----------
+def compile_validate_regex(validate_regex: Optional[str], step_name: str = "") -> Optional[Pattern]:
+    """Compile a step's validate_regex exactly as the flow author wrote it (no added
+    flags). Answers are checked with ``pattern.search``, so the regex must be anchored
+    (``^...$``) to require the whole answer to match; add ``(?i)`` for case-insensitivity."""
+    if not validate_regex or not validate_regex.strip():
+        return None
+    try:
+        return re.compile(validate_regex)
+    except re.error as e:
+        dbg(f"[STEP][WARN] ignoring invalid validate_regex on '{step_name}': {e}")
+        return None
+
+
+def check_validate_regex(validate_regex: Optional[str]):
+    """Reject regexes that would not compile before they reach the DB."""
+    if validate_regex and validate_regex.strip():
+        try:
+            re.compile(validate_regex)
+        except re.error as e:
+            raise ValueError(f"Invalid validate_regex {validate_regex!r}: {e}") from e
+
+
 class Step:
     def __init__(
         self,
@@ -90,6 +280,8 @@ class Step:
         next_name: Optional[str],
         system_prompt: Optional[str] = None,
         validate_regex: Optional[str] = None,
+        question_type: Optional[str] = None,
+        endpointing_ms: Optional[int] = None,
     ):
         self.name = name
         self.ask_prompt = ask_prompt
@@ -97,6 +289,18 @@ class Step:
         self.next_name = next_name
         self.system_prompt = system_prompt
         self.validate_regex = validate_regex
+        self.question_type = question_type
+        self.endpointing_ms = endpointing_ms
+        self.validate_pattern: Optional[Pattern] = None
+        self.qtype: Optional[str] = None
+        self.turn_timing: dict[str, Any] = {}
+
+    def compile(self):
+        """Precompile per-step rules once when the graph is built."""
+        self.validate_pattern = compile_validate_regex(self.validate_regex, self.name)
+        self.qtype = resolve_question_type(self.input_key, self.question_type, self.ask_prompt)
+        self.turn_timing = resolve_turn_timing(self.qtype, self.endpointing_ms, self.validate_pattern is not None)
+        return self
 
     async def update(
         self,
@@ -112,134 +316,54 @@ class Step:
         self.next_name = next_name
         self.system_prompt = system_prompt
         self.validate_regex = validate_regex
+        self.compile()
         return True
 
 
 async def delete_step(flow_name: str, step_name: str) -> bool:
-    """Delete a step from the database and fix next_name references."""
-    client = await supa()
-    
-    # Get flow_id
-    try:
-        flow_resp = await (
-            client.table("flows")
-            .select("id")
-            .eq("name", flow_name)
-            .single()
-            .execute()
-        )
-        flow_id = flow_resp.data["id"]
-    except Exception as e:
-        dbg(f"[DB] Flow not found: {flow_name}")
-        return False
-    
-    # Get the step to delete
-    try:
-        step_resp = await (
-            client.table("intake_steps")
-            .select("*")
-            .eq("flow_id", flow_id)
-            .eq("name", step_name)
-            .single()
-            .execute()
-        )
-        step_to_delete = step_resp.data
-    except Exception as e:
-        dbg(f"[DB] Step not found: {step_name}")
-        return False
-    
-    # Find steps that point to this step and update their next_name
-    try:
-        # Find steps that have next_name pointing to the step we're deleting
-        pointing_steps_resp = await (
-            client.table("intake_steps")
-            .select("*")
-            .eq("flow_id", flow_id)
-            .eq("next_name", step_name)
-            .execute()
-        )
-        
-        # Update their next_name to point to what the deleted step was pointing to
-        for pointing_step in pointing_steps_resp.data or []:
-            new_next_name = step_to_delete.get("next_name", None)
-            await (
-                client.table("intake_steps")
-                .update({"next_name": new_next_name})
-                .eq("id", pointing_step["id"])
-                .execute()
-            )
-            dbg(f"[DB] Updated step {pointing_step['name']} next_name: {new_next_name}")
-    except Exception as e:
-        dbg(f"[DB] Error updating next_name references: {e}")
-        return False
-    
-    # Delete the step
+    """Delete a step from the database and fix next_name references.
+
+    order_index is gapped, so the remaining steps keep their positions (no shifting).
+    """
     try:
-        await (
-            client.table("intake_steps")
-            .delete()
-            .eq("flow_id", flow_id)
-            .eq("name", step_name)
-            .execute()
-        )
+        await apply_flow_batch(flow_name, [{"op": "delete", "step": step_name}])
         dbg(f"[DB] Deleted step: {step_name}")
-        
-        # Reorder remaining steps to fill gaps
-        await reorder_steps_after_delete(flow_id, step_to_delete["order_index"])
         return True
     except Exception as e:
         dbg(f"[DB] Error deleting step {step_name}: {e}")
         return False
 
 
-async def reorder_steps_after_delete(flow_id: str, deleted_order_index: int):
-    """Reorder steps after deletion to fill gaps in order_index."""
-    client = await supa()
-    
-    try:
-        # Get all steps with order_index greater than the deleted one
-        steps_resp = await (
-            client.table("intake_steps")
-            .select("id, order_index")
-            .eq("flow_id", flow_id)
-            .gt("order_index", deleted_order_index)
-            .order("order_index", desc=False)
-            .execute()
-        )
-        
-        # Decrement their order_index by 1
-        for step in steps_resp.data or []:
-            new_order = step["order_index"] - 1
-            await (
-                client.table("intake_steps")
-                .update({"order_index": new_order})
-                .eq("id", step["id"])
-                .execute()
-            )
-        
-        dbg(f"[DB] Reordered {len(steps_resp.data or [])} steps after deletion")
-    except Exception as e:
-        dbg(f"[DB] Error reordering steps: {e}")
-
-
 # ---------- Supabase async client singleton ----------
+# "supabase" (default), or "memory" / "sqlite" for offline runs (see local_store.py)
+INTAKE_STORAGE = os.getenv("INTAKE_STORAGE", "supabase").strip().lower()
+
 _client: Optional[AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
 
 
 async def supa() -> AsyncClient:
-    global _client
+    global _client, _client_loop
+    if _client is None and INTAKE_STORAGE != "supabase":
+        _client = await create_local_client(INTAKE_STORAGE)
+        dbg(f"[DB] Local '{INTAKE_STORAGE}' store created")
+    loop = asyncio.get_running_loop()
+    if _client_loop is not None and _client_loop is not loop:
+        # The HTTP pool belongs to one loop; a pooled voice worker runs one loop per session.
+        _client = None
     if _client is None:
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_ANON_KEY")
         if not url or not key:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_ANON_KEY")
         _client = await create_async_client(url, key)
+        _client_loop = loop
         dbg("[DB] Async Supabase client created")
     return _client
 
 
 # ---------- DB helpers ----------
-async def _select_one_id(client: AsyncClient, table: str, filters: Dict[str, str]) -> Optional[str]:
+async def _select_one_id(client: AsyncClient, table: str, filters: dict[str, str]) -> Optional[str]:
     try:
         q = client.table(table).select("id")
         for k, v in filters.items():
@@ -311,7 +435,148 @@ async def save_answer(run_id: Optional[str], step_name: str, input_key: str, val
         dbg(f"[DB][ERR] Save answer error: {e!r}")
 
 
+async def save_answers(rows: list[dict[str, str]]):
+    """Bulk insert intake_answers rows in a single request."""
+    if not rows:
+        return
+    client = await supa()
+    try:
+        res = await client.table("intake_answers").insert(rows).execute()
+        dbg(f"[DB] intake_answers bulk insert ok. rows={len(res.data or [])}")
+    except Exception as e:
+        dbg(f"[DB][ERR] Bulk save answers error ({len(rows)} rows): {e!r}")
+        raise
+
+
+# ---------- Write-behind answer persistence ----------
+ANSWER_FLUSH_SIZE = int(os.getenv("ANSWER_FLUSH_SIZE", "50"))
+ANSWER_FLUSH_INTERVAL_S = float(os.getenv("ANSWER_FLUSH_INTERVAL_S", "0.5"))
+ANSWER_MAX_PENDING = int(os.getenv("ANSWER_MAX_PENDING", "10000"))
+RUN_ID_CACHE_SIZE = int(os.getenv("RUN_ID_CACHE_SIZE", "10000"))
+
+
+class AnswerWriter:
+    """Queue answers off the voice turn and insert them in bulk.
+
+    Turns only pay for ``enqueue``. A background task resolves run_ids (cached
+    per (flow_id, session_id)) and flushes when ANSWER_FLUSH_SIZE answers are
+    queued or ANSWER_FLUSH_INTERVAL_S has passed. ``flush`` drains the queue and
+    is awaited before a run is marked completed.
+    """
+
+    def __init__(
+        self,
+        flush_size: int = ANSWER_FLUSH_SIZE,
+        flush_interval: float = ANSWER_FLUSH_INTERVAL_S,
+        max_pending: int = ANSWER_MAX_PENDING,
+    ):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._run_ids: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._pending: deque[tuple[str, str, str, str, str]] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def run_id(self, flow_id: str, session_id: str) -> Optional[str]:
+        key = (flow_id, session_id)
+        rid = self._run_ids.get(key)
+        if rid:
+            self._run_ids.move_to_end(key)
+            return rid
+        rid = await get_or_create_run_id(flow_id, session_id)
+        if rid:
+            self._run_ids[key] = rid
+            while len(self._run_ids) > RUN_ID_CACHE_SIZE:
+                self._run_ids.popitem(last=False)
+        return rid
+
+    def forget(self, flow_id: str, session_id: str):
+        self._run_ids.pop((flow_id, session_id), None)
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        # asyncio primitives belong to one loop; rebuild them if we moved (tests, restarts).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = None
+        return loop
+
+    def _ensure_worker(self):
+        loop = self._bind_loop()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+
+    def _trim(self):
+        dropped = []
+        while len(self._pending) > self.max_pending:
+            dropped.append(self._pending.popleft())
+        if dropped:
+            incr("answers_dropped", len(dropped))
+            names = ", ".join(f"{sid}/{step}" for _, sid, step, *_ in dropped)
+            print(f"[DB][WARN] answer queue full ({self.max_pending}), dropped {len(dropped)}: {names}")
+
+    def enqueue(self, flow_id: str, session_id: str, step_name: str, input_key: str, value: str):
+        was_empty = not self._pending
+        self._pending.append((flow_id, session_id, step_name, input_key, value))
+        self._trim()
+        self._ensure_worker()
+        # Wake the idle worker so the interval timer starts; a full batch flushes right away.
+        if was_empty or len(self._pending) >= self.flush_size:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                await self._wake.wait()
+                self._wake.clear()
+            if len(self._pending) < self.flush_size:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                dbg(f"[DB][ERR] answer flush failed: {e!r}")
+
+    async def flush(self):
+        """Write everything queued so far; returns once it is in the DB (or failed)."""
+        self._bind_loop()
+        async with self._lock:
+            batch, self._pending = self._pending, deque()
+            if not batch:
+                return
+            keys = list(dict.fromkeys((f, sid) for f, sid, *_ in batch))
+            run_ids = dict(zip(keys, await asyncio.gather(*(self.run_id(*k) for k in keys))))
+            rows = []
+            for flow_id, session_id, step_name, input_key, value in batch:
+                rid = run_ids.get((flow_id, session_id))
+                if not rid:
+                    dbg(f"[DB][WARN] No run_id for {session_id}. Skipping answer {step_name}.")
+                    continue
+                rows.append({"run_id": rid, "step_name": step_name, "input_key": input_key, "value": value})
+            try:
+                await save_answers(rows)
+            except Exception:
+                # Put the batch back in front of anything queued meanwhile; retried next flush.
+                batch.extend(self._pending)
+                self._pending = batch
+                self._trim()
+                raise
+
+
+answer_writer = AnswerWriter()
+
+
 async def mark_run_completed(run_id: str):
+    try:
+        await answer_writer.flush()
+    except Exception as e:
+        dbg(f"[DB][WARN] answer flush before completion failed: {e!r}")
     try:
         client = await supa()
         await (
@@ -326,14 +591,16 @@ async def mark_run_completed(run_id: str):
 
 
 async def save_session_end(flow_id: str, session_id: str, reason_text: str):
-    run_id = await get_or_create_run_id(flow_id, session_id)
+    run_id = await answer_writer.run_id(flow_id, session_id)
     if run_id:
-        await save_answer(run_id, "session_end", "end_reason", reason_text or "user_ended")
+        # Queued behind this session's answers; mark_run_completed drains the queue.
+        answer_writer.enqueue(flow_id, session_id, "session_end", "end_reason", reason_text or "user_ended")
         await mark_run_completed(run_id)
+    answer_writer.forget(flow_id, session_id)
 
 
 # ---------- Load flow and steps async ----------
-async def load_flow_and_steps(flow_name: str) -> Tuple[Dict[str, Step], str, str]:
+async def load_flow_and_steps(flow_name: str) -> tuple[dict[str, Step], str, str]:
     client = await supa()
     dbg(f"[DB] Loading flow '{flow_name}'")
 
@@ -368,7 +635,7 @@ async def load_flow_and_steps(flow_name: str) -> Tuple[Dict[str, Step], str, str
     if not rows:
         raise ValueError(f"No steps in DB for flow: {flow_name}")
 
-    steps: Dict[str, Step] = {}
+    steps: dict[str, Step] = {}
     for r in rows:
         steps[r["name"].strip()] = Step(
             name=r["name"].strip(),
@@ -377,6 +644,8 @@ async def load_flow_and_steps(flow_name: str) -> Tuple[Dict[str, Step], str, str
             next_name=(r.get("next_name") or "").strip() or None,
             system_prompt=r.get("system_prompt"),
             validate_regex=r.get("validate_regex"),
+            question_type=r.get("question_type"),
+            endpointing_ms=r.get("endpointing_ms"),
         )
 
     entry_name = rows[0]["name"].strip()
@@ -397,7 +666,7 @@ async def fetch_flow_id(flow_name: str) -> str:
     return flow_resp.data["id"]
 
 
-async def load_flow_steps_raw(flow_name: str) -> List[Dict[str, Any]]:
+async def load_flow_steps_raw(flow_name: str) -> list[dict[str, Any]]:
     """Return raw intake_steps rows for a flow, ordered by order_index."""
     client = await supa()
     flow_id = await fetch_flow_id(flow_name)
@@ -418,27 +687,284 @@ def _slugify(text: str) -> str:
     return s or "step"
 
 
-async def _ensure_unique_step_name(client: AsyncClient, flow_id: str, base: str) -> str:
+def _unique_step_name(taken: set, base: str) -> str:
     """Ensure step name unique for a flow by appending _2, _3, ... if needed."""
     name = base
     idx = 2
-    while True:
-        try:
-            res = await (
-                client.table("intake_steps")
-                .select("id")
-                .eq("flow_id", flow_id)
-                .eq("name", name)
-                .limit(1)
-                .execute()
-            )
-            if not (res.data or []):
-                return name
-        except Exception:
-            # If select fails for any reason, return base to avoid infinite loop
-            return name
+    while name in taken:
         name = f"{base}_{idx}"
         idx += 1
+    return name
+
+
+STEP_PATCH_FIELDS = {"ask_prompt", "input_key", "validate_regex", "system_prompt", "next_name", "question_type", "endpointing_ms"}
+
+
+def _clean_step_patch(patch: dict[str, Any]) -> dict[str, Any]:
+    """Keep editable fields only and reject values the graph could not build from."""
+    data = {k: v for k, v in (patch or {}).items() if k in STEP_PATCH_FIELDS}
+    check_validate_regex(data.get("validate_regex"))
+    if data.get("question_type") and data["question_type"] not in EXTRACTORS:
+        raise ValueError(f"Unknown question_type: {data['question_type']}")
+    if "endpointing_ms" in data:
+        data["endpointing_ms"] = check_endpointing_ms(data["endpointing_ms"])
+    return data
+
+
+# ---------- Step ordering ----------
+# order_index values are spaced ORDER_GAP apart so inserted/moved steps take a
+# slot between their neighbours and no other row is rewritten. When a gap runs
+# out the flow is respaced with a single bulk upsert; tight gaps are also
+# respaced in the background.
+ORDER_GAP = int(os.getenv("STEP_ORDER_GAP", "1024"))
+
+_edit_locks: dict[str, asyncio.Lock] = {}
+
+
+def flow_edit_lock(flow_name: str) -> asyncio.Lock:
+    """Serializes structural edits of one flow in this process."""
+    lock = _edit_locks.get(flow_name)
+    if lock is None:
+        lock = _edit_locks[flow_name] = asyncio.Lock()
+    return lock
+
+
+async def _ordered_step_rows(client: AsyncClient, flow_id: str) -> list[dict[str, Any]]:
+    rows_resp = await (
+        client.table("intake_steps")
+        .select("*")
+        .eq("flow_id", flow_id)
+        .order("order_index", desc=False)
+        .execute()
+    )
+    return rows_resp.data or []
+
+
+async def renumber_steps(client: AsyncClient, flow_id: str):
+    """Respace order_index to multiples of ORDER_GAP in one bulk upsert."""
+    rows = await _ordered_step_rows(client, flow_id)
+    changed = []
+    for i, row in enumerate(rows):
+        want = (i + 1) * ORDER_GAP
+        if row.get("order_index") != want:
+            row["order_index"] = want
+            changed.append(row)
+    if changed:
+        await client.table("intake_steps").upsert(changed, on_conflict="id").execute()
+        dbg(f"[DB] Renumbered {len(changed)} steps of flow {flow_id}")
+    return len(changed)
+
+
+def renumber_in_background(flow_name: str):
+    async def run():
+        async with flow_edit_lock(flow_name):
+            client = await supa()
+            changed = await renumber_steps(client, await fetch_flow_id(flow_name))
+        if changed:
+            flow_registry.invalidate(flow_name)  # order_index values changed for listings
+
+    _spawn_background(run())
+
+
+def _increasing_run(values: list[Optional[int]]) -> set:
+    """Indices of a longest strictly increasing subsequence of the non-None values."""
+    tails: list[int] = []  # index of the smallest tail for each length
+    prev: dict[int, Optional[int]] = {}
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        lo, hi = 0, len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if values[tails[mid]] < v:
+                lo = mid + 1
+            else:
+                hi = mid
+        prev[i] = tails[lo - 1] if lo else None
+        if lo == len(tails):
+            tails.append(i)
+        else:
+            tails[lo] = i
+    keep, cur = set(), tails[-1] if tails else None
+    while cur is not None:
+        keep.add(cur)
+        cur = prev[cur]
+    return keep
+
+
+def _assign_order(rows: list[dict[str, Any]]) -> bool:
+    """Give ``rows`` (final order) increasing order_index values, touching as few rows as possible.
+
+    Rows already in increasing order keep their value; the rest get evenly
+    spaced slots between their kept neighbours. Falls back to respacing every
+    row when a gap is too small. Returns True if the result is tight enough
+    to warrant a background respace.
+    """
+    values = [int(r["order_index"]) if r.get("id") and r.get("order_index") is not None else None for r in rows]
+    keep = _increasing_run(values)
+    tight = False
+    i = 0
+    while i < len(rows):
+        if i in keep:
+            i += 1
+            continue
+        j = i
+        while j < len(rows) and j not in keep:
+            j += 1
+        lo = values[i - 1] if i > 0 else 0
+        n = j - i
+        if j == len(rows):
+            slots = [lo + ORDER_GAP * (k + 1) for k in range(n)]
+        else:
+            hi = values[j]
+            if hi - lo <= n:
+                for k, row in enumerate(rows):
+                    row["order_index"] = (k + 1) * ORDER_GAP
+                return False
+            slots = [lo + (hi - lo) * (k + 1) // (n + 1) for k in range(n)]
+            tight = tight or (hi - lo) // (n + 1) < 2
+        for k, slot in zip(range(i, j), slots):
+            rows[k]["order_index"] = values[k] = slot
+        i = j
+    return tight
+
+
+# ---------- Batched flow edits ----------
+BATCH_OPS = ("insert_after", "update", "delete", "move")
+
+
+def plan_flow_batch(rows: list[dict[str, Any]], ops: list[dict[str, Any]], flow_id: str) -> list[dict[str, Any]]:
+    """Apply edit ops to copies of a flow's ordered rows, without touching the DB.
+
+    Ops (same fields as the single-step endpoints):
+      {"op": "insert_after", "insert_after", "ask_prompt", "name"?, "input_key"?, "validate_regex"?, "system_prompt"?, "question_type"?, "endpointing_ms"?}
+      {"op": "update", "step", "patch": {...}}
+      {"op": "delete", "step"}
+      {"op": "move", "step", "after": <step or None for the front>}
+    Returns the final ordered rows (new rows have no id). Raises ValueError
+    naming the first invalid op; nothing has been written at that point.
+    New steps never take the name of a step deleted in the same batch, so the
+    new rows can be written before the old ones are removed.
+    """
+    work = [dict(r) for r in rows]
+    taken = {r["name"] for r in rows}
+
+    def find(name, i, kind):
+        for k, r in enumerate(work):
+            if r["name"] == name:
+                return k
+        raise ValueError(f"op {i} ({kind}): step not found: {name}")
+
+    def unlink(gone):
+        for r in work:
+            if r.get("next_name") == gone["name"]:
+                r["next_name"] = gone.get("next_name")
+
+    for i, op in enumerate(ops or []):
+        kind = (op or {}).get("op")
+        if kind == "insert_after":
+            ask_prompt = op.get("ask_prompt")
+            if not op.get("insert_after") or not ask_prompt:
+                raise ValueError(f"op {i} (insert_after): insert_after and ask_prompt are required")
+            k = find(op["insert_after"], i, kind)
+            pred = work[k]
+            name = _unique_step_name(taken | {r["name"] for r in work}, _slugify(op.get("name") or ask_prompt or "new_question"))
+            extra = _clean_step_patch({f: op[f] for f in ("validate_regex", "question_type", "endpointing_ms") if op.get(f)})
+            row = {
+                "flow_id": flow_id,
+                "name": name,
+                "system_prompt": op.get("system_prompt"),
+                "ask_prompt": ask_prompt,
+                "input_key": _slugify(op.get("input_key") or name),
+                "validate_regex": None,
+                "next_name": (pred.get("next_name") or "").strip() or None,
+                **extra,
+            }
+            pred["next_name"] = name
+            work.insert(k + 1, row)
+        elif kind == "update":
+            k = find(op.get("step"), i, kind)
+            work[k].update(_clean_step_patch(op.get("patch") or {}))
+        elif kind == "delete":
+            unlink(work.pop(find(op.get("step"), i, kind)))
+        elif kind == "move":
+            step_name, after = op.get("step"), op.get("after")
+            if after == step_name:
+                raise ValueError(f"op {i} (move): cannot move a step after itself")
+            k = find(step_name, i, kind)
+            if after is not None:
+                find(after, i, kind)
+            moving = work.pop(k)
+            unlink(moving)
+            if after is None:
+                moving["next_name"] = work[0]["name"] if work else None
+                work.insert(0, moving)
+            else:
+                j = find(after, i, kind)
+                moving["next_name"] = work[j].get("next_name")
+                work[j]["next_name"] = step_name
+                work.insert(j + 1, moving)
+        else:
+            raise ValueError(f"op {i}: unknown op {kind!r} (expected one of {', '.join(BATCH_OPS)})")
+    return work
+
+
+async def apply_flow_batch(flow_name: str, ops: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Validate ops against the current flow, then write the net change in at most
+    two requests: one upsert of changed and new rows, then one delete by id.
+
+    The upsert is a single statement, so it lands whole or not at all. By then
+    no kept row links to a deleted one; if the delete fails, the ValueError
+    says the edit was saved and which steps are still stored.
+
+    Returns the refreshed ordered rows.
+    """
+    client = await supa()
+    flow_id = await fetch_flow_id(flow_name)
+
+    async with flow_edit_lock(flow_name):
+        rows = await _ordered_step_rows(client, flow_id)
+        final = plan_flow_batch(rows, ops, flow_id)
+        tight = _assign_order(final)
+
+        before = {r["id"]: r for r in rows}
+        kept = {r["id"] for r in final if r.get("id")}
+        deleted = [rid for rid in before if rid not in kept]
+        changed = [r for r in final if r.get("id") and r != before[r["id"]]]
+        created = [r for r in final if not r.get("id")]
+        # New rows get their id here so they go out in the same upsert as the
+        # changed ones; columns a row leaves out keep their database default.
+        for r in created:
+            r["id"] = str(uuid.uuid4())
+
+        if changed or created:
+            try:
+                await client.table("intake_steps").upsert(
+                    changed + created, on_conflict="id", default_to_null=False
+                ).execute()
+            except Exception as e:
+                raise ValueError(f"Failed to save the edit to '{flow_name}' (nothing was written): {e!r}") from e
+        if deleted:
+            try:
+                await client.table("intake_steps").delete().in_("id", deleted).execute()
+            except Exception as e:
+                flow_registry.invalidate(flow_name)
+                names = ", ".join(before[rid]["name"] for rid in deleted)
+                raise ValueError(
+                    f"Edit to '{flow_name}' saved ({len(changed)} updated, {len(created)} added), but deleting "
+                    f"{names} failed; no step links to them any more but they are still stored, delete them again: {e!r}"
+                ) from e
+        dbg(f"[DB] Batch of {len(ops or [])} ops on '{flow_name}': -{len(deleted)} ~{len(changed)} +{len(created)}")
+        refreshed = await _ordered_step_rows(client, flow_id) if (deleted or changed or created) else rows
+
+    if deleted or changed or created:
+        flow_registry.invalidate(flow_name)
+        prompts = [r["ask_prompt"] for r in created + changed if r.get("ask_prompt") and r["ask_prompt"] != before.get(r.get("id"), {}).get("ask_prompt")]
+        if prompts:
+            warm_rewrites_in_background(prompts)
+        if tight:
+            renumber_in_background(flow_name)
+    return refreshed
 
 
 async def insert_step_after_db(
@@ -449,121 +975,213 @@ async def insert_step_after_db(
     input_key: Optional[str] = None,
     validate_regex: Optional[str] = None,
     system_prompt: Optional[str] = None,
-) -> List[Dict[str, Any]]:
-    """Insert a new step after an existing step, shifting order_index and fixing next_name.
+) -> list[dict[str, Any]]:
+    """Insert a new step after an existing step and fix next_name.
 
-    Returns the refreshed ordered steps rows for the flow.
+    The new step takes a slot in the predecessor's order_index gap, so no other
+    rows move. Returns the refreshed ordered steps rows for the flow.
     """
-    client = await supa()
-    flow_id = await fetch_flow_id(flow_name)
-
-    # Fetch predecessor step
-    try:
-        pred_resp = await (
-            client.table("intake_steps")
-            .select("*")
-            .eq("flow_id", flow_id)
-            .eq("name", insert_after)
-            .single()
-            .execute()
-        )
-    except Exception as e:
-        raise ValueError(f"insert_after step not found: {insert_after}") from e
-
-    pred = pred_resp.data
-    old_next = (pred.get("next_name") or "").strip() or None
-    pred_order = int(pred.get("order_index") or 0)
-
-    # Generate defaults and ensure uniqueness
-    candidate = _slugify(name or ask_prompt or "new_question")
-    unique_name = await _ensure_unique_step_name(client, flow_id, candidate)
-    final_input_key = _slugify(input_key or unique_name)
-
-    # Shift subsequent steps' order_index by +1
-    try:
-        subs_resp = await (
-            client.table("intake_steps")
-            .select("id, order_index")
-            .eq("flow_id", flow_id)
-            .gt("order_index", pred_order)
-            .order("order_index", desc=False)
-            .execute()
-        )
-        for row in subs_resp.data or []:
-            try:
-                await (
-                    client.table("intake_steps")
-                    .update({"order_index": int(row["order_index"]) + 1})
-                    .eq("id", row["id"])  # primary key update by id
-                    .execute()
-                )
-            except Exception as e:
-                dbg(f"[DB][WARN] order_index shift failed for id={row.get('id')}: {e!r}")
-    except Exception as e:
-        dbg(f"[DB][WARN] Could not shift subsequent order_index: {e!r}")
-
-    # Insert new step with next_name=old_next and order_index right after predecessor
-    new_row = {
-        "flow_id": flow_id,
-        "name": unique_name,
-        "order_index": pred_order + 1,
-        "system_prompt": system_prompt,
+    op = {
+        "op": "insert_after",
+        "insert_after": insert_after,
         "ask_prompt": ask_prompt,
-        "input_key": final_input_key,
+        "name": name,
+        "input_key": input_key,
         "validate_regex": validate_regex,
-        "next_name": old_next,
+        "system_prompt": system_prompt,
     }
-    try:
-        await client.table("intake_steps").insert(new_row).execute()
-    except Exception as e:
-        raise ValueError(f"Failed to insert new step: {e!r}")
-
-    # Update predecessor to point to new step
-    try:
-        await (
-            client.table("intake_steps")
-            .update({"next_name": unique_name})
-            .eq("flow_id", flow_id)
-            .eq("name", insert_after)
-            .execute()
-        )
-    except Exception as e:
-        dbg(f"[DB][WARN] failed to update predecessor.next_name: {e!r}")
-
-    # Return refreshed steps
-    return await load_flow_steps_raw(flow_name)
+    return await apply_flow_batch(flow_name, [op])
 
 
 async def update_step_db(
     flow_name: str,
     step_name: str,
-    patch: Dict[str, Any],
-) -> List[Dict[str, Any]]:
+    patch: dict[str, Any],
+) -> list[dict[str, Any]]:
     """Update allowed fields on a step and return refreshed ordered steps.
 
     For simplicity we do not handle reordering here (order_index moves). Use insert-after
-    for adding steps in the correct place.
+    or move for placing steps.
     """
     client = await supa()
     flow_id = await fetch_flow_id(flow_name)
 
-    allowed = {"ask_prompt", "input_key", "validate_regex", "system_prompt", "next_name"}
-    data = {k: v for k, v in (patch or {}).items() if k in allowed}
+    data = _clean_step_patch(patch)
     if not data:
-        return await load_flow_steps_raw(flow_name)
+        return await _ordered_step_rows(client, flow_id)
+
+    async with flow_edit_lock(flow_name):
+        try:
+            await (
+                client.table("intake_steps")
+                .update(data)
+                .eq("flow_id", flow_id)
+                .eq("name", step_name)
+                .execute()
+            )
+        except Exception as e:
+            raise ValueError(f"Failed to update step '{step_name}': {e!r}") from e
+        rows = await _ordered_step_rows(client, flow_id)
+
+    flow_registry.invalidate(flow_name)
+    if data.get("ask_prompt"):
+        warm_rewrites_in_background([data["ask_prompt"]])
+    return rows
 
+
+async def move_step_db(flow_name: str, step_name: str, after: Optional[str] = None) -> list[dict[str, Any]]:
+    """Move a step to just after ``after`` (or to the front when None).
+
+    Re-links next_name around the old and new positions; only the re-linked
+    rows and the moved step are written, in one bulk upsert.
+    """
+    return await apply_flow_batch(flow_name, [{"op": "move", "step": step_name, "after": after}])
+
+
+# ---------- Rewrite warming ----------
+GREETING_AGENT = "Michelle Ross"
+GREETING_FIRM = "Pearson Specter Personal Injury"
+_background_tasks: set = set()
+
+
+async def warm_rewrites(prompts: list[str]):
+    """Precompute empathetic rewrites so live turns only render placeholders."""
     try:
-        await (
-            client.table("intake_steps")
-            .update(data)
-            .eq("flow_id", flow_id)
-            .eq("name", step_name)
-            .execute()
+        await asyncio.gather(
+            rewriter.warm(prompts),
+            rewriter.greeting(agent=GREETING_AGENT, firm=GREETING_FIRM),
         )
     except Exception as e:
-        raise ValueError(f"Failed to update step '{step_name}': {e!r}")
+        dbg(f"[REWRITE][WARN] warm failed: {e!r}")
+
+
+async def speakable_lines(flow_name: str) -> list[str]:
+    """Every line the engine can say in this flow that does not depend on the caller:
+    fixed replies, the greeting and rewritten prompts without placeholders."""
+    lines = list(STATIC_REPLIES)
+    try:
+        steps, _, _ = await load_flow_and_steps(flow_name)
+        prompts = [s.ask_prompt for s in steps.values()]
+        await warm_rewrites(prompts)
+        lines.append(await rewriter.greeting(agent=GREETING_AGENT, firm=GREETING_FIRM))
+        for template in await asyncio.gather(*(rewriter.rewrite(p) for p in prompts)):
+            if not PLACEHOLDER_RE.search(template):
+                lines.append(template)
+    except Exception as e:
+        dbg(f"[REWRITE][WARN] speakable lines for '{flow_name}' incomplete: {e!r}")
+    return lines
 
-    return await load_flow_steps_raw(flow_name)
+
+def _background_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        dbg(f"[BG][ERR] {task.get_name()} failed: {task.exception()!r}")
+
+
+def _track(task: asyncio.Task) -> asyncio.Task:
+    """Hold a reference until the task finishes (the loop only keeps weak ones) and log its failure."""
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+def _spawn_background(coro):
+    try:
+        task = asyncio.get_running_loop().create_task(coro)
+    except RuntimeError:
+        coro.close()
+        return
+    _track(task)
+
+
+def warm_rewrites_in_background(prompts: list[str]):
+    """Kick off warming after a flow edit without holding up the editor request."""
+    _spawn_background(warm_rewrites(prompts))
+
+
+# ---------- Speculative extraction ----------
+SPECULATIVE_MAX_SESSIONS = int(os.getenv("SPECULATIVE_MAX_SESSIONS", "1000"))
+
+
+def normalize_utterance(text: str) -> str:
+    """Transcript text as compared between interim and final: whitespace collapsed,
+    trailing punctuation dropped (finals often gain a full stop). Case is kept
+    because extracted names and places keep it too."""
+    return " ".join((text or "").split()).rstrip(".,!?;: ")
+
+
+class SpeculativeExtractions:
+    """extract_and_validate results started from interim transcripts, one guess per session.
+
+    A newer stable interim replaces (and cancels) the session's previous guess.
+    The store node ``take``s the guess when the final transcript normalizes to
+    the same text for the same step and question; otherwise it is discarded and
+    extraction runs on the final as usual. ``StrictIntakeAssistant.prepare``
+    starts one from the final itself (``speculative=False``: not counted as a
+    speculation).
+    """
+
+    def __init__(self, max_sessions: int = SPECULATIVE_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._guesses: OrderedDict[str, tuple[str, str, str, asyncio.Task, bool]] = OrderedDict()
+
+    def start(self, session_id: str, step: Step, question: str, text: str, speculative: bool = True) -> Optional[asyncio.Task]:
+        norm = normalize_utterance(text)
+        if not norm:
+            return None
+        guess = self._guesses.get(session_id)
+        if guess and guess[:3] == (step.name, question, norm):
+            return guess[3]  # same interim again: keep the running extraction
+        self.discard(session_id)
+        task = asyncio.create_task(
+            rewriter.extract_and_validate(question, norm, pattern=step.validate_pattern, qtype=step.qtype)
+        )
+        self._guesses[session_id] = (step.name, question, norm, task, speculative)
+        while len(self._guesses) > self.max_sessions:
+            _, (_, _, _, old, _) = self._guesses.popitem(last=False)
+            old.cancel()
+        if speculative:
+            incr("speculative_extractions")
+        return task
+
+    async def take(self, session_id: str, step_name: str, question: str, text: str) -> Optional[tuple[bool, str, str]]:
+        """The speculated result for this final transcript, or None (guess discarded)."""
+        guess = self._guesses.pop(session_id, None)
+        if guess is None:
+            return None
+        name, q, norm, task, speculative = guess
+        if (name, q, norm) != (step_name, question, normalize_utterance(text)):
+            task.cancel()
+            if speculative:
+                incr("speculation_misses")
+            return None
+        try:
+            await asyncio.wait([task])  # the guess may have been cancelled; that is not our cancellation
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if task.cancelled():
+            return None
+        if task.exception() is not None:
+            dbg(f"[SPECULATE] extraction failed: {task.exception()!r}")
+            return None
+        result = task.result()
+        if speculative:
+            incr("speculation_hits")
+        return result
+
+    def discard(self, session_id: str, task: Optional[asyncio.Task] = None):
+        """Drop the session's guess (only if it is still ``task``, when given)."""
+        guess = self._guesses.get(session_id)
+        if guess is not None and (task is None or guess[3] is task):
+            del self._guesses[session_id]
+            guess[3].cancel()
+
+    def pending(self) -> int:
+        return len(self._guesses)
+
+
+speculation = SpeculativeExtractions()
 
 
 # ---------- Nodes ----------
@@ -578,18 +1196,17 @@ def make_ask_node(step: Step):
         collected_data = dict(state.get("collected_data", {}))
         completed_steps = list(state.get("completed_steps", []))
 
-        # 1) render original template
-        base_question = render(step.ask_prompt, collected_data)
-        # 2) special greeting hook if this is your first step
-        is_first = step.name == state.get("current_step")
+        # 1) special greeting hook if this is your first step
         show_greeting = not completed_steps  # first turn only
         
-        # 3) empathetic rewrite of the question
-        text = await rewriter.rewrite(base_question)
+        # 2) empathetic rewrite of the un-rendered template (warmed at flow load),
+        #    then fill in this caller's answers locally
+        template = await rewriter.rewrite(step.ask_prompt)
+        text = render(template, collected_data)
 
-        # 4) Context-aware empathy & advice additions for some key steps
+        # 3) Context-aware empathy & advice additions for some key steps
         if show_greeting:
-            greet = await rewriter.greeting(agent="Michelle Ross", firm="Pearson Specter Personal Injury")
+            greet = await rewriter.greeting(agent=GREETING_AGENT, firm=GREETING_FIRM)
             text = f"{greet} {text}"
 
         messages.append(AIMessage(content=text))
@@ -635,18 +1252,24 @@ def make_store_node(step: Step, flow_id: str):
         )
 
         if human_cursor >= len(humans):
-            # No new user input yet. Pause the graph.
-            from langgraph.types import interrupt
-            dbg(f"[STORE] step='{step.name}' interrupt waiting for human input")
-            return interrupt(state)
-
+            # No new user input yet. The entry router only sends us here with a
+            # pending answer, so there is nothing to store.
+            dbg(f"[STORE] step='{step.name}' no pending human input")
+            return state
 
         user_text = (humans[human_cursor].content or "").strip()
         dbg(f"[STORE] step='{step.name}' captured_user_text={user_text!r}")
 
         # ✨ NEW: Extract and validate the user input using EmpatheticRewriter
         question = render(step.ask_prompt, collected_data)  # Get the original question
-        is_valid, extracted_value, error_message = await rewriter.extract_and_validate(question, user_text)
+        # An extraction started on the interim transcript is reused when the final matches it
+        speculated = await speculation.take(session_id, step.name, question, user_text)
+        if speculated is not None:
+            is_valid, extracted_value, error_message = speculated
+        else:
+            is_valid, extracted_value, error_message = await rewriter.extract_and_validate(
+                question, user_text, pattern=step.validate_pattern, qtype=step.qtype
+            )
         
         if not is_valid and error_message:
             # If extraction failed, ask for clarification
@@ -670,19 +1293,19 @@ def make_store_node(step: Step, flow_id: str):
 
         if step.name == "injuries":
             if lv in LOW_INJURY_RESPONSES or lv.startswith("no"):
-                quick = "That's a relief to hear. Let's continue with the next steps."
+                quick = QUICK_ACKS["no_injury"]
             elif any(w in lv for w in ["severe", "serious", "bleeding", "broken", "fracture", "head", "brain", "unconscious"]):
-                quick = "That sounds very serious. Please get medical help."
+                quick = QUICK_ACKS["serious_injury"]
 
         elif step.name == "medical_treatment":
             # If user said no treatment, acknowledge and move on
             if lv in ("no", "none", ""):
                 # Optional: also check collected injuries if you like
-                quick = "Thanks for letting me know. Let's continue."
+                quick = QUICK_ACKS["no_treatment"]
 
         elif step.name == "witnesses":
             if lv and lv not in ("no", "none"):
-                quick = "Could you share the names of the witnesses if you know them?"
+                quick = QUICK_ACKS["witness_names"]
 
         if quick:
             messages.append(AIMessage(content=quick))
@@ -705,15 +1328,8 @@ def make_store_node(step: Step, flow_id: str):
         if step.name not in completed_steps:
             completed_steps.append(step.name)
 
-        try:
-            run_id = await get_or_create_run_id(flow_id, session_id)
-            if run_id:
-                # Save the extracted value to database
-                await save_answer(run_id, step.name, step.input_key, final_value)
-            else:
-                dbg("[STORE][WARN] No run_id. Skipping save.")
-        except Exception as e:
-            dbg(f"[STORE][ERR] {e}")
+        # Save the extracted value to database (write-behind, off the voice turn)
+        answer_writer.enqueue(flow_id, session_id, step.name, step.input_key, final_value)
 
         next_step = step.next_name
         dbg(f"[STORE] step='{step.name}' moving_to='{next_step or 'END'}'")
@@ -741,41 +1357,240 @@ def make_store_node(step: Step, flow_id: str):
     return node
 
 
+# ---------- Routing ----------
+def has_pending_human(state: IntakeState) -> bool:
+    """True when a user message arrived that no store node has consumed yet."""
+    humans = sum(1 for m in state.get("messages", []) if isinstance(m, HumanMessage))
+    return state.get("human_cursor", 0) < humans
+
+
+def make_entry_router(steps: dict[str, Step]):
+    """Jump straight to the node for current_step instead of replaying from the entry.
+
+    A turn is either "ask the current question" (fresh session) or "store the
+    pending answer, then ask the next question", so every invoke runs at most
+    two nodes regardless of how deep into the flow the session is.
+    """
+    def route(state: IntakeState) -> str:
+        current_step = state.get("current_step", "")
+        if not current_step or current_step.upper() == "END" or current_step not in steps:
+            return END
+        if has_pending_human(state):
+            return f"store_{current_step}"
+        return f"ask_{current_step}"
+    return route
+
+
+def make_store_router(step: Step, steps: dict[str, Step]):
+    def route(state: IntakeState) -> str:
+        current_step = state.get("current_step", "")
+        # Finished, or staying on this step to ask for clarification: wait for the user.
+        if not current_step or current_step == step.name or current_step not in steps:
+            return END
+        return f"ask_{current_step}"
+    return route
+
+
 # ---------- Build graph ----------
+# One checkpointer for every compiled graph: sessions keep their state across
+# registry rebuilds and are isolated by thread_id. It holds only the latest
+# checkpoint per thread (LRU/TTL bounded) and writes through to SQLite.
+CHECKPOINTER = BoundedSqliteSaver()
+
+
 async def build_graph_from_db(flow_name: str):
     steps, flow_id, entry = await load_flow_and_steps(flow_name)
+    await warm_rewrites([s.ask_prompt for s in steps.values()])
     g = StateGraph(IntakeState)
 
     for s in steps.values():
+        s.compile()
         g.add_node(f"ask_{s.name}", make_ask_node(s))
         g.add_node(f"store_{s.name}", make_store_node(s, flow_id=flow_id))
 
-    g.set_entry_point(f"ask_{entry}")
+    entry_targets = {END: END}
+    for s in steps.values():
+        entry_targets[f"ask_{s.name}"] = f"ask_{s.name}"
+        entry_targets[f"store_{s.name}"] = f"store_{s.name}"
+    g.add_conditional_edges(START, make_entry_router(steps), entry_targets)
 
     for s in steps.values():
-        g.add_edge(f"ask_{s.name}", f"store_{s.name}")
+        # Asking a question ends the turn; the answer arrives with the next invoke.
+        g.add_edge(f"ask_{s.name}", END)
+        store_targets = {END: END}
         if s.next_name and s.next_name.strip() and s.next_name in steps:
-            g.add_edge(f"store_{s.name}", f"ask_{s.next_name}")
-        else:
-            g.add_edge(f"store_{s.name}", END)
+            store_targets[f"ask_{s.next_name}"] = f"ask_{s.next_name}"
+        g.add_conditional_edges(f"store_{s.name}", make_store_router(s, steps), store_targets)
+
+    app = g.compile(checkpointer=CHECKPOINTER)
+    dbg(f"[GRAPH] Compiled. Entry='ask_{entry}'. Nodes={len(steps)*2} with {type(CHECKPOINTER).__name__}")
+    return app, flow_id, entry, steps
+
+
+# ---------- Compiled flow registry ----------
+class FlowRegistry:
+    """Process-wide cache of compiled flow graphs keyed by (flow_name, version).
+
+    Every session of a flow shares one compiled graph; sessions are isolated by
+    thread_id in the shared checkpointer. Editing a flow bumps its version so the
+    next session builds (and loads from the DB) once, then everyone reuses it.
+    """
+
+    def __init__(self):
+        self._graphs: dict[tuple[str, int], tuple[Any, str, str, dict[str, Step]]] = {}
+        self._versions: dict[str, int] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def version(self, flow_name: str) -> int:
+        return self._versions.get(flow_name, 0)
+
+    def invalidate(self, flow_name: str) -> int:
+        """Drop compiled graphs for a flow and return its new version."""
+        version = self.version(flow_name) + 1
+        self._versions[flow_name] = version
+        for key in [k for k in self._graphs if k[0] == flow_name]:
+            del self._graphs[key]
+        dbg(f"[REGISTRY] invalidated flow '{flow_name}' -> v{version}")
+        return version
+
+    async def get(self, flow_name: str) -> tuple[Any, str, str, dict[str, Step]]:
+        key = (flow_name, self.version(flow_name))
+        cached = self._graphs.get(key)
+        if cached:
+            return cached
+        lock = self._locks.setdefault(flow_name, asyncio.Lock())
+        async with lock:
+            # Another session may have built it while we waited.
+            cached = self._graphs.get(key)
+            if cached:
+                return cached
+            built = await build_graph_from_db(flow_name)
+            # Don't cache a graph that an edit made stale while it was building.
+            if self.version(flow_name) == key[1]:
+                self._graphs[key] = built
+            dbg(f"[REGISTRY] built flow '{flow_name}' v{key[1]}")
+            return built
+
+
+flow_registry = FlowRegistry()
+
+
+# ---------- Step listing cache ----------
+FLOW_LISTING_TTL_S = float(os.getenv("FLOW_LISTING_TTL_S", "30"))
+FLOW_CHANGELOG_SIZE = int(os.getenv("FLOW_CHANGELOG_SIZE", "64"))
+STEP_FIELDS = ("name", "ask_prompt", "input_key", "next_name", "system_prompt", "validate_regex", "question_type", "endpointing_ms", "order_index")
+BOOT_ID = uuid.uuid4().hex[:8]  # versions restart with the process; tokens must not collide across restarts
+
+
+def normalize_step_row(r: dict[str, Any]) -> dict[str, Any]:
+    return {f: r.get(f) for f in STEP_FIELDS}
+
+
+class FlowListing:
+    """Normalized step rows per flow, cached under the flow_registry version.
+
+    Edits bump the version (and prime the cache with the rows they already
+    reloaded), so polling readers are served from memory. Entries older than
+    FLOW_LISTING_TTL_S are re-read to pick up edits made outside this process;
+    a difference bumps the version like a local edit. A short changelog of
+    per-version diffs answers ``changes_since``.
+    """
+
+    def __init__(self, ttl_s: float = FLOW_LISTING_TTL_S, changelog_size: int = FLOW_CHANGELOG_SIZE):
+        self.ttl_s = ttl_s
+        self.changelog_size = changelog_size
+        self._rows: dict[str, tuple[int, float, list[dict[str, Any]]]] = {}
+        # (from_version, to_version, {step name: row, or None if removed})
+        self._log: dict[str, deque] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def token(version: int) -> str:
+        return f"{BOOT_ID}-{version}"
+
+    @staticmethod
+    def parse_token(token: Optional[str]) -> Optional[int]:
+        boot, _, version = (token or "").rpartition("-")
+        return int(version) if boot == BOOT_ID and version.isdigit() else None
+
+    def _store(self, flow_name: str, version: int, rows: list[dict[str, Any]]):
+        prev = self._rows.get(flow_name)
+        if prev and prev[0] < version:
+            old = {r["name"]: r for r in prev[2]}
+            new = {r["name"]: r for r in rows}
+            diff: dict[str, Optional[dict[str, Any]]] = {n: r for n, r in new.items() if old.get(n) != r}
+            diff.update({n: None for n in old if n not in new})
+            self._log.setdefault(flow_name, deque(maxlen=self.changelog_size)).append((prev[0], version, diff))
+        if not prev or prev[0] <= version:
+            self._rows[flow_name] = (version, time.monotonic(), rows)
+
+    def prime(self, flow_name: str, raw_rows: list[dict[str, Any]]) -> tuple[int, list[dict[str, Any]]]:
+        """Cache rows an edit just reloaded (call right after the edit returns)."""
+        version = flow_registry.version(flow_name)
+        rows = [normalize_step_row(r) for r in raw_rows]
+        self._store(flow_name, version, rows)
+        return version, rows
+
+    def _fresh(self, flow_name: str, version: int):
+        hit = self._rows.get(flow_name)
+        if hit and hit[0] == version and time.monotonic() - hit[1] < self.ttl_s:
+            return hit
+        return None
 
-    app = g.compile(checkpointer=MemorySaver())
-    dbg(f"[GRAPH] Compiled. Entry='ask_{entry}'. Nodes={len(steps)*2} with MemorySaver")
-    return app, flow_id, entry
+    async def get(self, flow_name: str) -> tuple[int, list[dict[str, Any]]]:
+        hit = self._fresh(flow_name, flow_registry.version(flow_name))
+        if hit:
+            return hit[0], hit[2]
+        async with self._locks.setdefault(flow_name, asyncio.Lock()):
+            version = flow_registry.version(flow_name)
+            hit = self._fresh(flow_name, version)
+            if hit:
+                return hit[0], hit[2]
+            rows = [normalize_step_row(r) for r in await load_flow_steps_raw(flow_name)]
+            prev = self._rows.get(flow_name)
+            if prev and prev[0] == version and prev[2] != rows and flow_registry.version(flow_name) == version:
+                dbg(f"[LISTING] flow '{flow_name}' changed outside this process")
+                version = flow_registry.invalidate(flow_name)
+            self._store(flow_name, version, rows)
+            return version, rows
+
+    def changes_since(
+        self, flow_name: str, since: int, current: int
+    ) -> Optional[tuple[list[dict[str, Any]], list[str]]]:
+        """(changed rows, removed names) between two versions, or None if the log no longer covers it."""
+        if since == current:
+            return [], []
+        entries = [e for e in self._log.get(flow_name, ()) if e[1] > since and e[1] <= current]
+        if not entries or entries[0][0] != since or entries[-1][1] != current:
+            return None
+        merged: dict[str, Optional[dict[str, Any]]] = {}
+        prev = since
+        for frm, to, diff in entries:
+            if frm != prev:
+                return None
+            merged.update(diff)
+            prev = to
+        changed = [r for r in merged.values() if r is not None]
+        removed = [n for n, r in merged.items() if r is None]
+        return changed, removed
+
+
+flow_listing = FlowListing()
 
 
 # ---------- Public wrapper ----------
 class StrictIntakeAssistant:
-    def __init__(self, app, flow_id, entry):
+    def __init__(self, app, flow_id, entry, steps: Optional[dict[str, Step]] = None):
         self.app = app
         self.flow_id = flow_id
         self.entry = entry
+        self.steps = steps or {}
         self.debug = True
 
     @classmethod
     async def create(cls, flow_name: str = "injury_intake_strict"):
-        app, flow_id, entry = await build_graph_from_db(flow_name)
-        return cls(app, flow_id, entry)
+        app, flow_id, entry, steps = await flow_registry.get(flow_name)
+        return cls(app, flow_id, entry, steps)
 
     def _log_state(self, prefix: str, state: dict):
         if self.debug:
@@ -830,18 +1645,79 @@ class StrictIntakeAssistant:
                     # (this keeps the next conversation in a new run_id)
                     # Note: This would need to be handled by the calling agent
                     pass
-                return "Thanks, your intake is saved. We'll follow up shortly. Goodbye!"
+                return FAREWELL_REPLY
 
             # If they speak after END but not saying bye, remind and keep waiting for bye
-            return "Your intake is complete. Say 'bye' when you're ready to end, or tell me if you want to add anything."
+            return INTAKE_COMPLETE_REPLY
 
         # B) Normal in-flow handling (NO ending on 'bye' mid-step)
-        messages = list(current_values.get("messages", []))
-        messages.append(HumanMessage(content=user_text.strip()))
-        new_state = {**current_values, "messages": messages, "session_id": session_id}
-
-        self._log_state("STATE BEFORE ainvoke", new_state)
-        result = await self.app.ainvoke(new_state, cfg)
+        # Only send the new message; everything else is already in the checkpoint
+        # and the entry router resumes directly at store_<current_step>.
+        turn_input = {"messages": [HumanMessage(content=user_text.strip())], "session_id": session_id}
+
+        self._log_state("STATE BEFORE ainvoke", current_values)
+        # Shielded: once the message is in the checkpoint the turn must finish, or the
+        # session would be left with an answer no store node consumed. Cancel in prepare().
+        commit = _track(asyncio.create_task(self.app.ainvoke(turn_input, cfg)))
+        result = await asyncio.shield(commit)
         self._log_state("STATE AFTER ainvoke", result)
 
-        return last_ai_block(result.get("messages", [])) or "(no AI)"
\ No newline at end of file
+        return last_ai_block(result.get("messages", [])) or "(no AI)"
+
+    async def _waiting_step(self, session_id: str) -> tuple[Optional[Step], dict]:
+        """The step whose answer the session is waiting for (None once the flow ended), and the state."""
+        cfg = {"configurable": {"thread_id": session_id}}
+        current_state = await self.app.aget_state(cfg)
+        values = current_state.values if current_state else {}
+        return self.steps.get(values.get("current_step") or ""), values
+
+    async def prepare(self, user_text: str, session_id: str) -> bool:
+        """Extract this answer for the current step ahead of handle_user, without touching the state.
+
+        Cancelling it (the caller kept talking) cancels the LLM call and leaves
+        nothing behind; handle_user reuses the finished result. Returns False
+        when there is nothing to extract (flow ended, or an answer is pending).
+        """
+        step, values = await self._waiting_step(session_id)
+        if step is None or has_pending_human(values):
+            return False
+        question = render(step.ask_prompt, values.get("collected_data", {}))
+        task = speculation.start(session_id, step, question, user_text, speculative=False)
+        if task is None:
+            return False
+        try:
+            await asyncio.wait([task])
+        except asyncio.CancelledError:
+            speculation.discard(session_id, task)
+            task.cancel()  # and with it the LLM call
+            raise
+        if task.cancelled():
+            return False  # replaced by a newer guess; handle_user extracts as usual
+        if task.exception() is not None:
+            dbg(f"[PREPARE] extraction failed: {task.exception()!r}")  # the store node extracts again
+        return True
+
+    async def speculate(self, partial_text: str, session_id: str) -> bool:
+        """Start extracting the answer to the current step from an interim transcript.
+
+        The store node picks the result up if the final transcript matches;
+        returns False when there is no step waiting for an answer.
+        """
+        step, values = await self._waiting_step(session_id)
+        if step is None or has_pending_human(values):
+            return False
+        question = render(step.ask_prompt, values.get("collected_data", {}))
+        return speculation.start(session_id, step, question, partial_text) is not None
+
+    async def turn_timing(self, session_id: str) -> dict[str, Any]:
+        """Endpointing for the answer the session is waiting for (its current step)."""
+        step, _ = await self._waiting_step(session_id)
+        return step.turn_timing if step is not None and step.turn_timing else DEFAULT_TURN_TIMING
+
+    async def needs_llm(self, user_text: str, session_id: str) -> bool:
+        """Would extracting this text as the current step's answer go to the LLM (no rule hit, no validate_regex)?"""
+        step, _ = await self._waiting_step(session_id)
+        if step is None or step.validate_pattern is not None:
+            return False
+        rule = EXTRACTORS.get(step.qtype)
+        return not (rule and rule(user_text.strip()))
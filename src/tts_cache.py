@@ -0,0 +1,204 @@
+# tts_cache.py
+"""Content-addressed TTS audio cache for the voice agent.
+
+A line's audio is keyed by sha256(text, TTS provider, voice and synthesis
+settings) and stored on disk as its PCM frames, so the fixed lines (quick
+acks, farewell, fallbacks) and a flow's rewritten prompts are synthesized
+once and then streamed from disk/memory on every later call. Changing the
+voice, model, speed or sample rate changes the key; stale files are simply
+never read again.
+
+File layout (``<key>.pcm``): one JSON header line
+``{"sample_rate", "num_channels", "samples": [per-frame samples_per_channel]}``
+followed by the frames' int16 PCM back to back.
+"""
+import dataclasses
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from collections.abc import Iterable
+from typing import Any, Optional
+
+from livekit import rtc
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", ".cache/tts")  # "" disables the disk layer
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+TTS_CACHE_VERSION = 1
+# Options that never change the audio (credentials, endpoints)
+_IGNORED_OPTS = {"api_key", "base_url", "http_session"}
+
+
+def tts_settings(tts: Any) -> str:
+    """Stable description of everything about a TTS instance that affects its audio."""
+    opts = getattr(tts, "_opts", None)
+    if dataclasses.is_dataclass(opts):
+        fields = {f.name: getattr(opts, f.name) for f in dataclasses.fields(opts)}
+    else:
+        fields = dict(vars(opts)) if opts is not None and hasattr(opts, "__dict__") else {}
+    fields = {k: v for k, v in fields.items() if k not in _IGNORED_OPTS}
+    fields["provider"] = f"{type(tts).__module__}.{type(tts).__qualname__}"
+    fields["sample_rate"] = getattr(tts, "sample_rate", None)
+    fields["num_channels"] = getattr(tts, "num_channels", None)
+    return json.dumps(fields, sort_keys=True, default=str)
+
+
+def encode_frames(frames: list[rtc.AudioFrame]) -> bytes:
+    header = {
+        "sample_rate": frames[0].sample_rate,
+        "num_channels": frames[0].num_channels,
+        "samples": [f.samples_per_channel for f in frames],
+    }
+    body = b"".join(f.data.tobytes() for f in frames)
+    return json.dumps(header).encode() + b"\n" + body
+
+
+def decode_frames(blob: bytes) -> list[rtc.AudioFrame]:
+    head, _, body = blob.partition(b"\n")
+    header = json.loads(head)
+    rate, channels = header["sample_rate"], header["num_channels"]
+    frames, pos = [], 0
+    for n in header["samples"]:
+        size = n * channels * 2  # int16
+        frames.append(rtc.AudioFrame(body[pos:pos + size], rate, channels, n))
+        pos += size
+    if pos != len(body):
+        raise ValueError("truncated audio cache entry")
+    return frames
+
+
+class TTSAudioCache:
+    """Disk-backed audio per (text, voice, settings), with an in-memory LRU in front.
+
+    Only lines registered with ``register`` are written on a miss: rendered
+    prompts carry caller answers and would fill the cache with one-off audio.
+    Lookups work for any text.
+    """
+
+    def __init__(self, path: Optional[str] = TTS_CACHE_DIR, memory_bytes: int = int(TTS_CACHE_MEMORY_MB * 1024 * 1024)):
+        self.path = path or None
+        self.memory_bytes = memory_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.cacheable: set[str] = set()
+        self._mem: OrderedDict[str, list[rtc.AudioFrame]] = OrderedDict()
+        self._sizes: dict[str, int] = {}
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, settings: str) -> str:
+        raw = json.dumps([TTS_CACHE_VERSION, text, settings])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.pcm")
+
+    def register(self, texts: Iterable[str]):
+        """Mark lines whose audio should be kept once synthesized."""
+        self.cacheable.update(t for t in texts if t)
+
+    def wants(self, text: str) -> bool:
+        return text in self.cacheable
+
+    def _remember(self, key: str, frames: list[rtc.AudioFrame], size: int):
+        if key in self._mem:
+            self._mem.move_to_end(key)
+            return
+        self._mem[key] = frames
+        self._sizes[key] = size
+        self.bytes += size
+        while self.bytes > self.memory_bytes and len(self._mem) > 1:
+            old, _ = self._mem.popitem(last=False)
+            self.bytes -= self._sizes.pop(old)
+
+    def _read(self, key: str) -> Optional[list[rtc.AudioFrame]]:
+        if not self.path:
+            return None
+        try:
+            with open(self._file(key), "rb") as f:
+                blob = f.read()
+            frames = decode_frames(blob)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[TTS-CACHE] unreadable entry {key[:12]}: {e!r}")
+            return None
+        self._remember(key, frames, len(blob))
+        return frames
+
+    def get(self, text: str, settings: str) -> Optional[list[rtc.AudioFrame]]:
+        key = self.key(text, settings)
+        frames = self._mem.get(key)
+        if frames is not None:
+            self._mem.move_to_end(key)
+        else:
+            frames = self._read(key)
+        if frames is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return frames
+
+    def contains(self, text: str, settings: str) -> bool:
+        key = self.key(text, settings)
+        return key in self._mem or bool(self.path and os.path.exists(self._file(key)))
+
+    def put(self, text: str, settings: str, frames: list[rtc.AudioFrame]):
+        if not frames:
+            return
+        key = self.key(text, settings)
+        blob = encode_frames(frames)
+        if self.path:
+            tmp = f"{self._file(key)}.{os.getpid()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(blob)
+                os.replace(tmp, self._file(key))
+                self.writes += 1
+            except OSError as e:
+                print(f"[TTS-CACHE] write failed: {e!r}")
+        self._remember(key, frames, len(blob))
+
+    def load(self, texts: Iterable[str], settings: str) -> int:
+        """Pull the given lines' audio from disk into memory; returns how many were found."""
+        found = 0
+        for text in texts:
+            key = self.key(text, settings)
+            if key in self._mem or self._read(key) is not None:
+                found += 1
+        return found
+
+    # ---------- Manifests: which lines a flow speaks, for preloading ----------
+    def save_manifest(self, name: str, texts: Iterable[str]):
+        if not self.path:
+            return
+        path = os.path.join(self.path, f"{name}.lines.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(sorted(set(texts)), f, ensure_ascii=False, indent=0)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[TTS-CACHE] manifest write failed: {e!r}")
+
+    def manifest(self, name: str) -> list[str]:
+        if not self.path:
+            return []
+        try:
+            with open(os.path.join(self.path, f"{name}.lines.json"), encoding="utf-8") as f:
+                return [t for t in json.load(f) if isinstance(t, str)]
+        except (OSError, ValueError):
+            return []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "resident": len(self._mem),
+            "resident_bytes": self.bytes,
+            "cacheable_lines": len(self.cacheable),
+        }
@@ -0,0 +1,318 @@
+# voice_pool.py
+"""Warm pool of voice agent workers for server.py.
+
+Instead of ``uv run python src/agent.py console`` per session (interpreter
+start, dependency resolution, plugin + VAD load on every launch), the pool
+keeps VOICE_POOL_SIZE voice_worker.py processes warmed up and hands each new
+session to an idle one over its stdin. A worker reports ``released`` when its
+session ends and goes back to idle, so one warm process serves many sessions;
+when a worker exits (stopped, crashed, or retired after
+VOICE_WORKER_MAX_SESSIONS) a fresh one is warmed in its place. Sessions
+beyond the pool size wait in a bounded FIFO queue.
+
+The pool is opt-in: VOICE_POOL_SIZE=0 (the default) keeps the old
+spawn-per-session behaviour (VOICE_COLD_CMD) and starts no processes.
+Both modes record launch-to-first-prompt latency (request to the agent's
+first ``prompt_spoken`` event) for /api/voice/pool.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import shlex
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+VOICE_POOL_SIZE = int(os.getenv("VOICE_POOL_SIZE", "0"))
+VOICE_POOL_MAX_QUEUE = int(os.getenv("VOICE_POOL_MAX_QUEUE", "16"))
+VOICE_WORKER_CMD = os.getenv("VOICE_WORKER_CMD", "")  # default: this interpreter + voice_worker.py
+VOICE_COLD_CMD = os.getenv("VOICE_COLD_CMD", "uv run python src/agent.py console")
+VOICE_RESPAWN_BACKOFF_S = float(os.getenv("VOICE_RESPAWN_BACKOFF_S", "1"))
+VOICE_STOP_GRACE_S = float(os.getenv("VOICE_STOP_GRACE_S", "1"))
+LATENCY_SAMPLES = 256
+
+
+class PoolFullError(Exception):
+    pass
+
+
+class Worker:
+    __slots__ = ("proc", "ready", "served", "session_id", "spawned_at", "warm_ms")
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.ready = False
+        self.session_id: Optional[str] = None
+        self.spawned_at = time.monotonic()
+        self.warm_ms: Optional[float] = None
+        self.served = 0
+
+
+def _pct(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))], 1)
+
+
+class VoicePool:
+    """Keeps ``size`` voice workers alive (busy + warm idle) and queues the overflow.
+
+    ``on_event(session_id, event)`` is told when a session is handed to a
+    worker (voice_agent_started) and when the session ends, either released
+    by its worker or because the worker exited (voice_agent_stopped).
+    """
+
+    def __init__(
+        self,
+        size: int = VOICE_POOL_SIZE,
+        max_queue: int = VOICE_POOL_MAX_QUEUE,
+        cmd: Optional[list[str]] = None,
+        cold_cmd: Optional[list[str]] = None,
+        env: Optional[dict[str, str]] = None,
+        cwd: Optional[str] = None,
+        on_event: Optional[Callable[[str, dict], None]] = None,
+    ):
+        self.size = size
+        self.max_queue = max_queue
+        self.cmd = cmd or (
+            shlex.split(VOICE_WORKER_CMD)
+            if VOICE_WORKER_CMD
+            else [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_worker.py")]
+        )
+        self.cold_cmd = cold_cmd or shlex.split(VOICE_COLD_CMD)
+        self.env = env
+        self.cwd = cwd or os.getcwd()
+        self.on_event = on_event
+        self.workers: list[Worker] = []
+        self.queue: deque[str] = deque()
+        self.launched_at: dict[str, float] = {}
+        self.first_prompt_ms: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.spawned = 0
+        self.sessions_served = 0
+        self.failures = 0
+        self._backoff = 0.0
+        self._closed = False
+        self._tasks: set = set()
+
+    # ---------- Lifecycle ----------
+    async def start(self):
+        for _ in range(self.size):
+            await self._spawn()
+
+    async def close(self, grace_s: float = VOICE_STOP_GRACE_S):
+        self._closed = True
+        workers = list(self.workers)
+        for w in workers:
+            self._terminate(w)
+        # Reap the processes before the loop goes away, or their transports are
+        # finalized against a closed loop.
+        await self._reap(workers, grace_s)
+        tasks = list(self._tasks)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _reap(self, workers: list[Worker], grace_s: float):
+        waits = [asyncio.ensure_future(w.proc.wait()) for w in workers]
+        if not waits:
+            return
+        _, pending = await asyncio.wait(waits, timeout=grace_s)
+        if pending:
+            for w in workers:
+                if w.proc.returncode is None:
+                    with contextlib.suppress(ProcessLookupError):
+                        w.proc.kill()
+            await asyncio.wait(pending)
+
+    def _track(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _emit(self, session_id: str, event: dict):
+        if self.on_event and session_id:
+            self.on_event(session_id, event)
+
+    async def _spawn(self) -> Optional[Worker]:
+        if self._closed:
+            return None
+        r, w = os.pipe()
+        env = dict(self.env if self.env is not None else os.environ)
+        env["VOICE_WORKER_STATUS_FD"] = str(w)
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *self.cmd, stdin=asyncio.subprocess.PIPE, env=env, cwd=self.cwd, pass_fds=(w,)
+            )
+        except Exception as e:
+            os.close(r)
+            os.close(w)
+            print(f"[VOICE] failed to spawn worker: {e!r}")
+            self.failures += 1
+            self._track(self._respawn_later())
+            return None
+        os.close(w)
+        worker = Worker(proc)
+        self.workers.append(worker)
+        self.spawned += 1
+        self._track(self._read_status(worker, r))
+        self._track(self._watch(worker))
+        return worker
+
+    async def _respawn_later(self):
+        self._backoff = min(30.0, (self._backoff * 2) or VOICE_RESPAWN_BACKOFF_S)
+        await asyncio.sleep(self._backoff)
+        await self._spawn()
+
+    async def _read_status(self, worker: Worker, fd: int):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", buffering=0)
+        )
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if msg.get("event") == "ready":
+                    worker.ready = True
+                    worker.warm_ms = msg.get("warm_ms")
+                    self._backoff = 0.0
+                    self._dispatch()
+                elif msg.get("event") == "released" and msg.get("session_id") == worker.session_id:
+                    self._release(worker, retiring=bool(msg.get("retiring")))
+        finally:
+            transport.close()
+
+    async def _watch(self, worker: Worker):
+        code = await worker.proc.wait()
+        if worker in self.workers:
+            self.workers.remove(worker)
+        if worker.session_id:
+            self.launched_at.pop(worker.session_id, None)
+            self._emit(worker.session_id, {"event": "voice_agent_stopped", "exit_code": code})
+        if self._closed:
+            return
+        if not worker.ready and not worker.session_id and not worker.served:
+            # Died while warming up (bad env, missing model...): don't spin.
+            self.failures += 1
+            print(f"[VOICE] worker {worker.proc.pid} exited during warm-up with code {code}")
+            self._track(self._respawn_later())
+        elif self.size:
+            await self._spawn()
+
+    # ---------- Sessions ----------
+    def _idle(self) -> Optional[Worker]:
+        for w in self.workers:
+            if w.ready and not w.session_id and w.proc.returncode is None:
+                return w
+        return None
+
+    def _dispatch(self):
+        while self.queue:
+            worker = self._idle()
+            if worker is None:
+                return
+            self._hand_off(worker, self.queue.popleft())
+
+    def _release(self, worker: Worker, retiring: bool = False):
+        """The worker's session ended; it stays warm for the next one unless it is retiring."""
+        session_id, worker.session_id = worker.session_id, None
+        worker.served += 1
+        self.sessions_served += 1
+        if retiring:
+            worker.ready = False  # exiting; the pool warms a replacement
+        self.launched_at.pop(session_id, None)
+        self._emit(session_id, {"event": "voice_agent_stopped", "reason": "session_ended"})
+        self._dispatch()
+
+    def _hand_off(self, worker: Worker, session_id: str):
+        worker.session_id = session_id
+        line = json.dumps({"cmd": "assign", "session_id": session_id}) + "\n"
+        worker.proc.stdin.write(line.encode())
+        self._emit(session_id, {"event": "voice_agent_started", "process_id": worker.proc.pid})
+
+    async def launch(self, session_id: str) -> dict:
+        """Start a voice agent for a session: hand it to a warm worker, or queue it."""
+        if self.has(session_id):
+            return {"status": "running"}
+        self.launched_at[session_id] = time.monotonic()
+        if self.size <= 0:
+            env = dict(self.env if self.env is not None else os.environ)
+            env["FORCED_SESSION_ID"] = session_id
+            proc = await asyncio.create_subprocess_exec(*self.cold_cmd, env=env, cwd=self.cwd)
+            worker = Worker(proc)
+            worker.session_id = session_id
+            self.workers.append(worker)
+            self.spawned += 1
+            self._track(self._watch(worker))
+            self._emit(session_id, {"event": "voice_agent_started", "process_id": proc.pid})
+            return {"status": "started", "process_id": proc.pid}
+        worker = self._idle()
+        if worker is not None and not self.queue:
+            self._hand_off(worker, session_id)
+            return {"status": "started", "process_id": worker.proc.pid}
+        if len(self.queue) >= self.max_queue:
+            self.launched_at.pop(session_id, None)
+            raise PoolFullError(f"voice pool busy ({self.size} workers, {len(self.queue)} queued)")
+        self.queue.append(session_id)
+        return {"status": "queued", "position": len(self.queue)}
+
+    def has(self, session_id: str) -> bool:
+        return session_id in self.queue or any(w.session_id == session_id for w in self.workers)
+
+    def _terminate(self, worker: Worker):
+        if worker.proc.returncode is None:
+            if worker.proc.stdin is not None and not worker.proc.stdin.is_closing():
+                # A pooled worker whose console session ends on the signal reads this next
+                worker.proc.stdin.write(b'{"cmd": "stop"}\n')
+                worker.proc.stdin.close()
+            with contextlib.suppress(ProcessLookupError):
+                worker.proc.terminate()
+
+    async def stop(self, session_id: str, grace_s: float = VOICE_STOP_GRACE_S) -> bool:
+        """Stop a session now. Its worker is ended too (and replaced by a warm one):
+        the console session can only be interrupted from outside by a signal."""
+        if session_id in self.queue:
+            self.queue.remove(session_id)
+            self.launched_at.pop(session_id, None)
+            return True
+        for worker in self.workers:
+            if worker.session_id == session_id:
+                self._terminate(worker)
+                await self._reap([worker], grace_s)
+                return True
+        return False
+
+    def note_event(self, session_id: str, event: dict):
+        """Feed agent events through here to time launch -> first spoken prompt."""
+        if event.get("event") == "prompt_spoken" and session_id in self.launched_at:
+            started = self.launched_at.pop(session_id)
+            self.first_prompt_ms.append((time.monotonic() - started) * 1000)
+
+    def stats(self) -> dict[str, Any]:
+        samples = list(self.first_prompt_ms)
+        return {
+            "mode": "pool" if self.size > 0 else "spawn_per_session",
+            "size": self.size,
+            "idle": sum(1 for w in self.workers if w.ready and not w.session_id),
+            "warming": sum(1 for w in self.workers if not w.ready and not w.session_id),
+            "busy": sum(1 for w in self.workers if w.session_id),
+            "queued": len(self.queue),
+            "spawned": self.spawned,
+            "sessions_served": self.sessions_served,
+            "failures": self.failures,
+            "warm_ms": [w.warm_ms for w in self.workers if w.warm_ms is not None],
+            "launch_to_first_prompt_ms": {
+                "count": len(samples),
+                "p50": _pct(samples, 50),
+                "p95": _pct(samples, 95),
+            },
+        }
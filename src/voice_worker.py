@@ -0,0 +1,99 @@
+# voice_worker.py
+"""Pre-warmed voice agent worker, managed by voice_pool.VoicePool.
+
+Pays the agent's startup cost (interpreter, LiveKit plugins, Silero VAD load,
+engine + OpenAI client setup, the flow's cached prompt audio) before it has a
+session, reports ``ready`` on the status pipe (fd in VOICE_WORKER_STATUS_FD),
+then serves JSON-lines assignments from stdin, one session at a time:
+
+    {"cmd": "assign", "session_id": "ui_1234"}
+
+Each assignment runs the console agent for that session, exactly as
+FORCED_SESSION_ID did for a freshly spawned ``agent.py console``, then
+reports ``released`` and waits for the next one in the same warm process.
+The flow is loaded afresh for every session, so edits made since the
+previous one apply.
+After VOICE_WORKER_MAX_SESSIONS sessions (0 = no limit) the worker exits
+and the pool warms a fresh one in its place. ``{"cmd": "stop"}`` or EOF on
+stdin ends the worker.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+_t0 = time.perf_counter()
+STATUS_FD = int(os.getenv("VOICE_WORKER_STATUS_FD", "-1"))
+VOICE_WORKER_MAX_SESSIONS = int(os.getenv("VOICE_WORKER_MAX_SESSIONS", "50"))
+# Benchmarks and tests: load the session's flow and release it instead of opening the console session
+DRY_RUN = os.getenv("VOICE_WORKER_DRY_RUN", "") == "1"
+
+
+def report(event: str, **fields):
+    if STATUS_FD < 0:
+        return
+    line = json.dumps({"event": event, "pid": os.getpid(), **fields}) + "\n"
+    os.write(STATUS_FD, line.encode())
+
+
+def run_session(agent):
+    from livekit.agents import WorkerOptions, cli
+
+    sys.argv = [sys.argv[0], "console"]
+    # click exits once the console session ends; this process stays warm for the next one
+    with contextlib.suppress(SystemExit):
+        cli.run_app(WorkerOptions(entrypoint_fnc=agent.entrypoint, prewarm_fnc=agent.prewarm))
+
+
+def dry_run_steps(agent) -> list:
+    """Step names of the flow the session would run ([] if it cannot be loaded)."""
+    try:
+        _, _, _, steps = asyncio.run(agent.flow_registry.get(agent.FLOW_NAME))
+    except Exception as e:
+        print(f"[VOICE] dry run could not load '{agent.FLOW_NAME}': {e!r}")
+        return []
+    return list(steps)
+
+
+def main():
+    import agent  # the expensive part: plugins, engine, LLM clients
+
+    cached = agent.warm_process()  # VAD + the flow's prompt audio; the job's prewarm reuses both
+
+    report("ready", warm_ms=round((time.perf_counter() - _t0) * 1000, 1), cached_lines=cached)
+    try:
+        served = 0
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                return  # pool closed our stdin
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if msg.get("cmd") == "stop":
+                return
+            if msg.get("cmd") != "assign" or not msg.get("session_id"):
+                continue
+            session_id = msg["session_id"]
+            os.environ["FORCED_SESSION_ID"] = session_id
+            report("assigned", session_id=session_id)
+            agent.forget_flow()
+            extra = {}
+            if DRY_RUN:
+                extra["steps"] = dry_run_steps(agent)
+            else:
+                run_session(agent)
+            served += 1
+            retiring = bool(VOICE_WORKER_MAX_SESSIONS) and served >= VOICE_WORKER_MAX_SESSIONS
+            report("released", session_id=session_id, sessions=served, retiring=retiring, **extra)
+            if retiring:
+                return
+    finally:
+        agent.CHECKPOINTER.close()  # write out queued checkpoints before the process exits
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+
+# The intake modules build an OpenAI-backed rewriter at import time. Tests never
+# reach the network, they only need the constructor to succeed.
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("INTAKE_DEBUG", "0")
+os.environ.setdefault("CHECKPOINT_DB_PATH", "")
+
+import pytest
+
+import strict_intake_assistant as sia
+from checkpoint_store import BoundedSqliteSaver
+from strict_intake_assistant import Step
+
+
+class StubRewriter:
+    """Deterministic stand-in for EmpatheticRewriter (no LLM calls)."""
+
+    async def rewrite(self, text: str) -> str:
+        return text
+
+    async def warm(self, texts):
+        return None
+
+    async def greeting(self, agent: str, firm: str) -> str:
+        return f"Hello, this is {agent}."
+
+    async def extract_and_validate(self, question: str, user_response: str, pattern=None, qtype=None):
+        return True, user_response.strip(), ""
+
+
+def make_steps(n: int):
+    names = [f"q{i}" for i in range(n)]
+    steps = {}
+    for i, name in enumerate(names):
+        steps[name] = Step(
+            name=name,
+            ask_prompt=f"Question {i}?",
+            input_key=f"key_{i}",
+            next_name=names[i + 1] if i + 1 < n else None,
+        )
+    return steps, names[0]
+
+
+@pytest.fixture
+def offline_flow(monkeypatch):
+    """Patch DB, events and LLM so StrictIntakeAssistant runs fully in-process.
+
+    Returns a function ``build(n)`` that creates an assistant for an n-step flow.
+    """
+    saved = []
+
+    async def fake_load(flow_name: str):
+        fake_load.calls += 1
+        steps, entry = make_steps(fake_load.n)
+        return steps, "flow-1", entry
+
+    fake_load.calls = 0
+
+    async def fake_run_id(flow_id, session_id):
+        return f"run-{session_id}"
+
+    async def fake_save(rows):
+        saved.extend((r["run_id"], r["step_name"], r["input_key"], r["value"]) for r in rows)
+
+    async def fake_emit(session_id, event):
+        return None
+
+    monkeypatch.setattr(sia, "load_flow_and_steps", fake_load)
+    monkeypatch.setattr(sia, "get_or_create_run_id", fake_run_id)
+    monkeypatch.setattr(sia, "save_answers", fake_save)
+    monkeypatch.setattr(sia, "emit_event", fake_emit)
+    monkeypatch.setattr(sia, "rewriter", StubRewriter())
+    monkeypatch.setattr(sia, "flow_registry", sia.FlowRegistry())
+    monkeypatch.setattr(sia, "speculation", sia.SpeculativeExtractions())
+    monkeypatch.setattr(sia, "answer_writer", sia.AnswerWriter(flush_interval=0.01))
+    monkeypatch.setattr(sia, "CHECKPOINTER", BoundedSqliteSaver(path=None))
+
+    async def build(n: int = 3):
+        fake_load.n = n
+        return await sia.StrictIntakeAssistant.create("test_flow")
+
+    build.saved = saved
+    build.loader = fake_load
+    return build
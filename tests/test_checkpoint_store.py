@@ -0,0 +1,85 @@
+import sqlite3
+
+from langgraph.graph import END, START, StateGraph
+from typing_extensions import TypedDict
+
+from checkpoint_store import BoundedSqliteSaver
+
+
+class _S(TypedDict):
+    n: int
+
+
+def _graph(saver):
+    g = StateGraph(_S)
+    g.add_node("inc", lambda s: {"n": s["n"] + 1})
+    g.add_edge(START, "inc")
+    g.add_edge("inc", END)
+    return g.compile(checkpointer=saver)
+
+
+def _cfg(tid):
+    return {"configurable": {"thread_id": tid}}
+
+
+async def test_keeps_only_latest_checkpoint():
+    app = _graph(BoundedSqliteSaver(path=None))
+    await app.ainvoke({"n": 0}, _cfg("t"))
+    await app.ainvoke({"n": 10}, _cfg("t"))
+    history = [s async for s in app.aget_state_history(_cfg("t"))]
+    assert len(history) == 1
+    assert history[0].values == {"n": 11}
+
+
+async def test_lru_evicts_and_reloads_from_sqlite(tmp_path):
+    saver = BoundedSqliteSaver(path=str(tmp_path / "cp.sqlite3"), max_threads=2)
+    app = _graph(saver)
+    for tid in ("a", "b", "c"):
+        await app.ainvoke({"n": 1}, _cfg(tid))
+    assert saver.resident == 2
+    assert saver.evictions >= 1
+
+    # "a" was evicted from memory but comes back from disk.
+    assert (await app.aget_state(_cfg("a"))).values == {"n": 2}
+    assert saver.resident == 2
+
+
+async def test_ttl_expires_idle_threads_without_disk():
+    saver = BoundedSqliteSaver(path=None, ttl_s=0)
+    app = _graph(saver)
+    await app.ainvoke({"n": 1}, _cfg("a"))
+    await app.ainvoke({"n": 1}, _cfg("b"))
+    assert saver.resident <= 1
+    assert (await app.aget_state(_cfg("a"))).values == {}
+
+
+async def test_sessions_survive_restart(tmp_path):
+    path = str(tmp_path / "cp.sqlite3")
+    first = BoundedSqliteSaver(path=path)
+    await _graph(first).ainvoke({"n": 41}, _cfg("t"))
+    first.close()
+
+    app = _graph(BoundedSqliteSaver(path=path))
+    assert (await app.aget_state(_cfg("t"))).values == {"n": 42}
+    assert (await app.ainvoke({"n": 0}, _cfg("t"))) == {"n": 1}
+
+
+async def test_file_is_opened_lazily_and_idle_rows_are_deleted(tmp_path):
+    path = tmp_path / "cp.sqlite3"
+    saver = BoundedSqliteSaver(path=str(path), disk_ttl_s=3600)
+    assert not path.exists()  # nothing until the first checkpoint
+
+    app = _graph(saver)
+    await app.ainvoke({"n": 1}, _cfg("old"))
+    saver.flush()
+    assert path.exists()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE checkpoints SET updated_at = updated_at - 7200")
+    await app.ainvoke({"n": 1}, _cfg("new"))
+    saver.flush()
+    saver.purge()
+    assert saver.purged == 1
+    saver.close()
+
+    with sqlite3.connect(path) as db:
+        assert [r[0] for r in db.execute("SELECT thread_id FROM checkpoints")] == ["new"]
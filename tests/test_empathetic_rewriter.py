@@ -0,0 +1,193 @@
+import re
+
+import empathetic_rewriter
+import intake_metrics
+from empathetic_rewriter import (
+    REGEX_CLARIFICATION,
+    REWRITE_TMPL,
+    EmpatheticRewriter,
+    register_extractor,
+    resolve_question_type,
+)
+
+
+class FakeChain:
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    async def ainvoke(self, inputs):
+        self.calls.append(inputs)
+        return self.reply(inputs) if callable(self.reply) else self.reply
+
+
+def _rewriter(path, reply):
+    rw = EmpatheticRewriter(cache_path=str(path))
+    rw.rewrite_chain = FakeChain(reply)
+    return rw
+
+
+def test_rewrite_prompt_only_takes_text():
+    assert REWRITE_TMPL.input_variables == ["text"]
+
+
+async def test_template_rewrite_is_persisted_and_shared(tmp_path):
+    path = tmp_path / "rewrites.json"
+    rw = _rewriter(path, "I'm sorry {first_name}. What is your last name?")
+    out = await rw.rewrite("Thanks {first_name}. What is your last name?")
+    assert out == "I'm sorry {first_name}. What is your last name?"
+    rw.disk_cache.save()
+
+    # A fresh process reuses the disk cache without calling the LLM.
+    again = _rewriter(path, "unused")
+    assert await again.rewrite("Thanks {first_name}. What is your last name?") == out
+    assert again.rewrite_chain.calls == []
+
+
+async def test_rewrite_that_drops_placeholders_is_not_used(tmp_path):
+    path = tmp_path / "rewrites.json"
+    rw = _rewriter(path, "What is your last name?")
+    template = "Thanks {first_name}. What is your last name?"
+    assert await rw.rewrite(template) == template
+    assert not path.exists() or template not in path.read_text()
+
+
+async def test_warm_rewrites_each_template_once(tmp_path):
+    rw = _rewriter(tmp_path / "rewrites.json", lambda inputs: f"Kindly: {inputs['text']}")
+    await rw.warm(["A?", "B {x}?", "A?"])
+    await rw.warm(["A?"])
+    assert sorted(c["text"] for c in rw.rewrite_chain.calls) == ["A?", "B {x}?"]
+    assert await rw.rewrite("B {x}?") == "Kindly: B {x}?"
+
+
+async def test_rewrites_in_a_burst_share_one_save_and_merge_with_disk(tmp_path, monkeypatch):
+    import asyncio
+    import json
+
+    path = tmp_path / "rewrites.json"
+    rw = _rewriter(path, lambda inputs: f"Kindly: {inputs['text']}")
+    other = empathetic_rewriter.RewriteCache(str(path))  # e.g. a pool worker, saving after rw loaded
+    other.put("other-process", "kept")
+    other.save()
+
+    writes = []
+    replace = empathetic_rewriter.os.replace
+    monkeypatch.setattr(empathetic_rewriter.os, "replace", lambda src, dst: (writes.append(src), replace(src, dst)))
+    rw.disk_cache.save_delay = 0.01
+    await rw.rewrite("A?")
+    await rw.rewrite("B?")
+    assert writes == []  # debounced
+    await asyncio.sleep(0.05)
+    assert writes == [f"{path}.{empathetic_rewriter.os.getpid()}.tmp"]
+    saved = json.loads(path.read_text())
+    assert saved["other-process"] == "kept" and len(saved) == 3
+
+
+def test_save_pending_on_a_closed_loop_is_written_by_the_next_loop(tmp_path):
+    import asyncio
+    import json
+
+    path = tmp_path / "rewrites.json"
+    cache = empathetic_rewriter.RewriteCache(str(path), save_delay=60)
+
+    async def put(key):
+        cache.put(key, key.upper())
+        cache.save_soon()
+
+    asyncio.run(put("a"))  # the loop closes with the save still pending
+    assert not path.exists()
+    asyncio.run(put("b"))  # flushes the stranded save instead of waiting on it forever
+    assert json.loads(path.read_text()) == {"a": "A", "b": "B"}
+
+
+def test_parse_combined_result_variants():
+    from empathetic_rewriter import parse_combined_result
+
+    assert parse_combined_result('{"value": "Main St", "status": "VALID"}') == (True, "Main St", "")
+    fenced = '```json\n{"Value": "jon", "Status": "valid_corrected", "corrected": "Jon"}\n```'
+    assert parse_combined_result(fenced) == (True, "Jon", "")
+    prose = 'Sure! {"value": "", "status": "INVALID", "clarification": "Could you share the date?"} Hope that helps.'
+    assert parse_combined_result(prose) == (False, "", "Could you share the date?")
+    assert parse_combined_result('{"status": "VALID"}', fallback_value="raw") == (True, "raw", "")
+    assert parse_combined_result("VALID") is None
+    assert parse_combined_result('{"status": "INVALID"}') is None
+    assert parse_combined_result('{"value": "x", "status": "MAYBE"}') is None
+
+
+async def test_combined_mode_uses_one_llm_call(tmp_path):
+    rw = _rewriter(tmp_path / "r.json", "unused")
+    rw.combined_chain = FakeChain('{"value": "at the mall", "status": "VALID"}')
+    rw.extraction_chain = FakeChain("unused")
+    rw.validation_chain = FakeChain("unused")
+
+    assert await rw.extract_and_validate("Where did it happen?", "it was at the mall") == (True, "at the mall", "")
+    assert len(rw.combined_chain.calls) == 1
+    assert rw.extraction_chain.calls == rw.validation_chain.calls == []
+
+
+async def test_combined_parse_failure_falls_back_to_two_step(tmp_path):
+    rw = _rewriter(tmp_path / "r.json", "unused")
+    rw.combined_chain = FakeChain("I think the answer is the mall.")
+    rw.extraction_chain = FakeChain("the mall")
+    rw.validation_chain = FakeChain("VALID_CORRECTED: The Mall")
+
+    assert await rw.extract_and_validate("Where did it happen?", "it was at the mall") == (True, "The Mall", "")
+    assert len(rw.extraction_chain.calls) == len(rw.validation_chain.calls) == 1
+
+
+async def test_validate_regex_decides_without_llm(tmp_path):
+    rw = _rewriter(tmp_path / "r.json", "unused")
+    rw.combined_chain = FakeChain("unused")
+    rw.extraction_chain = FakeChain("unused")
+    rw.validation_chain = FakeChain("unused")
+    intake_metrics.reset()
+    pattern = re.compile(r"^[A-Z]{2}\d{4}$", re.I)
+
+    assert await rw.extract_and_validate("What is your claim code?", "ab1234", pattern=pattern) == (True, "ab1234", "")
+    ok, value, clarification = await rw.extract_and_validate("What is your claim code?", "no idea", pattern=pattern)
+    assert (ok, value) == (False, "")
+    assert clarification == REGEX_CLARIFICATION
+    assert rw.combined_chain.calls == rw.extraction_chain.calls == rw.validation_chain.calls == []
+    counts = intake_metrics.snapshot()
+    assert counts["llm_validations_avoided"] == 2
+    assert counts["regex_accepts"] == counts["regex_rejects"] == 1
+
+
+async def test_validate_regex_checks_rule_extracted_value(tmp_path):
+    rw = _rewriter(tmp_path / "r.json", "unused")
+    rw.combined_chain = FakeChain("unused")
+    pattern = re.compile(r"^\S+$")
+
+    # The name rule strips the lead-in, so the bare name is what gets checked.
+    assert await rw.extract_and_validate("What is your first name?", "my name is Jon", pattern=pattern) == (True, "Jon", "")
+    assert rw.combined_chain.calls == []
+
+
+async def test_validate_regex_stores_only_the_matched_span(tmp_path):
+    rw = _rewriter(tmp_path / "r.json", "unused")
+    rw.combined_chain = FakeChain("unused")
+    pattern = re.compile(r"\d{5}")
+
+    assert await rw.extract_and_validate("What is your zip code?", "my zip is 12345", pattern=pattern) == (True, "12345", "")
+    assert rw.combined_chain.calls == []
+
+
+def test_question_type_resolves_from_column_then_input_key():
+    # An edited prompt mentioning "time" no longer turns a name step into a date step.
+    assert resolve_question_type("first_name", None, "Take your time: what is your first name?") == "first_name"
+    assert resolve_question_type("surname", None, "And the rest?") == "last_name"
+    assert resolve_question_type("anything", "witnesses", "When?") == "witnesses"
+    assert resolve_question_type("custom_key", None, "When did it happen?") == "incident_date"
+
+
+async def test_registered_extractor_is_used_without_llm(tmp_path, monkeypatch):
+    monkeypatch.setattr(empathetic_rewriter, "EXTRACTORS", dict(empathetic_rewriter.EXTRACTORS))
+    monkeypatch.setattr(empathetic_rewriter, "INPUT_KEY_TYPES", dict(empathetic_rewriter.INPUT_KEY_TYPES))
+    register_extractor("policy_number", lambda text: "".join(ch for ch in text if ch.isdigit()) or None, ["policy_no"])
+    rw = _rewriter(tmp_path / "r.json", "unused")
+    rw.combined_chain = FakeChain("unused")
+
+    qtype = resolve_question_type("policy_no")
+    assert qtype == "policy_number"
+    assert await rw.extract_and_validate("Policy?", "it's 12-34-56", qtype=qtype) == (True, "123456", "")
+    assert rw.combined_chain.calls == []
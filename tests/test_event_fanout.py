@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+from event_fanout import Fanout, Subscriber
+from intake_metrics import reset, snapshot
+
+
+class _Socket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, msg):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(msg))
+
+    async def close(self):
+        self.closed = True
+
+
+def slow_queue(fanout):
+    sub = max(fanout.subs["s"], key=lambda s: s.dropped)
+    return list(sub.queue._queue)
+
+
+async def test_slow_subscriber_does_not_hold_up_others():
+    reset()
+    fanout = Fanout()
+    fast, slow = _Socket(), _Socket(delay=10)
+    fanout.subscribe("s", Subscriber(fast.send_text, queue_size=16))
+    fanout.subscribe("s", Subscriber(slow.send_text, queue_size=4))
+
+    for i in range(10):
+        assert fanout.publish("s", {"n": i}) == 2  # returns immediately
+    await asyncio.sleep(0.01)
+    assert [e["n"] for e in fast.sent] == list(range(10))
+    assert slow.sent == []
+    # Overflows replaced the slow one's backlog with a snapshot instead of leaving gaps.
+    assert snapshot()["ws_events_dropped"] == 10
+    # (the snapshot is already in flight; only the newest event is still queued)
+    assert [json.loads(m) for m in slow_queue(fanout)] == [{"n": 9, "seq": 10}]
+    assert fanout.publish("other", {"n": 0}) == 0
+
+
+async def test_disconnect_policy_and_send_timeout_unsubscribe():
+    fanout = Fanout()
+    stuck = _Socket(delay=10)
+    fanout.subscribe("s", Subscriber(stuck.send_text, stuck.close, queue_size=1, policy="disconnect"))
+    for i in range(3):
+        fanout.publish("s", {"n": i})
+    await asyncio.sleep(0)
+    assert fanout.count("s") == 0 and stuck.closed
+
+    timed_out = _Socket(delay=10)
+    fanout.subscribe("t", Subscriber(timed_out.send_text, timed_out.close, send_timeout_s=0.01))
+    fanout.publish("t", {"n": 0})
+    await asyncio.sleep(0.05)
+    assert fanout.count("t") == 0 and timed_out.closed
+
+
+def test_events_carry_seq_and_only_what_changed():
+    fanout = Fanout(replay_size=3)
+    fanout.publish("s", {"event": "node_entered", "node_id": "a", "collected_data": {}, "completed_steps": []})
+    fanout.publish("s", {"event": "user_heard", "text": "Jon", "collected_data": {}, "completed_steps": []})
+    fanout.publish("s", {"event": "node_entered", "node_id": "b", "collected_data": {"a": "Jon"}, "completed_steps": ["a"]})
+    last = fanout.publish("s", {"event": "node_entered", "node_id": "a", "collected_data": {}, "completed_steps": []})
+    log = fanout.log("s")
+    events = [json.loads(m) for _, m in log.ring]
+    assert [e["seq"] for e in events] == [2, 3, 4] and last == 0
+    assert events[0] == {"event": "user_heard", "text": "Jon", "seq": 2}
+    assert events[1]["data_changed"] == {"a": "Jon"} and events[1]["steps_added"] == ["a"]
+    assert events[2]["data_removed"] == ["a"] and events[2]["completed_steps"] == []
+
+    assert [json.loads(m)["seq"] for m in log.since(2)] == [3, 4]
+    assert log.since(4) == []
+    assert log.since(0) is None  # seq 1 already fell out of the ring
+    assert log.since(9) is None  # e.g. a client from before a server restart
+    assert json.loads(log.snapshot()) == {
+        "event": "snapshot", "seq": 4, "node_id": "a", "collected_data": {}, "completed_steps": [],
+    }
+
+
+async def test_late_subscriber_replays_or_gets_snapshot():
+    fanout = Fanout(replay_size=2)
+    for i in range(3):
+        fanout.publish("s", {"event": "node_entered", "node_id": f"n{i}"})
+    caught_up, behind, fresh = _Socket(), _Socket(), _Socket()
+    fanout.subscribe("s", Subscriber(caught_up.send_text), since_seq=1)
+    fanout.subscribe("s", Subscriber(behind.send_text), since_seq=0)
+    fanout.subscribe("s", Subscriber(fresh.send_text))
+    await asyncio.sleep(0.01)
+    assert [e["seq"] for e in caught_up.sent] == [2, 3]
+    assert behind.sent == fresh.sent == [
+        {"event": "snapshot", "seq": 3, "node_id": "n2", "collected_data": {}, "completed_steps": []}
+    ]
@@ -0,0 +1,296 @@
+import pytest
+from conftest import StubRewriter
+
+import strict_intake_assistant as sia
+from local_store import (
+    LocalStoreError,
+    MemoryClient,
+    SqliteClient,
+    create_local_client,
+    seed_flow,
+)
+
+STEPS = [
+    {"name": "first_name", "input_key": "first_name", "ask_prompt": "What is your first name?"},
+    {"name": "last_name", "input_key": "last_name", "ask_prompt": "Thanks {first_name}. Last name?"},
+    {"name": "incident_date", "input_key": "incident_date", "ask_prompt": "When did it happen?"},
+]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def client(request, tmp_path):
+    if request.param == "memory":
+        return MemoryClient()
+    return SqliteClient(str(tmp_path / "store.sqlite3"))
+
+
+@pytest.fixture
+def engine(client, monkeypatch):
+    """Point the engine's real DB helpers at a local backend."""
+    monkeypatch.setattr(sia, "_client", client)
+    monkeypatch.setattr(sia, "rewriter", StubRewriter())
+    monkeypatch.setattr(sia, "flow_registry", sia.FlowRegistry())
+    return client
+
+
+async def test_query_builder_round_trip(client):
+    flow_id = await seed_flow(client, "f", STEPS, order_gap=1)
+    rows = (await client.table("intake_steps").select("name, order_index").eq("flow_id", flow_id)
+            .gt("order_index", 1).order("order_index", desc=True).execute()).data
+    assert rows == [{"name": "incident_date", "order_index": 3}, {"name": "last_name", "order_index": 2}]
+
+    one = (await client.table("flows").select("id").eq("name", "f").single().execute()).data
+    assert one == {"id": flow_id}
+    with pytest.raises(LocalStoreError):
+        await client.table("flows").select("id").eq("name", "missing").single().execute()
+
+    await client.table("intake_steps").update({"ask_prompt": "Date?"}).eq("flow_id", flow_id).eq("name", "incident_date").execute()
+    await client.table("intake_steps").delete().in_("name", ["first_name", "last_name"]).execute()
+    left = (await client.table("intake_steps").select("*").eq("flow_id", flow_id).execute()).data
+    assert [(r["name"], r["ask_prompt"]) for r in left] == [("incident_date", "Date?")]
+
+
+async def test_upsert_returns_existing_row_on_conflict(client):
+    first = (await client.table("intake_runs").upsert(
+        {"flow_id": "f", "session_id": "s"}, on_conflict="flow_id,session_id").execute()).data[0]
+    again = (await client.table("intake_runs").upsert(
+        {"flow_id": "f", "session_id": "s"}, on_conflict="flow_id,session_id").execute()).data[0]
+    assert first["id"] == again["id"]
+    assert len((await client.table("intake_runs").select("id").execute()).data) == 1
+
+
+async def test_engine_helpers_run_offline(engine):
+    await seed_flow(engine, "injury", STEPS)
+    steps, flow_id, entry = await sia.load_flow_and_steps("injury")
+    assert entry == "first_name" and list(steps) == ["first_name", "last_name", "incident_date"]
+
+    run_id = await sia.get_or_create_run_id(flow_id, "sess-1")
+    assert run_id and run_id == await sia.get_or_create_run_id(flow_id, "sess-1")
+    await sia.save_answers([{"run_id": run_id, "step_name": "first_name", "input_key": "first_name", "value": "Jon"}])
+    saved = (await engine.table("intake_answers").select("value").eq("run_id", run_id).execute()).data
+    assert saved == [{"value": "Jon"}]
+
+    rows = await sia.insert_step_after_db("injury", "first_name", "What is your middle name?", name="middle_name")
+    assert [r["name"] for r in rows] == ["first_name", "middle_name", "last_name", "incident_date"]
+    assert rows[0]["next_name"] == "middle_name" and rows[1]["next_name"] == "last_name"
+
+    assert await sia.delete_step("injury", "middle_name")
+    rows = await sia.load_flow_steps_raw("injury")
+    # Gapped order_index: deleting leaves the other rows untouched
+    assert [(r["name"], r["order_index"]) for r in rows] == [("first_name", 1024), ("last_name", 2048), ("incident_date", 3072)]
+    assert rows[0]["next_name"] == "last_name"
+
+
+async def test_sqlite_store_persists_and_unknown_backend_fails(tmp_path):
+    path = str(tmp_path / "store.sqlite3")
+    client = await create_local_client("sqlite", path=path, seed_file="")
+    await seed_flow(client, "f", STEPS)
+    client.close()
+
+    reopened = SqliteClient(path)
+    assert len((await reopened.table("intake_steps").select("id").execute()).data) == 3
+    with pytest.raises(LocalStoreError):
+        await reopened.table("intake_steps").select("nope").execute()
+    with pytest.raises(ValueError):
+        await create_local_client("postgres")
+
+
+def _chain(rows):
+    """Step names following next_name from the first row."""
+    by_name = {r["name"]: r for r in rows}
+    out, cur = [], rows[0]["name"]
+    while cur:
+        out.append(cur)
+        cur = by_name[cur].get("next_name")
+    return out
+
+
+async def test_insert_and_move_take_constant_requests(engine):
+    steps = [{"name": f"s{i}", "input_key": f"k{i}", "ask_prompt": f"Q{i}?"} for i in range(200)]
+    await seed_flow(engine, "big", steps)
+
+    before = engine.calls
+    rows = await sia.insert_step_after_db("big", "s0", "New?", name="new")
+    assert engine.calls - before <= 6  # independent of the 199 following rows
+    assert [r["name"] for r in rows[:3]] == ["s0", "new", "s1"]
+
+    before = engine.calls
+    rows = await sia.move_step_db("big", "s199", after=None)
+    assert engine.calls - before <= 5  # flow id + read + one upsert + refreshed rows
+    assert [r["name"] for r in rows[:3]] == ["s199", "s0", "new"]
+    assert _chain(rows) == [r["name"] for r in rows]
+
+    rows = await sia.move_step_db("big", "s0", after="s5")
+    assert [r["name"] for r in rows[:8]] == ["s199", "new", "s1", "s2", "s3", "s4", "s5", "s0"]
+    assert _chain(rows) == [r["name"] for r in rows]
+
+
+async def test_exhausted_gap_is_respaced_in_one_upsert(engine):
+    await seed_flow(engine, "tight", STEPS, order_gap=1)
+    rows = await sia.insert_step_after_db("tight", "first_name", "Middle?", name="middle")
+    assert [r["name"] for r in rows] == ["first_name", "middle", "last_name", "incident_date"]
+    assert len({r["order_index"] for r in rows}) == 4
+    assert _chain(rows) == [r["name"] for r in rows]
+
+    with pytest.raises(ValueError):
+        await sia.move_step_db("tight", "middle", after="nope")
+
+
+async def test_batch_applies_net_change_in_few_requests(engine):
+    steps = [{"name": f"s{i}", "input_key": f"k{i}", "ask_prompt": f"Q{i}?"} for i in range(50)]
+    await seed_flow(engine, "batch", steps)
+    ops = [
+        {"op": "insert_after", "insert_after": "s0", "ask_prompt": "Middle name?", "name": "middle"},
+        {"op": "update", "step": "middle", "patch": {"validate_regex": "^[A-Za-z]+$"}},
+        {"op": "delete", "step": "s1"},
+        {"op": "move", "step": "s49", "after": "middle"},
+        {"op": "delete", "step": "s2"},
+    ]
+    before = engine.calls
+    rows = await sia.apply_flow_batch("batch", ops)
+    # flow id + read + upsert (changed and new rows) + delete + refreshed read
+    assert engine.calls - before <= 5
+    assert [r["name"] for r in rows[:5]] == ["s0", "middle", "s49", "s3", "s4"]
+    assert rows[1]["validate_regex"] == "^[A-Za-z]+$"
+    assert _chain(rows) == [r["name"] for r in rows]
+    assert len(rows) == 49
+
+
+async def test_batch_leaves_missing_columns_to_their_defaults(engine, monkeypatch):
+    await seed_flow(engine, "defaults", STEPS)
+    sent = []
+    run = engine._run
+
+    def spy(q):
+        if q.table == "intake_steps" and q.op == "upsert":
+            sent.extend(q.rows)
+        return run(q)
+
+    monkeypatch.setattr(engine, "_run", spy)
+    rows = await sia.apply_flow_batch("defaults", [
+        {"op": "insert_after", "insert_after": "first_name", "ask_prompt": "Middle?", "name": "middle"},
+    ])
+    new = next(r for r in sent if r["name"] == "middle")
+    assert "created_at" not in new
+    assert next(r for r in rows if r["name"] == "middle")["created_at"]
+
+
+async def test_invalid_batch_writes_nothing(engine):
+    await seed_flow(engine, "guarded", STEPS)
+    before = await sia.load_flow_steps_raw("guarded")
+    with pytest.raises(ValueError, match="op 1"):
+        await sia.apply_flow_batch("guarded", [
+            {"op": "delete", "step": "last_name"},
+            {"op": "update", "step": "last_name", "patch": {"ask_prompt": "gone?"}},
+        ])
+    with pytest.raises(ValueError, match="validate_regex"):
+        await sia.apply_flow_batch("guarded", [{"op": "update", "step": "first_name", "patch": {"validate_regex": "(["}}])
+    assert await sia.load_flow_steps_raw("guarded") == before
+
+
+def _failing(client, monkeypatch, op):
+    run = client._run
+
+    def failing_run(q):
+        if q.table == "intake_steps" and q.op == op:
+            raise LocalStoreError(f"{op} intake_steps: boom")
+        return run(q)
+
+    monkeypatch.setattr(client, "_run", failing_run)
+
+
+async def test_batch_upsert_failure_writes_nothing(engine, monkeypatch):
+    await seed_flow(engine, "atomic", STEPS)
+    before = await sia.load_flow_steps_raw("atomic")
+    with monkeypatch.context() as m, pytest.raises(ValueError, match="nothing was written"):
+        _failing(engine, m, "upsert")
+        await sia.apply_flow_batch("atomic", [
+            {"op": "delete", "step": "last_name"},
+            {"op": "insert_after", "insert_after": "first_name", "ask_prompt": "Middle?", "name": "middle"},
+        ])
+    assert await sia.load_flow_steps_raw("atomic") == before
+
+
+async def test_batch_delete_failure_says_what_landed(engine, monkeypatch):
+    await seed_flow(engine, "partial", STEPS)
+    _failing(engine, monkeypatch, "delete")
+    with pytest.raises(ValueError, match=r"saved \(1 updated, 1 added\), but deleting last_name failed"):
+        await sia.apply_flow_batch("partial", [
+            {"op": "delete", "step": "last_name"},
+            {"op": "insert_after", "insert_after": "first_name", "ask_prompt": "Last name?", "name": "last_name"},
+        ])
+    rows = await sia.load_flow_steps_raw("partial")
+    # The new step did not reuse the deleted name, and the chain skips the leftover row.
+    assert sorted(r["name"] for r in rows) == ["first_name", "incident_date", "last_name", "last_name_2"]
+    assert _chain(rows) == ["first_name", "last_name_2", "incident_date"]
+
+
+async def test_step_listing_is_cached_per_version(engine, monkeypatch):
+    listing = sia.FlowListing(ttl_s=60)
+    monkeypatch.setattr(sia, "flow_listing", listing)
+    await seed_flow(engine, "listed", STEPS)
+
+    v0, rows = await listing.get("listed")
+    before = engine.calls
+    assert await listing.get("listed") == (v0, rows)
+    assert engine.calls == before  # served from memory
+
+    edited = await sia.insert_step_after_db("listed", "first_name", "Middle?", name="middle")
+    v1, _ = listing.prime("listed", edited)
+    await sia.delete_step("listed", "incident_date")
+    v2, rows = await listing.get("listed")
+    assert v0 < v1 < v2 and [r["name"] for r in rows] == ["first_name", "middle", "last_name"]
+
+    changed, removed = listing.changes_since("listed", v0, v2)
+    # middle is new; first_name and last_name had their next_name relinked
+    assert {r["name"] for r in changed} == {"first_name", "middle", "last_name"}
+    assert removed == ["incident_date"]
+    assert listing.changes_since("listed", v2, v2) == ([], [])
+    assert listing.parse_token(listing.token(v2)) == v2
+    assert listing.parse_token("deadbeef-3") is None
+
+
+async def test_step_listing_picks_up_outside_edits_after_ttl(engine, monkeypatch):
+    listing = sia.FlowListing(ttl_s=0)
+    monkeypatch.setattr(sia, "flow_listing", listing)
+    flow_id = await seed_flow(engine, "shared", STEPS)
+    v0, _ = await listing.get("shared")
+
+    await engine.table("intake_steps").update({"ask_prompt": "Date?"}).eq("flow_id", flow_id).eq("name", "incident_date").execute()
+    v1, rows = await listing.get("shared")
+    assert v1 == v0 + 1 and rows[-1]["ask_prompt"] == "Date?"
+    assert listing.changes_since("shared", v0, v1) == ([rows[-1]], [])
+
+
+async def test_step_endpointing_drives_turn_timing(engine):
+    await seed_flow(engine, "injury", [
+        *STEPS,
+        {"name": "incident_description", "input_key": "incident_description", "ask_prompt": "What happened?"},
+    ])
+    steps, _, _ = await sia.load_flow_and_steps("injury")
+    timing = {name: step.compile().turn_timing for name, step in steps.items()}
+    assert timing["first_name"]["profile"] == "short"
+    assert timing["incident_description"]["profile"] == "long"
+    assert timing["first_name"]["endpointing_ms"] < timing["incident_date"]["endpointing_ms"] < timing["incident_description"]["endpointing_ms"]
+
+    await sia.update_step_db("injury", "incident_date", {"endpointing_ms": 900})
+    steps, _, _ = await sia.load_flow_and_steps("injury")
+    assert steps["incident_date"].compile().turn_timing["endpointing_ms"] == 900
+    assert steps["incident_date"].turn_timing["profile"] == "custom"
+    with pytest.raises(ValueError):
+        await sia.update_step_db("injury", "incident_date", {"endpointing_ms": 20})
+
+
+def test_sqlite_adds_columns_to_older_files(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "old.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE intake_steps (id TEXT PRIMARY KEY, flow_id TEXT NOT NULL, name TEXT NOT NULL, "
+               "ask_prompt TEXT, input_key TEXT, next_name TEXT, system_prompt TEXT, validate_regex TEXT, "
+               "question_type TEXT, order_index INTEGER, created_at TEXT, UNIQUE (flow_id, name))")
+    db.commit()
+    db.close()
+    client = SqliteClient(path)
+    cols = [r["name"] for r in client._db.execute("PRAGMA table_info(intake_steps)")]
+    assert "endpointing_ms" in cols
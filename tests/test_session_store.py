@@ -0,0 +1,34 @@
+from session_store import SESSION_BASE_BYTES, SessionStore, approx_size
+
+
+def test_count_cap_evicts_least_recently_used_and_keeps_tombstone():
+    evicted = []
+    store = SessionStore(max_sessions=2, on_evict=lambda sid, reason: evicted.append((sid, reason)))
+    store.put("a", object(), "flow_a")
+    store.put("b", object(), "flow_b")
+    store.get("a")  # "b" is now the oldest
+    store.put("c", object(), "flow_c")
+
+    assert "b" not in store and store.resident == 2
+    assert evicted == [("b", "count")]
+    assert store.flow_of("b") == "flow_b"  # restorable
+    store.put("b", object(), "flow_b")
+    assert store.stats()["tombstones"] == 1  # "b" is resident again, "a" went out
+
+
+def test_memory_budget_and_idle_ttl_respect_pinned_sessions():
+    big = {"collected_data": {"notes": "x" * 10_000}}
+    store = SessionStore(memory_budget_bytes=2 * approx_size(big), pinned=lambda sid: sid == "voice")
+    store.put("voice", object(), "f", big)
+    store.put("a", object(), "f", big)
+    store.put("b", object(), "f", big)
+    assert "voice" in store and "a" not in store and "b" in store
+    assert store.evictions["memory"] == 1
+    assert store.bytes == 2 * approx_size(big)
+
+    store.update_state("b", {})
+    assert store.bytes == approx_size(big) + SESSION_BASE_BYTES
+
+    store.idle_ttl_s = 10
+    assert store.sweep(now=store.get("b").last_used + 11) == 1
+    assert list(store._sessions) == ["voice"] and store.evictions["ttl"] == 1
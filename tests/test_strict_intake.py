@@ -0,0 +1,358 @@
+import pytest
+
+import intake_metrics
+from strict_intake_assistant import IntakeState, Step, check_validate_regex
+
+
+def _count_nodes(assistant):
+    """Wrap every graph node so we can count executions per invoke."""
+    counter = {"n": 0}
+    for node in assistant.app.nodes.values():
+        bound = node.bound
+        original = bound.afunc
+
+        async def counted(state, *args, _orig=original, **kwargs):
+            counter["n"] += 1
+            return await _orig(state, *args, **kwargs)
+
+        bound.afunc = counted
+    return counter
+
+
+async def test_full_flow_collects_answers(offline_flow):
+    assistant = await offline_flow(3)
+    sid = "s1"
+
+    first = await assistant.start(sid)
+    assert "Question 0?" in first
+    assert await assistant.handle_user("alpha", sid) == "Question 1?"
+    assert await assistant.handle_user("beta", sid) == "Question 2?"
+    await assistant.handle_user("gamma", sid)
+
+    state = (await assistant.app.aget_state({"configurable": {"thread_id": sid}})).values
+    assert state["collected_data"] == {"key_0": "alpha", "key_1": "beta", "key_2": "gamma"}
+    assert state["completed_steps"] == ["q0", "q1", "q2"]
+    assert state["current_step"] == ""
+
+    import strict_intake_assistant as sia
+
+    await sia.answer_writer.flush()
+    assert [row[3] for row in offline_flow.saved] == ["alpha", "beta", "gamma"]
+
+
+async def test_turn_runs_constant_nodes_regardless_of_depth(offline_flow):
+    assistant = await offline_flow(12)
+    counter = _count_nodes(assistant)
+    sid = "deep"
+
+    await assistant.start(sid)
+    assert counter["n"] == 1  # ask_q0 only
+
+    per_turn = []
+    for i in range(11):
+        counter["n"] = 0
+        await assistant.handle_user(f"answer {i}", sid)
+        per_turn.append(counter["n"])
+
+    # store_<current> + ask_<next>, no replay from the entry node.
+    assert per_turn == [2] * 11
+
+
+async def test_sessions_are_isolated_by_thread(offline_flow):
+    assistant = await offline_flow(3)
+    await assistant.start("a")
+    await assistant.start("b")
+    await assistant.handle_user("only a", "a")
+
+    cfg_b = {"configurable": {"thread_id": "b"}}
+    state_b: IntakeState = (await assistant.app.aget_state(cfg_b)).values
+    assert state_b["current_step"] == "q0"
+    assert state_b["collected_data"] == {}
+
+
+async def test_registry_shares_one_graph_per_flow_version(offline_flow):
+    first = await offline_flow(3)
+    second = await offline_flow(3)
+    assert first.app is second.app
+    assert offline_flow.loader.calls == 1
+
+    await first.start("a")
+    await second.start("b")
+    await first.handle_user("only a", "a")
+    state_b = (await second.app.aget_state({"configurable": {"thread_id": "b"}})).values
+    assert state_b["collected_data"] == {}
+
+
+async def test_registry_invalidate_rebuilds_and_keeps_sessions(offline_flow):
+    import strict_intake_assistant as sia
+
+    old = await offline_flow(3)
+    await old.start("s")
+    await old.handle_user("alpha", "s")
+
+    assert sia.flow_registry.invalidate("test_flow") == 1
+    new = await offline_flow(3)
+    assert new.app is not old.app
+    assert offline_flow.loader.calls == 2
+
+    # The session continues on the rebuilt graph via the shared checkpointer.
+    assert await new.handle_user("beta", "s") == "Question 2?"
+
+
+async def test_speculative_extraction_is_reused_only_when_final_matches(offline_flow):
+    import strict_intake_assistant as sia
+
+    assistant = await offline_flow(3)
+    calls = []
+    extract = sia.rewriter.extract_and_validate
+
+    async def counted(question, user_response, pattern=None, qtype=None):
+        calls.append(user_response)
+        return await extract(question, user_response, pattern=pattern, qtype=qtype)
+
+    sia.rewriter.extract_and_validate = counted
+    sid = "spec"
+    await assistant.start(sid)
+
+    assert await assistant.speculate("alpha", sid)
+    assert await assistant.handle_user("alpha.", sid) == "Question 1?"  # final gained a full stop
+    assert calls == ["alpha"]
+
+    assert await assistant.speculate("be", sid)
+    assert await assistant.handle_user("beta", sid) == "Question 2?"
+    assert calls == ["alpha", "be", "beta"]  # mismatch: discarded, extracted again
+
+    state = (await assistant.app.aget_state({"configurable": {"thread_id": sid}})).values
+    assert state["collected_data"] == {"key_0": "alpha", "key_1": "beta"}
+    assert sia.speculation.pending() == 0
+
+
+async def test_needs_llm_follows_current_step_rules(offline_flow):
+    assistant = await offline_flow(3)
+    steps = assistant.steps
+    steps["q1"].question_type = "medical_treatment"
+    steps["q2"].validate_regex = r"^\d+$"
+    for step in steps.values():
+        step.compile()
+    sid = "llm"
+    await assistant.start(sid)
+
+    assert await assistant.needs_llm("it was a blue car", sid)  # general: no rule
+    await assistant.handle_user("alpha", sid)
+    assert not await assistant.needs_llm("no", sid)  # yes/no rule answers it
+    assert await assistant.needs_llm("hmm well", sid)
+    await assistant.handle_user("yes", sid)
+    assert not await assistant.needs_llm("anything", sid)  # validate_regex: no LLM
+    await assistant.handle_user("42", sid)
+    assert not await assistant.needs_llm("anything", sid)  # flow ended
+
+
+async def test_prepare_can_be_cancelled_and_the_commit_cannot(offline_flow):
+    import asyncio
+
+    import strict_intake_assistant as sia
+
+    assistant = await offline_flow(3)
+    calls = []
+    release = asyncio.Event()
+
+    async def slow(question, user_response, pattern=None, qtype=None):
+        calls.append(user_response)
+        await release.wait()
+        return True, user_response, ""
+
+    sia.rewriter.extract_and_validate = slow
+    sid = "barge"
+    cfg = {"configurable": {"thread_id": sid}}
+    await assistant.start(sid)
+
+    # Superseded before commit: extraction cancelled, nothing stored
+    prepared = asyncio.create_task(assistant.prepare("alpha", sid))
+    await asyncio.sleep(0.01)
+    prepared.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await prepared
+    state = (await assistant.app.aget_state(cfg)).values
+    assert state["current_step"] == "q0" and not sia.has_pending_human(state)
+    assert sia.speculation.pending() == 0
+
+    release.set()
+    assert await assistant.prepare("alpha beta", sid)
+    assert await assistant.handle_user("alpha beta", sid) == "Question 1?"
+    assert calls == ["alpha", "alpha beta"]  # the prepared result was reused
+
+    # Cancelled mid-commit: the turn still completes, so the state stays consistent
+    release.clear()
+    turn = asyncio.create_task(assistant.handle_user("gamma", sid))
+    await asyncio.sleep(0.01)
+    turn.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await turn
+    release.set()
+    for _ in range(50):
+        state = (await assistant.app.aget_state(cfg)).values
+        if state["current_step"] == "q2":
+            break
+        await asyncio.sleep(0.01)
+    assert state["collected_data"] == {"key_0": "alpha beta", "key_1": "gamma"}
+    assert not sia.has_pending_human(state)
+
+
+def test_validate_regex_is_compiled_once_and_checked_on_edit():
+    step = Step("code", "Code?", "code", None, validate_regex=r"^\d{4}$")
+    assert step.validate_pattern is None
+    assert step.compile().validate_pattern.search("1234")
+    # Compiled exactly as written: no implicit IGNORECASE, authors opt in with (?i).
+    assert not Step("c", "C?", "c", None, validate_regex=r"^[A-Z]{2}$").compile().validate_pattern.search("ab")
+    assert Step("c", "C?", "c", None, validate_regex=r"(?i)^[A-Z]{2}$").compile().validate_pattern.search("ab")
+    # Checked with search: only anchors make the whole answer match.
+    assert Step("c", "C?", "c", None, validate_regex=r"\d{4}").compile().validate_pattern.search("code 1234")
+    assert Step("bad", "Bad?", "bad", None, validate_regex="([").compile().validate_pattern is None
+    with pytest.raises(ValueError):
+        check_validate_regex("([")
+    check_validate_regex(None)
+
+
+async def test_answers_are_written_behind_in_bulk(monkeypatch):
+    import asyncio
+
+    import strict_intake_assistant as sia
+
+    run_id_calls, batches = [], []
+
+    async def fake_run_id(flow_id, session_id):
+        run_id_calls.append(session_id)
+        return f"run-{session_id}"
+
+    async def fake_save(rows):
+        batches.append(rows)
+
+    monkeypatch.setattr(sia, "get_or_create_run_id", fake_run_id)
+    monkeypatch.setattr(sia, "save_answers", fake_save)
+    writer = sia.AnswerWriter(flush_size=3, flush_interval=60)
+
+    writer.enqueue("f", "s1", "q0", "k0", "a")
+    writer.enqueue("f", "s1", "q1", "k1", "b")
+    await asyncio.sleep(0)
+    assert batches == []  # below size threshold, interval not reached
+
+    writer.enqueue("f", "s2", "q0", "k0", "c")
+    for _ in range(100):
+        if batches:
+            break
+        await asyncio.sleep(0.001)
+    assert [len(b) for b in batches] == [3]
+
+    writer.enqueue("f", "s1", "q2", "k2", "d")
+    await writer.flush()
+    assert [r["value"] for r in batches[-1]] == ["d"]
+    # run_id resolved once per session and cached afterwards.
+    assert sorted(run_id_calls) == ["s1", "s2"]
+
+
+async def test_answers_flush_on_the_interval_after_going_idle(monkeypatch):
+    import asyncio
+
+    import strict_intake_assistant as sia
+
+    batches = []
+    fail = [True]
+
+    async def fake_run_id(flow_id, session_id):
+        return f"run-{session_id}"
+
+    async def fake_save(rows):
+        if fail[0]:
+            fail[0] = False
+            raise RuntimeError("db down")
+        batches.append([r["value"] for r in rows])
+
+    async def until(cond):
+        for _ in range(100):
+            if cond():
+                return
+            await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(sia, "get_or_create_run_id", fake_run_id)
+    monkeypatch.setattr(sia, "save_answers", fake_save)
+    writer = sia.AnswerWriter(flush_size=50, flush_interval=0.05, max_pending=2)
+
+    intake_metrics.reset()
+
+    writer.enqueue("f", "s1", "q0", "k0", "a")
+    await until(lambda: not fail[0])  # first flush failed: batch requeued
+    writer.enqueue("f", "s1", "q1", "k1", "b")
+    writer.enqueue("f", "s1", "q2", "k2", "c")  # over max_pending: oldest dropped
+    await until(lambda: batches)
+    assert batches == [["b", "c"]]
+    assert intake_metrics.snapshot()["answers_dropped"] == 1
+
+    writer.enqueue("f", "s1", "q3", "k3", "d")  # the worker had gone idle
+    await until(lambda: len(batches) == 2)
+    assert batches[-1] == ["d"]
+
+
+async def test_session_end_drains_queue_before_completion(monkeypatch):
+    import strict_intake_assistant as sia
+
+    events = []
+
+    async def fake_run_id(flow_id, session_id):
+        return "run-1"
+
+    async def fake_save(rows):
+        events.extend(("insert", r["step_name"]) for r in rows)
+
+    async def fake_supa():
+        class _Q:
+            def __getattr__(self, name):
+                return lambda *a, **k: self
+
+            async def execute(self):
+                events.append(("completed", None))
+
+        class _C:
+            def table(self, name):
+                return _Q()
+
+        return _C()
+
+    monkeypatch.setattr(sia, "get_or_create_run_id", fake_run_id)
+    monkeypatch.setattr(sia, "save_answers", fake_save)
+    monkeypatch.setattr(sia, "supa", fake_supa)
+    monkeypatch.setattr(sia, "answer_writer", sia.AnswerWriter(flush_interval=60))
+
+    sia.answer_writer.enqueue("f", "s", "q0", "k0", "a")
+    await sia.save_session_end("f", "s", "bye")
+    assert events == [("insert", "q0"), ("insert", "session_end"), ("completed", None)]
+
+
+async def test_event_publisher_batches_and_drops_oldest():
+    import asyncio
+    import json
+
+    import httpx
+
+    import strict_intake_assistant as sia
+
+    posts = []
+    release = asyncio.Event()
+
+    async def handler(request):
+        posts.append((request.url.path, json.loads(request.content)["events"]))
+        await release.wait()
+        return httpx.Response(200, json={"ok": True})
+
+    pub = sia.EventPublisher(url="http://ui/events", maxlen=3, batch_size=2, transport=httpx.MockTransport(handler))
+    pub.publish("s", {"n": 0})
+    await asyncio.sleep(0.01)  # first batch in flight, UI is slow
+    for n in range(1, 6):
+        pub.publish("s", {"n": n})  # returns immediately even though the UI hangs
+    assert pub.dropped == 2
+
+    release.set()
+    await pub.aclose()
+    assert all(path == "/events/batch" for path, _ in posts)
+    delivered = [item["event"]["n"] for _, batch in posts for item in batch]
+    assert delivered == [0, 3, 4, 5]
+    assert [len(batch) for _, batch in posts] == [1, 2, 1]
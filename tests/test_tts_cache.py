@@ -0,0 +1,56 @@
+import asyncio
+
+from conftest import make_steps
+from livekit import rtc
+
+import strict_intake_assistant as sia
+from tts_cache import TTSAudioCache
+
+
+def _frames(n: int, samples: int = 240):
+    out = []
+    for i in range(n):
+        frame = rtc.AudioFrame.create(24000, 1, samples)
+        frame.data[0] = i + 1  # tell frames apart after the round trip
+        out.append(frame)
+    return out
+
+
+def test_audio_survives_restart_and_is_keyed_by_settings(tmp_path):
+    cache = TTSAudioCache(path=str(tmp_path))
+    cache.put("Hello there.", "voice-a", _frames(3))
+
+    fresh = TTSAudioCache(path=str(tmp_path))  # another worker process
+    frames = fresh.get("Hello there.", "voice-a")
+    assert [f.data[0] for f in frames] == [1, 2, 3]
+    assert all(f.sample_rate == 24000 and f.samples_per_channel == 240 for f in frames)
+    assert fresh.get("Hello there.", "voice-b") is None  # other voice / settings
+    assert fresh.get("Hello there!", "voice-a") is None
+    assert (fresh.hits, fresh.misses) == (1, 2)
+
+    fresh.save_manifest("flow", ["Hello there.", "Bye."])
+    assert TTSAudioCache(path=str(tmp_path)).load(fresh.manifest("flow"), "voice-a") == 1
+
+
+def test_memory_lru_respects_budget():
+    one = len(_frames(1)[0].data.tobytes())
+    cache = TTSAudioCache(path=None, memory_bytes=3 * one)
+    for i in range(5):
+        cache.put(f"line {i}", "v", _frames(1))
+    assert cache.get("line 0", "v") is None  # evicted, and there's no disk layer
+    assert cache.get("line 4", "v") is not None
+
+
+def test_speakable_lines_skip_caller_specific_prompts(offline_flow, monkeypatch):
+    steps, entry = make_steps(3)
+    steps["q1"].ask_prompt = "Thanks {key_0}. Question 1?"
+
+    async def load(flow_name):
+        return steps, "flow-1", entry
+
+    monkeypatch.setattr(sia, "load_flow_and_steps", load)
+    lines = asyncio.run(sia.speakable_lines("test_flow"))
+    assert set(sia.STATIC_REPLIES) <= set(lines)
+    assert "Hello, this is Michelle Ross." in lines
+    assert {"Question 0?", "Question 2?"} <= set(lines)
+    assert not any("{" in line for line in lines)
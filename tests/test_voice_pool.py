@@ -0,0 +1,84 @@
+import asyncio
+import sys
+
+import pytest
+
+from voice_pool import PoolFullError, VoicePool
+
+# Mimics voice_worker.py: report ready, then serve assignments one at a time, "talking"
+# for FAKE_TALK_S before releasing each session.
+FAKE_WORKER = r"""
+import json, os, sys, time
+fd = int(os.environ["VOICE_WORKER_STATUS_FD"])
+os.write(fd, (json.dumps({"event": "ready", "warm_ms": 1.0}) + "\n").encode())
+for line in sys.stdin:
+    msg = json.loads(line)
+    if msg.get("cmd") != "assign":
+        break
+    os.write(fd, (json.dumps({"event": "assigned", "session_id": msg["session_id"]}) + "\n").encode())
+    time.sleep(float(os.environ.get("FAKE_TALK_S", "30")))
+    os.write(fd, (json.dumps({"event": "released", "session_id": msg["session_id"]}) + "\n").encode())
+"""
+
+
+async def _until(cond, timeout=10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not cond():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_pool_hands_out_warm_workers_and_queues_overflow():
+    events = []
+    pool = VoicePool(size=1, max_queue=1, cmd=[sys.executable, "-c", FAKE_WORKER],
+                     on_event=lambda sid, ev: events.append((sid, ev["event"])))
+    await pool.start()
+    try:
+        await _until(lambda: pool.stats()["idle"] == 1)
+        assert (await pool.launch("s1"))["status"] == "started"
+        assert await pool.launch("s2") == {"status": "queued", "position": 1}
+        with pytest.raises(PoolFullError):
+            await pool.launch("s3")
+        assert pool.has("s2") and not pool.has("s3")
+
+        # s1's worker exits; a fresh warm worker replaces it and picks up s2.
+        assert await pool.stop("s1")
+        await _until(lambda: ("s2", "voice_agent_started") in events)
+        assert ("s1", "voice_agent_stopped") in events
+        pool.note_event("s2", {"event": "prompt_spoken", "text": "Hi"})
+        stats = pool.stats()
+        assert stats["busy"] == 1 and stats["queued"] == 0 and stats["spawned"] == 2
+        assert stats["launch_to_first_prompt_ms"]["count"] == 1
+    finally:
+        await pool.close()
+
+
+async def test_worker_dying_during_warm_up_backs_off():
+    pool = VoicePool(size=1, cmd=[sys.executable, "-c", "raise SystemExit(3)"])
+    await pool.start()
+    try:
+        await _until(lambda: pool.failures >= 1)
+        assert pool.stats()["idle"] == 0 and pool._backoff > 0
+    finally:
+        await pool.close()
+
+
+async def test_released_worker_takes_the_next_session_without_respawning(monkeypatch):
+    monkeypatch.setenv("FAKE_TALK_S", "0.1")
+    events = []
+    pool = VoicePool(size=1, cmd=[sys.executable, "-c", FAKE_WORKER],
+                     on_event=lambda sid, ev: events.append((sid, ev["event"])))
+    await pool.start()
+    try:
+        await _until(lambda: pool.stats()["idle"] == 1)
+        first = await pool.launch("s1")
+        assert await pool.launch("s2") == {"status": "queued", "position": 1}
+        await _until(lambda: ("s2", "voice_agent_stopped") in events)
+        assert events == [("s1", "voice_agent_started"), ("s1", "voice_agent_stopped"),
+                          ("s2", "voice_agent_started"), ("s2", "voice_agent_stopped")]
+        stats = pool.stats()
+        assert stats["spawned"] == 1 and stats["sessions_served"] == 2 and stats["idle"] == 1
+        assert pool.workers[0].proc.pid == first["process_id"]
+    finally:
+        await pool.close()
+    assert all(w.proc.returncode is not None for w in pool.workers)
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import StubRewriter
+
+import strict_intake_assistant as sia
+from local_store import SqliteClient, seed_flow
+
+WORKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "voice_worker.py")
+FLOW = "injury_intake_strict"  # agent.FLOW_NAME
+STEPS = [
+    {"name": "first_name", "input_key": "first_name", "ask_prompt": "What is your first name?"},
+    {"name": "last_name", "input_key": "last_name", "ask_prompt": "Thanks {first_name}. Last name?"},
+]
+
+
+def _spawn(tmp_path, db):
+    r, w = os.pipe()
+    env = {
+        **os.environ,
+        # agent.py refuses to import without these; the dry run never connects anywhere.
+        "LIVEKIT_URL": "ws://localhost:7880", "LIVEKIT_API_KEY": "test", "LIVEKIT_API_SECRET": "test",
+        "DEEPGRAM_API_KEY": "test", "CARTESIA_API_KEY": "test", "OPENAI_BASE_URL": "http://127.0.0.1:9",
+        "INTAKE_STORAGE": "sqlite", "INTAKE_SQLITE_PATH": db, "TTS_CACHE_DIR": "",
+        "VOICE_WORKER_DRY_RUN": "1", "VOICE_WORKER_STATUS_FD": str(w),
+    }
+    proc = subprocess.Popen([sys.executable, WORKER], stdin=subprocess.PIPE, env=env, cwd=tmp_path,
+                            pass_fds=(w,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(w)
+    return proc, os.fdopen(r, "rb")
+
+
+def _next(status, event):
+    for line in status:
+        msg = json.loads(line)
+        if msg["event"] == event:
+            return msg
+    raise AssertionError(f"worker exited before '{event}'")
+
+
+def _assign(proc, status, session_id):
+    proc.stdin.write((json.dumps({"cmd": "assign", "session_id": session_id}) + "\n").encode())
+    proc.stdin.flush()
+    return _next(status, "released")
+
+
+async def test_pooled_worker_sees_flow_edits_between_sessions(tmp_path, monkeypatch):
+    db = str(tmp_path / "store.sqlite3")
+    client = SqliteClient(db)
+    await seed_flow(client, FLOW, STEPS)
+    proc, status = _spawn(tmp_path, db)
+    try:
+        _next(status, "ready")
+        assert _assign(proc, status, "s1")["steps"] == ["first_name", "last_name"]
+
+        # Edited through the engine in this (the server's) process; only its own cache is invalidated.
+        monkeypatch.setattr(sia, "_client", client)
+        monkeypatch.setattr(sia, "rewriter", StubRewriter())
+        await sia.apply_flow_batch(FLOW, [
+            {"op": "insert_after", "insert_after": "first_name", "ask_prompt": "Middle name?", "name": "middle"},
+        ])
+
+        assert _assign(proc, status, "s2")["steps"] == ["first_name", "middle", "last_name"]
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=30)
+        status.close()